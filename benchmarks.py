@@ -0,0 +1,769 @@
+# This file is part of the materials accompanying the book
+# "Mathematical Logic through Python" by Gonczarowski and Nisan,
+# Cambridge University Press. Book site: www.LogicThruPython.org
+# (c) Yannai A. Gonczarowski and Noam Nisan, 2017-2022
+# File name: benchmarks.py
+
+"""Microbenchmarks for the performance-sensitive parts of the propositions
+package. Run ``python benchmarks.py`` to run all of them, or
+``python benchmarks.py <name> ...`` to run only the benchmarks whose names
+contain one of the given strings."""
+
+from concurrent.futures import ProcessPoolExecutor
+import copyreg
+import gc
+from io import BytesIO
+import pickle
+import random
+import sys
+from timeit import timeit
+import tracemalloc
+from typing import Callable, List, Mapping, Optional, Sequence
+
+from logic_utils import cache_statistics, frozen, resize_cache, \
+                        set_validation_level
+
+from propositions.syntax import *
+from propositions.arena import *
+from propositions.proofs import *
+from propositions.axiomatic_systems import *
+from propositions.semantics import *
+from propositions.tautology import *
+from propositions.serialization import *
+from propositions.batch import *
+from propositions import semantics
+
+def _best_time(function: Callable[[], object], number: int = 1,
+               repeat: int = 5) -> float:
+    """Measures the given function.
+
+    Parameters:
+        function: parameterless function to measure.
+        number: number of calls to time together.
+        repeat: number of times to repeat the measurement.
+
+    Returns:
+        The best time, in seconds, of a single call to the given function.
+    """
+    gc.collect()
+    return min(timeit(function, number=number) for _ in range(repeat)) / number
+
+def _report(title: str, old: float, new: float) -> None:
+    """Prints a single benchmark result.
+
+    Parameters:
+        title: description of the measured operation.
+        old: time in seconds of the previous implementation.
+        new: time in seconds of the current implementation.
+    """
+    print('  %-44s %10.2f us %10.2f us %8.1fx' %
+          (title, old * 1e6, new * 1e6, old / new if new > 0 else float('inf')))
+
+def _implication_chain(depth: int, last: str = 'p') -> Formula:
+    """Builds a left-nested chain of implications of the given depth."""
+    formula = Formula('x0')
+    for i in range(1, depth):
+        formula = Formula('->', formula, Formula('x' + str(i)))
+    return Formula('->', formula, Formula(last))
+
+def _uninterned_implication_chain(depth: int, deepest: str = 'x0') \
+        -> Formula:
+    """Builds a left-nested chain of implications of the given depth, as
+    `_implication_chain` does, but from fresh non-interned nodes, so that
+    comparing two such chains cannot short-circuit on shared subformulas."""
+    def node(root: str, first: Optional[Formula] = None,
+             second: Optional[Formula] = None) -> Formula:
+        formula = Formula.__new__(Formula)
+        formula._initialize(root, first, second)
+        return formula
+    formula = node(deepest)
+    for i in range(1, depth):
+        formula = node('->', formula, node('x' + str(i)))
+    return node('->', formula, node('p'))
+
+def _random_formula(rng: random.Random, depth: int) -> Formula:
+    """Builds a random formula of at most the given depth over ten
+    variables."""
+    if depth == 0 or rng.random() < 0.1:
+        return Formula(rng.choice(['T', 'F']) if rng.random() < 0.05 else
+                       'x' + str(rng.randrange(10)))
+    if rng.random() < 0.2:
+        return Formula('~', _random_formula(rng, depth - 1))
+    return Formula(rng.choice(['&', '|', '->', '+', '<->', '-&', '-|']),
+                   _random_formula(rng, depth - 1),
+                   _random_formula(rng, depth - 1))
+
+def _random_corpus(size: int, depth: int) -> List[str]:
+    """Renders a reproducible corpus of random formulas."""
+    rng = random.Random(0)
+    return [str(_random_formula(rng, depth)) for _ in range(size)]
+
+def benchmark_construction() -> None:
+    """Compares constructing formulas, inference rules, proof lines, and proofs
+    whose immutability is enforced by `~logic_utils.frozen` with constructing
+    them with `~logic_utils.frozen_slots`, and with constructing plain tuples
+    of the same fields."""
+    # Twins of the four classes as they were when decorated by frozen, with
+    # the same initialization work but with ordinary attribute assignment.
+    @frozen
+    class OldFormula:
+        def __init__(self, root: str, first: 'Optional[OldFormula]' = None,
+                     second: 'Optional[OldFormula]' = None):
+            if is_variable(root) or is_constant(root):
+                assert first is None and second is None
+                self.root, self.first, self.second = root, None, None
+                self._hash = hash(root)
+            elif is_unary(root):
+                assert first is not None and second is None
+                self.root, self.first, self.second = root, first, None
+                self._hash = hash((root, first._hash))
+            else:
+                assert is_binary(root)
+                assert first is not None and second is not None
+                self.root, self.first, self.second = root, first, second
+                self._hash = hash((root, first._hash, second._hash))
+    @frozen
+    class OldInferenceRule:
+        def __init__(self, assumptions: Sequence[Formula],
+                     conclusion: Formula):
+            self.assumptions = tuple(assumptions)
+            self.conclusion = conclusion
+    @frozen
+    class OldLine:
+        def __init__(self, formula: Formula,
+                     rule: Optional[InferenceRule] = None,
+                     assumptions: Optional[Sequence[int]] = None):
+            self.formula = formula
+            self.rule = rule
+            if assumptions is not None:
+                self.assumptions = tuple(assumptions)
+    @frozen
+    class OldProof:
+        def __init__(self, statement: InferenceRule, rules, lines):
+            self.statement = statement
+            self.rules = frozenset(rules)
+            self.lines = tuple(lines)
+
+    p, q = Formula('p'), Formula('q')
+    old_p, old_q = OldFormula('p'), OldFormula('q')
+    rule = InferenceRule([p], q)
+    line = Proof.Line(p)
+    print('frozen vs. frozen_slots construction (old, new, speedup), and '
+          'tuple:')
+    for title, old, new, plain in [
+            ('Formula, binary', lambda: OldFormula('&', old_p, old_q),
+             lambda: Formula('&', p, q), lambda: ('&', p, q)),
+            ('InferenceRule', lambda: OldInferenceRule([p], q),
+             lambda: InferenceRule([p], q), lambda: (tuple([p]), q)),
+            ('Proof.Line, assumption', lambda: OldLine(p),
+             lambda: Proof.Line(p), lambda: (p, None)),
+            ('Proof.Line, inference', lambda: OldLine(q, rule, [0]),
+             lambda: Proof.Line(q, rule, [0]),
+             lambda: (q, rule, tuple([0]))),
+            ('Proof', lambda: OldProof(rule, {rule}, [line]),
+             lambda: Proof(rule, {rule}, [line]),
+             lambda: (rule, frozenset({rule}), tuple([line])))]:
+        _report(title, _best_time(old, 100000), _best_time(new, 100000))
+        print('  %-44s %10.2f us' %
+              ('  same fields as a tuple', _best_time(plain, 100000) * 1e6))
+
+def benchmark_structural_hash_and_equality() -> None:
+    """Compares structural hashing and equality with rendering-based hashing
+    and equality on deep formulas."""
+    print('Structural hash and equality vs. str()-based (old, new, speedup):')
+    for depth in [10, 100, 400]:
+        # Fresh formulas each time, so that no memoized string helps the old
+        # path.
+        _report('build and hash, depth %d' % depth,
+                _best_time(lambda: hash(str(_implication_chain(depth))), 20),
+                _best_time(lambda: hash(_implication_chain(depth)), 20))
+        # Equal formulas built separately, so that neither identity nor
+        # shared subformulas decide the comparison, and a formula that differs
+        # from them only in its deepest leaf.
+        formula = _uninterned_implication_chain(depth)
+        same = _uninterned_implication_chain(depth)
+        other = _uninterned_implication_chain(depth, 'q')
+        assert formula is not same and formula.first is not same.first
+        str(formula), str(same), str(other)
+        _report('equal, depth %d' % depth,
+                _best_time(lambda: str(formula) == str(same), 10000),
+                _best_time(lambda: formula == same, 10000))
+        _report('unequal in deepest leaf, depth %d' % depth,
+                _best_time(lambda: str(formula) == str(other), 10000),
+                _best_time(lambda: formula == other, 10000))
+
+def benchmark_frozen_queries() -> None:
+    """Compares the copying `~propositions.syntax.Formula.variables` and
+    `~propositions.syntax.Formula.operators` with their shared frozen
+    variants."""
+    print('Copying vs. frozen memoized queries (old, new, speedup):')
+    for depth in [10, 100]:
+        formula = _implication_chain(depth)
+        formula.variables_frozen(), formula.operators_frozen()
+        _report('variables, %d variables' % (depth + 1),
+                _best_time(formula.variables, 10000),
+                _best_time(formula.variables_frozen, 10000))
+        _report('operators, depth %d' % depth,
+                _best_time(formula.operators, 10000),
+                _best_time(formula.operators_frozen, 10000))
+
+def _recursive_substitute_variables(formula: Formula,
+                                    substitution_map: Mapping[str, Formula]) \
+        -> Formula:
+    """The previous implementation of
+    `~propositions.syntax.Formula.substitute_variables`, which scans the
+    substitution map and rebuilds the formula at every node."""
+    for variable, new_formula in substitution_map.items():
+        if formula.root == variable:
+            return new_formula
+        elif is_unary(formula.root):
+            return Formula(formula.root, _recursive_substitute_variables(
+                formula.first, substitution_map))
+        elif is_binary(formula.root):
+            return Formula(formula.root,
+                           _recursive_substitute_variables(formula.first,
+                                                           substitution_map),
+                           _recursive_substitute_variables(formula.second,
+                                                           substitution_map))
+    return formula
+
+def benchmark_substitute_variables() -> None:
+    """Compares the previous recursive variable substitution with the current
+    single-pass one."""
+    print('Recursive vs. single-pass substitute_variables (old, new, '
+          'speedup):')
+    rng = random.Random(0)
+    formula = _random_formula(rng, 10)
+    for size in [2, 10]:
+        substitution_map = {'x' + str(i): _random_formula(rng, 3)
+                            for i in range(size)}
+        _report('depth <= 10, %d-variable map' % size,
+                _best_time(lambda: _recursive_substitute_variables(
+                    formula, substitution_map), 20),
+                _best_time(lambda: formula.substitute_variables(
+                    substitution_map), 20))
+    proof = prove_tautology(Formula.parse('((p->q)->((~p->q)->(r->q)))'))
+    substitution_map = {'p': Formula.parse('(x&y)'), 'q': Formula.parse('~z'),
+                        'r': Formula.parse('(y|z)')}
+    _report('%d proof lines, 3-variable map' % len(proof.lines),
+            _best_time(lambda: [_recursive_substitute_variables(
+                line.formula, substitution_map) for line in proof.lines]),
+            _best_time(lambda: [line.formula.substitute_variables(
+                substitution_map) for line in proof.lines]))
+
+def benchmark_compiled_specializers() -> None:
+    """Compares specializing axiom templates via
+    `~propositions.proofs.InferenceRule.specialize` with instantiating their
+    compiled specializers."""
+    print('specialize vs. compiled specializer (old, new, speedup):')
+    rng = random.Random(0)
+    operands = [_random_formula(rng, 4) for _ in range(30)]
+    for name, rule in [('I1', I1), ('D', D), ('NI', NI), ('R', R)]:
+        specializer = rule.compile_specializer()
+        maps = [{variable: rng.choice(operands)
+                 for variable in specializer.variables} for _ in range(1000)]
+        tuples = [[specialization_map[variable]
+                   for variable in specializer.variables]
+                  for specialization_map in maps]
+        _report('%s, 1000 maps' % name,
+                _best_time(lambda: [rule.specialize(specialization_map)
+                                    for specialization_map in maps]),
+                _best_time(lambda: specializer.instantiate_all(tuples)))
+
+def _recursive_substitute_operators(formula: Formula,
+                                    substitution_map: Mapping[str, Formula]) \
+        -> Formula:
+    """The previous implementation of
+    `~propositions.syntax.Formula.substitute_operators`, which converts every
+    occurrence of a repeated operand separately."""
+    if is_constant(formula.root) and formula.root in substitution_map:
+        return substitution_map[formula.root]
+    elif is_unary(formula.root):
+        first = _recursive_substitute_operators(formula.first, substitution_map)
+        if formula.root in substitution_map:
+            return substitution_map[formula.root].substitute_variables(
+                {'p': first})
+        return Formula(formula.root, first)
+    elif is_binary(formula.root):
+        first = _recursive_substitute_operators(formula.first, substitution_map)
+        second = _recursive_substitute_operators(formula.second,
+                                                 substitution_map)
+        if formula.root in substitution_map:
+            return substitution_map[formula.root].substitute_variables(
+                {'p': first, 'q': second})
+        return Formula(formula.root, first, second)
+    return formula
+
+def benchmark_substitute_operators() -> None:
+    """Compares the previous recursive operator substitution with the current
+    DAG-sharing one, converting chains of xors as
+    `~propositions.operators.to_not_and` does, and reports the DAG size of the
+    result."""
+    print('Recursive vs. DAG-sharing substitute_operators (old, new, '
+          'speedup):')
+    first_map = {'+': Formula.parse('((p&~q)|(~p&q))')}
+    second_map = {'|': Formula.parse('~(~p&~q)')}
+    for depth in [4, 8, 12, 30]:
+        formula = Formula('x0')
+        for i in range(1, depth + 1):
+            formula = Formula('+', formula, Formula('x' + str(i)))
+        new = _best_time(lambda: formula.substitute_operators(
+            first_map).substitute_operators(second_map))
+        # The previous implementation takes exponential time in the depth.
+        old = _best_time(lambda: _recursive_substitute_operators(
+            _recursive_substitute_operators(formula, first_map), second_map),
+            repeat=1) if depth <= 12 else float('nan')
+        _report('%d-deep xor chain, %d DAG nodes' %
+                (depth, formula.substitute_operators(first_map)
+                        .substitute_operators(second_map).dag_size()),
+                old, new)
+
+def _recursive_evaluate(formula: Formula, model: Model) -> bool:
+    """The previous implementation of `~propositions.semantics.evaluate`,
+    which recurses and validates its arguments at every level."""
+    assert Formula.is_formula(formula)
+    assert is_model(model)
+    assert formula.variables_frozen().issubset(variables(model))
+    if is_constant(formula.root):
+        return formula.root == 'T'
+    elif is_variable(formula.root):
+        return model[formula.root]
+    elif is_unary(formula.root):
+        return not _recursive_evaluate(formula.first, model)
+    first = _recursive_evaluate(formula.first, model)
+    second = _recursive_evaluate(formula.second, model)
+    return {'&': first and second, '|': first or second,
+            '->': not first or second, '+': first != second,
+            '<->': first == second, '-&': not (first and second),
+            '-|': not (first or second)}[formula.root]
+
+def benchmark_traversals() -> None:
+    """Compares the previous recursive evaluation with the current one, which
+    folds over the formula, and measures the traversal iterators."""
+    print('Recursive vs. folding evaluate (old, new, speedup):')
+    for depth in [10, 100, 400]:
+        formula = _implication_chain(depth)
+        model = {variable: True for variable in formula.variables()}
+        _report('evaluate, depth %d' % depth,
+                _best_time(lambda: _recursive_evaluate(formula, model), 10),
+                _best_time(lambda: evaluate(formula, model), 10))
+    print('Traversals of a 100000-deep chain:')
+    formula = _implication_chain(100000)
+    for name in ['preorder', 'postorder', 'subformulas']:
+        traversal = getattr(formula, name)
+        print('  %-44s %10.2f ms' %
+              (name, _best_time(lambda: sum(1 for _ in traversal()),
+                                repeat=3) * 1e3))
+    print('  %-44s %10.2f ms' %
+          ('fold', _best_time(lambda: formula.fold(lambda node, sizes:
+                                                   1 + sum(sizes)),
+                              repeat=3) * 1e3))
+
+def benchmark_metrics() -> None:
+    """Compares measuring formulas by rendering or traversing them with
+    reading their constant-time metrics."""
+    print('Traversal vs. constant-time metrics (old, new, speedup):')
+    for depth in [10, 100, 400]:
+        formula = _implication_chain(depth)
+        str(formula)
+        _report('size, depth %d' % depth,
+                _best_time(lambda: sum(1 for _ in formula.preorder()), 100),
+                _best_time(formula.size, 100))
+        _report('depth, depth %d' % depth,
+                _best_time(lambda: formula.fold(
+                    lambda node, depths: 1 + max(depths, default=-1)), 100),
+                _best_time(formula.depth, 100))
+
+def _concatenating_repr(formula: Formula) -> str:
+    """The previous implementation of `~propositions.syntax.Formula.__repr__`,
+    which concatenates the strings of the operands at every level."""
+    if formula.first is None:
+        return formula.root
+    elif formula.second is None:
+        return formula.root + _concatenating_repr(formula.first)
+    return '(' + _concatenating_repr(formula.first) + formula.root + \
+           _concatenating_repr(formula.second) + ')'
+
+def benchmark_rendering() -> None:
+    """Compares rendering left-deep disjunction chains by concatenation with
+    rendering them in a single streaming pass."""
+    print('Concatenating vs. streaming rendering (old, new, speedup):')
+    for depth in [10, 100, 400, 900]:
+        formula = Formula('x0')
+        for i in range(1, depth):
+            formula = Formula('|', formula, Formula('~', Formula('x' + str(i))))
+        _report('%d-term disjunction' % depth,
+                _best_time(lambda: _concatenating_repr(formula), 10),
+                _best_time(lambda: formula.to_string(memoize=False), 10))
+        # Previously, the string of every subformula was memoized.
+        old = sum(len(_concatenating_repr(subformula))
+                  for subformula in formula.subformulas())
+        new = len(formula.to_string())
+        print('  %-44s %10d kB %10d kB %8.1fx' %
+              ('  memoized characters', old // 1024, new // 1024, old / new))
+
+def benchmark_cache_registry() -> None:
+    """Compares parsing formulas over many distinct variable names with the
+    previous size of the variable name classification cache and with its
+    current size."""
+    print('Variable name cache of size 100 vs. default (old, new, speedup):')
+    name = 'propositions.syntax.is_variable'
+    default = cache_statistics()[name].maxsize
+    rng = random.Random(0)
+    corpus = ['(x%d&x%d)' % (rng.randrange(1000), rng.randrange(1000))
+              for _ in range(5000)]
+    times = []
+    for size in [100, default]:
+        resize_cache(name, size)
+        times.append(_best_time(lambda: [Formula.parse(string)
+                                         for string in corpus]))
+        statistics = cache_statistics()[name]
+        print('  %-44s %9.1f%%' %
+              ('hit rate with %d entries' % size,
+               100 * statistics.hits / (statistics.hits + statistics.misses)))
+    _report('parse 5000 formulas over 1000 variables', *times)
+
+def _random_grouping(operator: str, operands: List[Formula],
+                     rng: random.Random) -> Formula:
+    """Combines the given operands with the given binary operator, in a random
+    order and with a random grouping."""
+    operands = list(operands)
+    rng.shuffle(operands)
+    while len(operands) > 1:
+        i = rng.randrange(len(operands) - 1)
+        operands[i:i + 2] = [Formula(operator, operands[i], operands[i + 1])]
+    return operands[0]
+
+def benchmark_canonical_forms() -> None:
+    """Compares a cache of `~propositions.semantics.is_satisfiable` results
+    keyed on formulas with one keyed on their canonical forms, over a corpus
+    of CNF formulas that differ only in the order and grouping of their
+    clauses and literals."""
+    print('Formula vs. canonical cache keys (old, new, speedup):')
+    rng = random.Random(0)
+    clauses = [[Formula('x%d' % rng.randrange(8)) if rng.random() < 0.5 else
+                Formula('~', Formula('x%d' % rng.randrange(8)))
+                for _ in range(3)] for _ in range(6)]
+    corpus = []
+    for _ in range(200):
+        chosen = rng.sample(clauses, 4)
+        corpus.append(_random_grouping(
+            '&', [_random_grouping('|', clause, rng) for clause in chosen],
+            rng))
+    times = []
+    for title, key in [('formula', lambda formula: formula),
+                       ('canonical form', Formula.canonical)]:
+        cache = {}
+        def decide_all():
+            cache.clear()
+            for formula in corpus:
+                k = key(formula)
+                if k not in cache:
+                    cache[k] = is_satisfiable(formula)
+        times.append(_best_time(decide_all, repeat=3))
+        print('  %-44s %9.1f%%' % ('hit rate keyed on ' + title,
+                                   100 * (1 - len(cache) / len(corpus))))
+    _report('decide 200 reordered CNF formulas', *times)
+
+def benchmark_variable_table() -> None:
+    """Compares evaluating a formula in models given as dictionaries with
+    evaluating it in models given as tuples indexed by variable number via a
+    `~propositions.syntax.VariableTable`."""
+    print('Dictionary vs. numbered models (old, new, speedup):')
+    for count in [8, 12]:
+        formula = Formula.parse('(p%d->p0)' % (count - 1))
+        for i in range(1, count - 1):
+            formula = Formula('|', formula, Formula('p%d' % i))
+        table = formula.variable_table()
+        models = list(all_models(table.names))
+        assignments = list(table.assignments())
+        formula.compile(table)
+        # The same precondition checks on both sides: those of evaluate and
+        # evaluate_assignment, or none, via the fold that evaluate is built on.
+        set_validation_level('full')
+        _report('validated, all models of %d variables' % count,
+                _best_time(lambda: [evaluate(formula, model)
+                                    for model in models]),
+                _best_time(lambda: [evaluate_assignment(formula, table,
+                                                        assignment)
+                                    for assignment in assignments]))
+        set_validation_level('off')
+        _report('unvalidated, all models of %d variables' % count,
+                _best_time(lambda: [semantics._evaluate(formula,
+                                                        model.__getitem__)
+                                    for model in models]),
+                _best_time(lambda: [evaluate_assignment(formula, table,
+                                                        assignment)
+                                    for assignment in assignments]))
+        set_validation_level('full')
+
+def benchmark_compiled_evaluation() -> None:
+    """Compares interpreting a formula in each model with evaluating it via
+    `~propositions.syntax.Formula.compile`."""
+    print('Interpreted vs. compiled evaluation (old, new, speedup):')
+    rng = random.Random(0)
+    for count, depth in [(6, 6), (10, 8)]:
+        formula = _random_formula(rng, depth)
+        while formula.num_variables() < count:
+            formula = Formula('->', formula, _random_formula(rng, depth))
+        table = formula.variable_table()
+        models = list(all_models(table.names))
+        assignments = list(table.assignments())
+        print('  %-44s %10.2f us' %
+              ('compile %d nodes' % formula.dag_size(),
+               1e6 * _best_time(formula._compile)))
+        # Both functions are kept, so alternating tables compiles nothing.
+        tables = [table, VariableTable(table.names + ('z',))]
+        print('  %-44s %10.2f us' %
+              ('compile for alternating tables, when kept',
+               1e6 * _best_time(lambda: [formula.compile(table)
+                                         for table in tables]) / 2))
+        _report('truth values over %d variables' % len(table),
+                _best_time(lambda: [evaluate(formula, model)
+                                    for model in models]),
+                _best_time(lambda: list(truth_values(formula, models))))
+        _report('is_tautology over %d variables' % len(table),
+                _best_time(lambda: all([evaluate_assignment(formula, table,
+                                                            assignment)
+                                        for assignment in assignments])),
+                _best_time(lambda: is_tautology(formula)))
+
+def benchmark_truth_tables() -> None:
+    """Compares evaluating a compiled formula in each model with computing its
+    bit-parallel `~propositions.semantics.TruthTable`."""
+    print('Per-model vs. bit-parallel truth tables (old, new, speedup):')
+    rng = random.Random(0)
+    for count in [12, 16, 20]:
+        formula = Formula('p0')
+        for i in range(1, count):
+            formula = Formula(rng.choice(['&', '|', '->', '+', '<->']),
+                              formula, Formula('p' + str(i)))
+        table = formula.variable_table()
+        function = formula.compile()
+        _report('is_tautology over %d variables' % count,
+                _best_time(lambda: all([function(assignment) for assignment
+                                        in table.assignments()]), repeat=1),
+                _best_time(lambda: TruthTable(formula).is_tautology()))
+        _report('all truth values over %d variables' % count,
+                _best_time(lambda: list(map(function, table.assignments())),
+                           repeat=1),
+                _best_time(lambda: list(TruthTable(formula)), repeat=1))
+
+def benchmark_early_exit() -> None:
+    """Compares deciding formulas from their whole truth tables with deciding
+    them chunk by chunk, stopping at the first deciding chunk."""
+    print('Whole vs. early-exit truth tables (old, new, speedup):')
+    for count in [20, 24]:
+        disjunction = conjunction = Formula('p0')
+        for i in range(1, count):
+            disjunction = Formula('|', disjunction, Formula('p' + str(i)))
+            conjunction = Formula('&', conjunction, Formula('p' + str(i)))
+        for title, formula, old, new in [
+                ('tautology, row 0 decides', disjunction,
+                 TruthTable.is_tautology, is_tautology),
+                ('satisfiable, row 1 decides', disjunction,
+                 TruthTable.is_satisfiable, is_satisfiable),
+                ('satisfiable, last row decides', conjunction,
+                 TruthTable.is_satisfiable, is_satisfiable)]:
+            _report('%s, %d vars' % (title, count),
+                    _best_time(lambda: old(TruthTable(formula)), repeat=1),
+                    _best_time(lambda: new(formula), repeat=1))
+
+def benchmark_batch_evaluation() -> None:
+    """Compares evaluating a compiled formula in each row of a matrix of models
+    with evaluating it on the whole matrix via
+    `~propositions.batch.evaluate_batch` and
+    `~propositions.batch.evaluate_packed`."""
+    print('Per-model vs. vectorized batch evaluation (old, new, speedup):')
+    if np is None:
+        print('  skipped, as NumPy is not installed')
+        return
+    rng = random.Random(0)
+    formula = _random_formula(rng, 8)
+    order = sorted(formula.variables())
+    generator = np.random.default_rng(0)
+    for count in [100000, 1000000]:
+        matrix = generator.integers(0, 2, size=(count, len(order)),
+                                    dtype=np.uint8)
+        packed = np.packbits(matrix, axis=0)
+        function = formula.compile(VariableTable(order))
+        rows = [tuple(row) for row in matrix.astype(bool).tolist()]
+        old = _best_time(lambda: [function(row) for row in rows], repeat=1)
+        _report('%d models, uint8 matrix' % count, old,
+                _best_time(lambda: evaluate_batch(formula, matrix, order)))
+        _report('%d models, packed matrix' % count, old,
+                _best_time(lambda: evaluate_packed(formula, packed, order)))
+
+def benchmark_validation_levels() -> None:
+    """Compares proving tautologies with full precondition checks with proving
+    them with checks only at the public API boundary, or with no checks."""
+    print('Full vs. reduced validation of prove_tautology (old, new, '
+          'speedup):')
+    for tautology in ['((p->q)->((~p->q)->(r->q)))',
+                      '((p->(q->r))->((p->q)->(p->(s->r))))']:
+        formula = Formula.parse(tautology)
+        times = {}
+        for level in ['full', 'entry', 'off']:
+            set_validation_level(level)
+            times[level] = _best_time(lambda: prove_tautology(formula),
+                                      repeat=3)
+        set_validation_level('full')
+        for level in ['entry', 'off']:
+            _report('%s over %d variables' % (level, formula.num_variables()),
+                    times['full'], times[level])
+
+def benchmark_single_pass_parsing() -> None:
+    """Compares validating and then parsing each string of a corpus with
+    parsing it once via `~propositions.syntax.Formula.try_parse`."""
+    print('is_formula-then-parse vs. try_parse (old, new, speedup):')
+    for size, depth in [(1000, 4), (1000, 8)]:
+        corpus = _random_corpus(size, depth)
+        def validate_then_parse():
+            for string in corpus:
+                if Formula.is_formula(string):
+                    Formula.parse(string)
+        def parse_once():
+            for string in corpus:
+                Formula.try_parse(string)
+        _report('%d formulas of depth <= %d' % (size, depth),
+                _best_time(validate_then_parse), _best_time(parse_once))
+
+def benchmark_polish_notation() -> None:
+    """Compares the polish notation encoding with the standard infix one, in
+    size and in round-trip speed."""
+    print('Infix vs. polish round trip (old, new, speedup):')
+    for size, depth in [(1000, 4), (1000, 8)]:
+        corpus = _random_corpus(size, depth)
+        polish_corpus = [Formula.parse(string).polish() for string in corpus]
+        print('  %-44s %10d ch %10d ch %8.2fx' %
+              ('size of %d formulas of depth <= %d' % (size, depth),
+               sum(map(len, corpus)), sum(map(len, polish_corpus)),
+               sum(map(len, corpus)) / sum(map(len, polish_corpus))))
+        _report('%d formulas of depth <= %d' % (size, depth),
+                _best_time(lambda: [str(Formula.parse(string))
+                                    for string in corpus]),
+                _best_time(lambda: [Formula.parse_polish(string).polish()
+                                    for string in polish_corpus]))
+
+def _allocated_bytes(function: Callable[[], object]) -> int:
+    """Measures the memory retained by the result of the given function."""
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+def _peak_bytes(function: Callable[[], object]) -> int:
+    """Measures the peak memory allocated while running the given function."""
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return size
+
+def benchmark_formula_arena() -> None:
+    """Compares the memory footprint of formulas with that of their arenas."""
+    print('Formula vs. FormulaArena memory (old, new, ratio):')
+    for size in [10000, 100000]:
+        rng = random.Random(0)
+        names = ['x' + str(i) for i in range(size // 10)]
+        def build():
+            formula = Formula(names[0])
+            for i in range(1, size):
+                formula = Formula(rng.choice(['&', '|', '->']), formula,
+                                  Formula(rng.choice(names)))
+            return formula
+        old = _allocated_bytes(build)
+        rng.seed(0)
+        formula = build()
+        arena = FormulaArena(formula)
+        new = _allocated_bytes(lambda: FormulaArena(formula))
+        print('  %-44s %10d kB %10d kB %8.1fx' %
+              ('%d-node chain' % len(arena), old // 1024, new // 1024,
+               old / new))
+        # Peak memory of parsing into an arena via formulas or directly, once
+        # no node of the formula is alive.
+        string = str(formula)
+        del formula
+        old = _peak_bytes(lambda: FormulaArena(Formula.parse(string)))
+        new = _peak_bytes(lambda: FormulaArena.parse(string))
+        print('  %-44s %10d kB %10d kB %8.1fx' %
+              ('peak, parse %d-node chain' % len(arena), old // 1024,
+               new // 1024, old / new))
+
+def benchmark_binary_serialization() -> None:
+    """Measures the binary serialization of a large proof, and compares its
+    size with that of the proof's string representation."""
+    print('Binary serialization of a large proof:')
+    proof = prove_tautology(Formula.parse('((p->q)->((~p->q)->(r->q)))'))
+    for count in [100000, 1000000]:
+        lines = proof.lines * (count // len(proof.lines))
+        large = Proof(proof.statement, proof.rules, lines)
+        data = serialize(large)
+        if count <= 100000:
+            print('  %-44s %10d kB %10d kB %8.1fx' %
+                  ('size of %d lines (str, serialized)' % len(lines),
+                   len(str(large)) // 1024, len(data) // 1024,
+                   len(str(large)) / len(data)))
+        print('  %-44s %10.2f s' % ('serialize %d lines' % len(lines),
+                                    _best_time(lambda: serialize(large),
+                                               repeat=1)))
+        print('  %-44s %10.2f s' % ('deserialize %d lines' % len(lines),
+                                    _best_time(lambda: deserialize(data),
+                                               repeat=1)))
+
+def _slot_reduce(obj: object) -> tuple:
+    """Reduces the given object the way that pickle reduces objects of classes
+    with ``__slots__`` by default, with all of its set slots, cached values
+    included."""
+    state = {}
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if name != '__weakref__' and hasattr(obj, name):
+                state[name] = getattr(obj, name)
+    return copyreg.__newobj__, (type(obj),), (None, state)
+
+def _slot_dumps(obj: object) -> bytes:
+    """Pickles the given object as it was pickled before formulas, inference
+    rules, proofs, and proof lines defined their own reductions."""
+    buffer = BytesIO()
+    pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = {cls: _slot_reduce for cls in
+                              [Formula, InferenceRule, Proof, Proof.Line]}
+    pickler.dump(obj)
+    return buffer.getvalue()
+
+def benchmark_pool_transfer() -> None:
+    """Compares the size and pickling time of formulas and proofs with their
+    previous default reductions and with their current sharing-preserving
+    ones, and measures sending a proof to a worker process."""
+    print('Default vs. sharing-preserving pickling (old, new, ratio):')
+    corpus = [Formula.parse(string) for string in _random_corpus(1000, 8)]
+    proof = prove_tautology(Formula.parse('((p->q)->((~p->q)->(r->q)))'))
+    # Render everything first, so that cached strings are there to be sent.
+    str(corpus), str(proof)
+    for title, obj in [('1000 formulas of depth <= 8', corpus),
+                       ('proof of %d lines' % len(proof.lines), proof)]:
+        old, new = _slot_dumps(obj), pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        print('  %-44s %10d kB %10d kB %8.1fx' %
+              ('size of ' + title, len(old) // 1024, len(new) // 1024,
+               len(old) / len(new)))
+        _report('pickle and unpickle ' + title,
+                _best_time(lambda: pickle.loads(_slot_dumps(obj))),
+                _best_time(lambda: pickle.loads(pickle.dumps(obj))))
+    with ProcessPoolExecutor(1) as pool:
+        pool.submit(len, []).result()
+        print('  %-44s %10.2f ms' %
+              ('send proof to worker and back',
+               1e3 * _best_time(lambda: pool.submit(id, proof)
+                                            .result())))
+
+if __name__ == '__main__':
+    for name, benchmark in list(globals().items()):
+        if name.startswith('benchmark_') and \
+           (len(sys.argv) == 1 or any(arg in name for arg in sys.argv[1:])):
+            benchmark()
@@ -7,7 +7,9 @@
 """Python infrastructure for the Mathematical Logic through Programming book."""
 
 from functools import lru_cache, wraps
-from typing import Any, Callable, Dict, Iterator, Set, Type, TypeVar, cast
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Type, TypeVar, \
+    cast
 
 T = TypeVar('T')
 
@@ -51,6 +53,42 @@ def frozen(cls: Type[T]) -> Type[T]:
     setattr(cls, '__init__', init_wrapper)
     return cls
 
+def frozen_slots(cls: Type[T]) -> Type[T]:
+    """A class decorator for classes that declare all of their instance
+    variables in ``__slots__``, that disallows assignment to instance variables
+    after construction.
+
+    Unlike `frozen`, this decorator adds no per-construction bookkeeping: the
+    ``__init__`` method of the given class must initialize its slots directly,
+    via `object.__setattr__`, and any other assignment fails.
+
+    Parameters:
+        cls: class to modify.
+
+    Returns:
+        The given class, modified so that assignment to instance variables is
+        disallowed, other than via `object.__setattr__`.
+    """
+    assert '__slots__' in cls.__dict__, cls.__name__ + ' must define __slots__'
+    def setattr_wrapper(self, name, value):
+        raise Exception("Cannot assign to field '" + name +
+                        "' of immutable class '" + cls.__name__ + "'")
+    def delattr_wrapper(self, name):
+        raise Exception("Cannot delete field '" + name +
+                        "' of immutable class '" + cls.__name__ + "'")
+    def setstate(self, state):
+        # Restores the slots of a copied or unpickled instance.
+        for slots in state:
+            if slots is not None:
+                for name, value in slots.items():
+                    object.__setattr__(self, name, value)
+
+    setattr(cls, '__setattr__', setattr_wrapper)
+    setattr(cls, '__delattr__', delattr_wrapper)
+    if '__setstate__' not in cls.__dict__:
+        setattr(cls, '__setstate__', setstate)
+    return cls
+
 class frozendict(Dict[Any, Any]):
     """An immutable variant of the built-in `dict` class."""
 
@@ -64,33 +102,197 @@ class frozendict(Dict[Any, Any]):
                   popitem = setdefault =  cast(Callable[..., Any], update)
 S = TypeVar('S')
 
-def memoized_parameterless_method(method: Callable[[T], S]) -> Callable[[T], S]:
+def memoized_parameterless_method(method: Optional[Callable[[T], S]] = None,
+                                  *, copy: bool = True) -> Any:
     """A method decorator for parameterless methods of immutable classes that
     memoizes the return value to avoid recalculation.
 
+    The value is cached in the instance variable
+    ``_memoized_``\ `methodname`, which classes that use ``__slots__`` must
+    declare. The decorator may be applied either directly, or as
+    ``@memoized_parameterless_method(copy=False)`` for methods that return
+    immutable values, such as `frozenset`\ s, which can be shared as they are.
+
     Parameters:
         method: method to modify.
+        copy: whether each execution of the modified method should return a
+            fresh copy of the memoized value, if it has a `copy`\ ``()``
+            method.
 
     Returns:
         The given method, modified so that after its first execution, its
         functionality is replaced with simply returning the value calculated by
-        its first execution. If the value calculated by the given method has a
-        `copy`\ ``()`` method, then instead of returning this value, each
-        execution of the returned method, including the first one, makes a fresh
-        call to this `copy`\ ``()`` method and returns the result.
+        its first execution. If `copy` is ``True`` and the value calculated by
+        the given method has a `copy`\ ``()`` method, then instead of returning
+        this value, each execution of the returned method, including the first
+        one, makes a fresh call to this `copy`\ ``()`` method and returns the
+        result. If no method is given, a decorator that modifies its argument
+        in this way is returned instead.
     """
-    methodname = method.__name__
-    @wraps(method)
-    def wrapper(obj):
-        value = method(obj)
-        if hasattr(value, 'copy'):
-            new_wrapper = lambda:value.copy()
-        else:
-            new_wrapper = lambda:value
-        object.__setattr__(obj, methodname, wraps(method)(new_wrapper))
-        return new_wrapper()
+    if method is None:
+        return lambda method: memoized_parameterless_method(method, copy=copy)
+    cache_name = '_memoized_' + method.__name__
+    if copy:
+        @wraps(method)
+        def wrapper(obj):
+            try:
+                value = getattr(obj, cache_name)
+            except AttributeError:
+                value = method(obj)
+                object.__setattr__(obj, cache_name, value)
+            return value.copy() if hasattr(value, 'copy') else value
+    else:
+        @wraps(method)
+        def wrapper(obj):
+            try:
+                return getattr(obj, cache_name)
+            except AttributeError:
+                value = method(obj)
+                object.__setattr__(obj, cache_name, value)
+                return value
+    return wrapper
+
+#: The registry of the caches created by `registered_cache`, by the qualified
+#: names of their functions.
+_cache_registry: Dict[str, Any] = {}
+
+def registered_cache(maxsize: Optional[int] = 128) -> \
+        Callable[[Callable[..., S]], Callable[..., S]]:
+    """A function decorator that caches return values as `functools.lru_cache`
+    does, and registers the cache so that it can be observed and tuned at
+    runtime via `cache_statistics` and `resize_cache`.
+
+    The decorated function is a stable wrapper that owns a replaceable inner
+    `functools.lru_cache`, so resizing the cache replaces only the inner cache,
+    and every existing reference to the decorated function sees the change.
+    Like a `functools.lru_cache` function, the wrapper offers ``cache_info()``,
+    ``cache_clear()``, and ``__wrapped__``.
+
+    Parameters:
+        maxsize: initial maximal number of cached return values, or ``None``
+            for no limit.
+
+    Returns:
+        A decorator that returns its given function with a registered cache,
+        under the name ``'``\ `module`\ ``.``\ `function`\ ``'``.
+    """
+    def decorator(function: Callable[..., S]) -> Callable[..., S]:
+        cached = lru_cache(maxsize=maxsize)(function)
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            return cached(*args, **kwargs)
+        def cache_info():
+            return cached.cache_info()
+        def cache_clear() -> None:
+            cached.cache_clear()
+        def resize(maxsize: Optional[int]) -> None:
+            nonlocal cached
+            cached = lru_cache(maxsize=maxsize)(function)
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        wrapper._resize = resize
+        _cache_registry[function.__module__ + '.' + function.__qualname__] = \
+            wrapper
+        return wrapper
+    return decorator
+
+def cache_statistics() -> Dict[str, Any]:
+    """Reports the statistics of all registered caches.
+
+    Returns:
+        A mapping from the name of each registered cache to its statistics, as
+        returned by `functools.lru_cache`'s ``cache_info()``, i.e., its
+        ``hits``, ``misses``, ``maxsize``, and ``currsize``.
+    """
+    return {name: cached.cache_info()
+            for name, cached in _cache_registry.items()}
+
+def resize_cache(name: str, maxsize: Optional[int]) -> None:
+    """Replaces the given registered cache with an empty one of the given size.
+
+    Parameters:
+        name: name of the registered cache to resize, as reported by
+            `cache_statistics`.
+        maxsize: new maximal number of cached return values, ``0`` to disable
+            caching, or ``None`` for no limit.
+    """
+    _cache_registry[name]._resize(maxsize)
+
+def clear_caches() -> None:
+    """Empties all registered caches and resets their statistics."""
+    for cached in _cache_registry.values():
+        cached.cache_clear()
+
+#: The supported validation levels: ``'full'`` to check the preconditions of
+#: every call of a `validated` function, ``'entry'`` to check them only in
+#: calls that are not nested in another call of a `validated` function, i.e.,
+#: at the boundary of the public API, and ``'off'`` to not check them at all.
+VALIDATION_LEVELS = ('full', 'entry', 'off')
+
+_validation_level = 'full'
+# The number of calls of validated functions that are in progress, per thread.
+_validation_depth = threading.local()
+
+def set_validation_level(level: str) -> str:
+    """Sets the process-wide validation level.
+
+    Parameters:
+        level: the new validation level, one of `VALIDATION_LEVELS`.
+
+    Returns:
+        The previous validation level.
+    """
+    global _validation_level
+    assert level in VALIDATION_LEVELS, 'Unknown validation level ' + str(level)
+    previous = _validation_level
+    _validation_level = level
+    return previous
+
+def validation_level() -> str:
+    """Finds the process-wide validation level.
+
+    Returns:
+        The current validation level, one of `VALIDATION_LEVELS`, which is
+        ``'full'`` unless changed via `set_validation_level`.
+    """
+    return _validation_level
+
+def validated(function: Callable[..., S]) -> Callable[..., S]:
+    """A function decorator for functions that check their preconditions only
+    if `validating` returns ``True``, which keeps track of the calls of such
+    functions that are in progress.
+
+    Parameters:
+        function: function to modify.
+
+    Returns:
+        The given function, modified to keep track of its calls.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_validation_depth, 'depth', 0)
+        _validation_depth.depth = depth + 1
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _validation_depth.depth = depth
     return wrapper
 
+def validating() -> bool:
+    """Checks whether the `validated` function that is currently running should
+    check its preconditions, according to the validation level.
+
+    Returns:
+        ``True`` if the validation level is ``'full'``, or if it is
+        ``'entry'`` and the currently running `validated` function was not
+        called by another, ``False`` otherwise.
+    """
+    if _validation_level == 'full':
+        return True
+    elif _validation_level == 'off':
+        return False
+    return getattr(_validation_depth, 'depth', 0) <= 1
+
 
 class __prefix_with_index_sequence_generator:
     """ A generator for a sequence of the form 'z1', 'z2', 'z3', ..., where the
@@ -125,7 +327,7 @@ fresh_variable_name_generator: Iterator[str] = \
 fresh_constant_name_generator: Iterator[str] = \
     __prefix_with_index_sequence_generator('e')
 
-@lru_cache(maxsize=100) # Cache the return value of is_z_and_number
+@registered_cache(maxsize=1024)
 def is_z_and_number(string: str) -> bool:
     """Checks if the given string is ``z`` followed by a number.
 
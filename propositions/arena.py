@@ -0,0 +1,294 @@
+# This file is part of the materials accompanying the book
+# "Mathematical Logic through Python" by Gonczarowski and Nisan,
+# Cambridge University Press. Book site: www.LogicThruPython.org
+# (c) Yannai A. Gonczarowski and Noam Nisan, 2017-2022
+# File name: propositions/arena.py
+
+"""Compact array-backed representation of propositional formulas."""
+
+from __future__ import annotations
+from array import array
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+from logic_utils import frozen_slots
+
+from propositions.syntax import *
+from propositions.syntax import _next_token
+
+#: The constants and operators that may label a node of a `FormulaArena`. A
+#: node labeled by the constant or operator at index `i` of this tuple has the
+#: opcode `i`\ ``+1``, and a node labeled by a variable name has the opcode
+#: ``0``.
+OPERATORS = ('T', 'F', '~', '&', '|', '->', '+', '<->', '-&', '-|')
+
+_VARIABLE = 0
+_OPCODES = {operator: opcode for opcode, operator in enumerate(OPERATORS, 1)}
+
+@frozen_slots
+class FormulaArena:
+    """An immutable propositional formula in array representation, in which
+    each distinct subformula is stored once as an integer opcode and integer
+    operand indices, in parallel arrays.
+
+    Nodes are numbered so that the operands of every node precede it, and the
+    last node is the root of the whole formula.
+
+    Attributes:
+        opcodes (`~array.array`): the opcode of each node, see `OPERATORS`.
+        firsts (`~array.array`): for each node, the number of its first operand
+            if its root is a unary or binary operator, the number in
+            `symbols` of its variable name if it is a variable name, or
+            ``-1`` if it is a constant.
+        seconds (`~array.array`): for each node, the number of its second
+            operand if its root is a binary operator, or ``-1`` otherwise.
+        symbols (`~typing.Tuple`\\[`str`, ...]): the symbol table of the
+            variable names of the formula, in order of first appearance.
+    """
+    __slots__ = ('opcodes', 'firsts', 'seconds', 'symbols')
+    opcodes: array
+    firsts: array
+    seconds: array
+    symbols: Tuple[str, ...]
+
+    def __init__(self, formula: Formula):
+        """Initializes a `FormulaArena` from the given formula.
+
+        Parameters:
+            formula: formula to represent.
+        """
+        opcodes = array('B')
+        firsts = array('i')
+        seconds = array('i')
+        variables: List[str] = []
+        variable_numbers: Dict[str, int] = {}
+        node_numbers: Dict[int, int] = {}
+        # Formulas are interned, so identity coincides with structural
+        # equality, and each distinct node is numbered once, after its
+        # operands.
+        for node in formula.subformulas():
+            first, second = node.first, node.second
+            if is_variable(node.root):
+                if node.root not in variable_numbers:
+                    variable_numbers[node.root] = len(variables)
+                    variables.append(node.root)
+                opcodes.append(_VARIABLE)
+                firsts.append(variable_numbers[node.root])
+            else:
+                opcodes.append(_OPCODES[node.root])
+                firsts.append(-1 if first is None else node_numbers[id(first)])
+            seconds.append(-1 if second is None else node_numbers[id(second)])
+            node_numbers[id(node)] = len(opcodes) - 1
+        object.__setattr__(self, 'opcodes', opcodes)
+        object.__setattr__(self, 'firsts', firsts)
+        object.__setattr__(self, 'seconds', seconds)
+        object.__setattr__(self, 'symbols', tuple(variables))
+
+    @staticmethod
+    def parse(string: str) -> FormulaArena:
+        """Parses the given valid string representation straight into an
+        arena, without building the formula that it represents.
+
+        Parameters:
+            string: string to parse.
+
+        Returns:
+            An arena representing the formula whose standard string
+            representation is the given string.
+
+        Examples:
+            >>> FormulaArena.parse('((p&q)|~(p&q))')
+            ((p&q)|~(p&q))
+        """
+        builder = _ArenaBuilder()
+        result, index = Formula._parse_at(string, 0, builder.node)
+        assert not isinstance(result, ParsingError), str(result)
+        assert index == len(string), \
+               str(ParsingError(index, 'end of string',
+                                string[index:_next_token(string, index)]))
+        return builder.arena()
+
+    @staticmethod
+    def parse_polish(string: str) -> FormulaArena:
+        """Parses the given polish notation representation straight into an
+        arena, without building the formula that it represents.
+
+        Parameters:
+            string: string to parse.
+
+        Returns:
+            An arena representing the formula whose polish notation
+            representation is the given string.
+        """
+        builder = _ArenaBuilder()
+        Formula._parse_polish(string, builder.node)
+        return builder.arena()
+
+    def __len__(self) -> int:
+        """Computes the number of nodes of the current arena.
+
+        Returns:
+            The number of distinct subformulas of the represented formula.
+        """
+        return len(self.opcodes)
+
+    def to_formula(self) -> Formula:
+        """Converts the current arena back to a formula.
+
+        Returns:
+            The formula represented by the current arena.
+        """
+        nodes: List[Formula] = []
+        for opcode, first, second in zip(self.opcodes, self.firsts,
+                                         self.seconds):
+            if opcode == _VARIABLE:
+                nodes.append(Formula(self.symbols[first]))
+            elif first == -1:
+                nodes.append(Formula(OPERATORS[opcode - 1]))
+            elif second == -1:
+                nodes.append(Formula(OPERATORS[opcode - 1], nodes[first]))
+            else:
+                nodes.append(Formula(OPERATORS[opcode - 1], nodes[first],
+                                     nodes[second]))
+        return nodes[-1]
+
+    def __repr__(self) -> str:
+        """Computes the string representation of the represented formula.
+
+        Returns:
+            The standard string representation of the represented formula.
+        """
+        opcodes, firsts, seconds = self.opcodes, self.firsts, self.seconds
+        tokens = []
+        # Node numbers to render, interleaved with literal tokens to emit.
+        stack: List[object] = [len(opcodes) - 1]
+        while len(stack) > 0:
+            item = stack.pop()
+            if isinstance(item, str):
+                tokens.append(item)
+                continue
+            opcode = opcodes[item]
+            if opcode == _VARIABLE:
+                tokens.append(self.symbols[firsts[item]])
+            elif firsts[item] == -1:
+                tokens.append(OPERATORS[opcode - 1])
+            elif seconds[item] == -1:
+                tokens.append(OPERATORS[opcode - 1])
+                stack.append(firsts[item])
+            else:
+                tokens.append('(')
+                stack.extend((')', seconds[item], OPERATORS[opcode - 1],
+                              firsts[item]))
+        return ''.join(tokens)
+
+    def variables(self) -> Set[str]:
+        """Finds all variable names in the represented formula.
+
+        Returns:
+            A set of all variable names used in the represented formula.
+        """
+        return set(self.symbols)
+
+    def evaluate(self, model: Mapping[str, bool]) -> bool:
+        """Calculates the truth value of the represented formula in the given
+        model.
+
+        Parameters:
+            model: model over (possibly a superset of) the variable names of the
+                represented formula, to calculate the truth value in.
+
+        Returns:
+            The truth value of the represented formula in the given model.
+        """
+        assignment = [model[variable] for variable in self.symbols]
+        values: List[bool] = []
+        for opcode, first, second in zip(self.opcodes, self.firsts,
+                                         self.seconds):
+            if opcode == _VARIABLE:
+                value = assignment[first]
+            elif opcode == 1: # T
+                value = True
+            elif opcode == 2: # F
+                value = False
+            elif opcode == 3: # ~
+                value = not values[first]
+            else:
+                a, b = values[first], values[second]
+                if opcode == 4: # &
+                    value = a and b
+                elif opcode == 5: # |
+                    value = a or b
+                elif opcode == 6: # ->
+                    value = not a or b
+                elif opcode == 7: # +
+                    value = a != b
+                elif opcode == 8: # <->
+                    value = a == b
+                elif opcode == 9: # -&
+                    value = not (a and b)
+                else: # -|
+                    value = not (a or b)
+            values.append(value)
+        return values[-1]
+
+class _ArenaBuilder:
+    """Collects the nodes of a `FormulaArena` as they are parsed, storing each
+    distinct node once."""
+
+    def __init__(self) -> None:
+        self.opcodes = array('B')
+        self.firsts = array('i')
+        self.seconds = array('i')
+        self.symbols: List[str] = []
+        self.symbol_numbers: Dict[str, int] = {}
+        self.node_numbers: Dict[Tuple[int, int, int], int] = {}
+
+    def node(self, root: str, first: Optional[int] = None,
+             second: Optional[int] = None) -> int:
+        """Numbers the node with the given root and operands, adding it unless
+        an equal node was already added.
+
+        Parameters:
+            root: the root of the node.
+            first: the number of the first operand of the node, if its root is
+                a unary or binary operator.
+            second: the number of the second operand of the node, if its root
+                is a binary operator.
+
+        Returns:
+            The number of the node.
+        """
+        if is_variable(root):
+            opcode = _VARIABLE
+            number = self.symbol_numbers.get(root)
+            if number is None:
+                number = self.symbol_numbers[root] = len(self.symbols)
+                self.symbols.append(root)
+            first = number
+        else:
+            opcode = _OPCODES[root]
+            if first is None:
+                first = -1
+        if second is None:
+            second = -1
+        key = (opcode, first, second)
+        number = self.node_numbers.get(key)
+        if number is None:
+            number = self.node_numbers[key] = len(self.opcodes)
+            self.opcodes.append(opcode)
+            self.firsts.append(first)
+            self.seconds.append(second)
+        return number
+
+    def arena(self) -> FormulaArena:
+        """Builds the arena of the nodes added so far.
+
+        Returns:
+            An arena whose nodes are those added so far, the last of which is
+            its root.
+        """
+        arena = FormulaArena.__new__(FormulaArena)
+        object.__setattr__(arena, 'opcodes', self.opcodes)
+        object.__setattr__(arena, 'firsts', self.firsts)
+        object.__setattr__(arena, 'seconds', self.seconds)
+        object.__setattr__(arena, 'symbols', tuple(self.symbols))
+        return arena
@@ -0,0 +1,93 @@
+# This file is part of the materials accompanying the book
+# "Mathematical Logic through Python" by Gonczarowski and Nisan,
+# Cambridge University Press. Book site: www.LogicThruPython.org
+# (c) Yannai A. Gonczarowski and Noam Nisan, 2017-2022
+# File name: propositions/arena_test.py
+
+"""Tests for the propositions.arena module."""
+
+from propositions.syntax import *
+from propositions.semantics import *
+from propositions.arena import *
+
+arena_formulas = ['p', 'T', '~F', '(x12->y)', '~~(p<->~p)',
+                  '((p1-&~p2)-|(T+(p1&x)))', '((p|q)->((p|q)&~(p|q)))',
+                  '(((x+y)<->z)|~(w->(F&T)))']
+
+def test_round_trip(debug=False):
+    for s in arena_formulas:
+        if debug:
+            print('Testing arena round trip of', s)
+        f = Formula.parse(s)
+        arena = FormulaArena(f)
+        assert arena.to_formula() is f
+        assert str(arena) == s
+        assert arena.variables() == f.variables()
+
+def test_parse(debug=False):
+    for s in arena_formulas:
+        if debug:
+            print('Testing parsing', s, 'into an arena')
+        f = Formula.parse(s)
+        for arena in [FormulaArena.parse(s),
+                      FormulaArena.parse_polish(f.polish())]:
+            assert str(arena) == s
+            assert len(arena) == len(FormulaArena(f))
+            assert arena.to_formula() is f
+            assert arena.variables() == f.variables()
+    for s in ['', '(p&q', 'p&q', '(p&q))', '~']:
+        if debug:
+            print('Testing that parsing', repr(s), 'into an arena fails')
+        failed = False
+        try:
+            FormulaArena.parse(s)
+        except AssertionError:
+            failed = True
+        assert failed, 'Parsing ' + repr(s) + ' did not fail'
+    if debug:
+        print('Testing that parsing into an arena builds no formulas')
+    import gc
+    from propositions.syntax import _interned_formulas
+    gc.collect()
+    before = len(_interned_formulas)
+    s = '(' * 1000 + 'z9000' + ''.join('->~z' + str(9001 + i % 50) + ')'
+                                       for i in range(1000))
+    arena = FormulaArena.parse(s)
+    polish_arena = FormulaArena.parse_polish('->' * 1000 + 'z9000' +
+                                             ''.join('~z' + str(9001 + i % 50)
+                                                     for i in range(1000)))
+    assert len(_interned_formulas) == before
+    assert len(arena) == len(polish_arena) == 1 + 2 * 50 + 1000
+    assert str(arena) == s and str(polish_arena) == s
+
+def test_sharing(debug=False):
+    if debug:
+        print('Testing that shared subformulas are stored once')
+    f = Formula.parse('((p|q)->((p|q)&~(p|q)))')
+    arena = FormulaArena(f)
+    assert len(arena) == 6
+    assert arena.symbols == ('p', 'q')
+
+def test_evaluate(debug=False):
+    for s in arena_formulas:
+        f = Formula.parse(s)
+        arena = FormulaArena(f)
+        variables = sorted(f.variables())
+        for model in all_models(variables):
+            if debug:
+                print('Testing arena evaluation of', s, 'in', model)
+            assert arena.evaluate(model) == evaluate(f, model)
+
+def test_deep(debug=False):
+    if debug:
+        print('Testing arena of a 200000-deep formula')
+    f = Formula('x0')
+    for i in range(1, 100000):
+        f = Formula('->', Formula('~', f), Formula('x' + str(i % 7)))
+    arena = FormulaArena(f)
+    assert len(arena) == 2 * 99999 + 7
+    assert arena.to_formula() is f
+    assert arena.variables() == {'x' + str(i) for i in range(7)}
+    assert arena.evaluate({'x' + str(i): True for i in range(7)})
+    assert not arena.evaluate({'x' + str(i): False for i in range(7)})
+    assert str(arena).startswith('(~(~(~(')
@@ -0,0 +1,153 @@
+# This file is part of the materials accompanying the book
+# "Mathematical Logic through Python" by Gonczarowski and Nisan,
+# Cambridge University Press. Book site: www.LogicThruPython.org
+# (c) Yannai A. Gonczarowski and Noam Nisan, 2017-2022
+# File name: propositions/batch.py
+
+"""Vectorized evaluation of propositional formulas over batches of models.
+
+This module requires NumPy, which is an optional dependency: the module can be
+imported without it, but its functions then raise `ImportError`."""
+
+from typing import Any, Dict, Sequence, Tuple
+
+from propositions.syntax import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: The default number of models evaluated at once. The columns of all distinct
+#: subformulas of an evaluated formula are alive at once, so the memory taken
+#: by an evaluation is proportional to this number.
+CHUNK_SIZE = 1 << 16
+
+def _require_numpy() -> None:
+    """Checks that NumPy is installed, and raises `ImportError` otherwise."""
+    if np is None:
+        raise ImportError('Batch evaluation requires NumPy')
+
+def _evaluate_columns(formula: Formula, columns: Dict[str, Any], ones: Any) \
+        -> Any:
+    """Evaluates the given formula on whole columns of truth values at once.
+
+    Parameters:
+        formula: formula to evaluate.
+        columns: mapping from each variable name of the given formula to its
+            column, a NumPy array either of `bool`\\ s or of bytes that each
+            pack eight truth values.
+        ones: column of the same shape and type as the given columns, that is
+            ``True`` everywhere.
+
+    Returns:
+        The column of the truth values of the given formula.
+    """
+    # The bitwise operators of NumPy are the logical ones on bool arrays.
+    def column(subformula: Formula, operands: Tuple[Any, ...]) -> Any:
+        root = subformula.root
+        if root == 'T':
+            return ones
+        elif root == 'F':
+            return ~ones
+        elif is_variable(root):
+            return columns[root]
+        elif root == '~':
+            return ~operands[0]
+        first, second = operands
+        if root == '&':
+            return first & second
+        elif root == '|':
+            return first | second
+        elif root == '->':
+            return ~first | second
+        elif root == '+':
+            return first ^ second
+        elif root == '<->':
+            return ~(first ^ second)
+        elif root == '-&':
+            return ~(first & second)
+        else:
+            assert root == '-|'
+            return ~(first | second)
+    return formula.fold(column)
+
+def evaluate_batch(formula: Formula, models: Any,
+                   variable_order: Sequence[str],
+                   chunk_size: int = CHUNK_SIZE) -> Any:
+    """Calculates the truth value of the given formula in each of the given
+    models, via vectorized operations.
+
+    Parameters:
+        formula: formula to calculate the truth value of.
+        models: two-dimensional NumPy array of `bool`\\ s or of ``0``\\ s and
+            ``1``\\ s (e.g., of type `uint8`), with one row per model and one
+            column per variable name of the given variable order.
+        variable_order: the variable names of the columns of the given models,
+            (possibly a superset of) the variable names of the given formula.
+        chunk_size: number of models to evaluate at once.
+
+    Returns:
+        A NumPy array of `bool`\\ s of the respective truth values of the given
+        formula in each of the given models.
+    """
+    _require_numpy()
+    models = np.asarray(models)
+    assert models.ndim == 2 and models.shape[1] == len(variable_order)
+    assert chunk_size > 0
+    numbers = {variable: number
+               for number, variable in enumerate(variable_order)}
+    variables = formula.variables_frozen()
+    assert variables.issubset(numbers)
+    result = np.empty(models.shape[0], dtype=bool)
+    for start in range(0, models.shape[0], chunk_size):
+        # Transposed, so that the column of each variable name is contiguous.
+        chunk = np.ascontiguousarray(models[start:start + chunk_size].T)
+        if chunk.dtype != np.bool_:
+            chunk = chunk != 0
+        columns = {variable: chunk[numbers[variable]] for variable in variables}
+        result[start:start + chunk.shape[1]] = _evaluate_columns(
+            formula, columns, np.ones(chunk.shape[1], dtype=bool))
+    return result
+
+def evaluate_packed(formula: Formula, packed_models: Any,
+                    variable_order: Sequence[str],
+                    chunk_size: int = CHUNK_SIZE // 8) -> Any:
+    """Calculates the truth value of the given formula in each of the given
+    bit-packed models, eight models at a time per byte operation.
+
+    Parameters:
+        formula: formula to calculate the truth value of.
+        packed_models: two-dimensional NumPy array of type `uint8` of models
+            packed along their rows as by `numpy.packbits`\\ ``(``\\
+            `models`\\ ``, axis=0)``, where `models` is as in
+            `evaluate_batch`, i.e., with one row per eight models and one
+            column per variable name of the given variable order.
+        variable_order: the variable names of the columns of the given models,
+            (possibly a superset of) the variable names of the given formula.
+        chunk_size: number of rows of the given packed models, i.e., of
+            groups of eight models, to evaluate at once.
+
+    Returns:
+        A NumPy array of type `uint8` of the respective truth values of the
+        given formula in each of the given models, packed as by
+        `numpy.packbits`, which `numpy.unpackbits`\\ ``(``\\ `result`\\ ``,
+        count=``\\ `number_of_models`\\ ``)`` unpacks. The padding bits of the
+        last byte are unspecified.
+    """
+    _require_numpy()
+    packed_models = np.asarray(packed_models, dtype=np.uint8)
+    assert packed_models.ndim == 2 and \
+           packed_models.shape[1] == len(variable_order)
+    assert chunk_size > 0
+    numbers = {variable: number
+               for number, variable in enumerate(variable_order)}
+    variables = formula.variables_frozen()
+    assert variables.issubset(numbers)
+    result = np.empty(packed_models.shape[0], dtype=np.uint8)
+    for start in range(0, packed_models.shape[0], chunk_size):
+        chunk = np.ascontiguousarray(packed_models[start:start + chunk_size].T)
+        columns = {variable: chunk[numbers[variable]] for variable in variables}
+        result[start:start + chunk.shape[1]] = _evaluate_columns(
+            formula, columns, np.full(chunk.shape[1], 0xFF, dtype=np.uint8))
+    return result
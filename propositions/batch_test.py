@@ -0,0 +1,60 @@
+# This file is part of the materials accompanying the book
+# "Mathematical Logic through Python" by Gonczarowski and Nisan,
+# Cambridge University Press. Book site: www.LogicThruPython.org
+# (c) Yannai A. Gonczarowski and Noam Nisan, 2017-2022
+# File name: propositions/batch_test.py
+
+"""Tests for the propositions.batch module."""
+
+from propositions.syntax import *
+from propositions.semantics import *
+from propositions.batch import *
+
+batch_formulas = ['p', 'T', '~F', '(x12->y)', '~~(p<->~p)',
+                  '((p1-&~p2)-|(T+(p1&x)))', '((p|q)->((p|q)&~(p|q)))',
+                  '(((x+y)<->z)|~(w->(F&T)))']
+
+def test_evaluate_batch(debug=False):
+    if np is None:
+        if debug:
+            print('Skipping batch evaluation tests, as NumPy is not installed')
+        return
+    for s in batch_formulas:
+        formula = Formula.parse(s)
+        order = sorted(formula.variables() | {'z'}, reverse=True)
+        models = list(all_models(order))
+        matrix = np.array([[model[variable] for variable in order]
+                           for model in models], dtype=bool)
+        expected = list(truth_values(formula, models))
+        for array in [matrix, matrix.astype(np.uint8)]:
+            for chunk_size in [1, 3, 1000]:
+                if debug:
+                    print('Testing batch evaluation of', s, 'on', array.dtype,
+                          'models in chunks of', chunk_size)
+                result = evaluate_batch(formula, array, order, chunk_size)
+                assert result.dtype == np.bool_
+                assert result.tolist() == expected
+
+def test_evaluate_packed(debug=False):
+    if np is None:
+        if debug:
+            print('Skipping batch evaluation tests, as NumPy is not installed')
+        return
+    for s in batch_formulas:
+        formula = Formula.parse(s)
+        order = sorted(formula.variables() | {'z'})
+        # Repeated so that the number of models is not a multiple of eight.
+        models = list(all_models(order)) * 3 + [{variable: True
+                                                  for variable in order}]
+        packed = np.packbits(np.array([[model[variable] for variable in order]
+                                       for model in models], dtype=bool),
+                             axis=0)
+        expected = list(truth_values(formula, models))
+        for chunk_size in [1, 2, 1000]:
+            if debug:
+                print('Testing packed evaluation of', s, 'in chunks of',
+                      chunk_size)
+            result = evaluate_packed(formula, packed, order, chunk_size)
+            assert result.dtype == np.uint8
+            assert np.unpackbits(result, count=len(models)).astype(
+                bool).tolist() == expected
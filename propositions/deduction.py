@@ -6,10 +6,18 @@
 
 """Useful proof manipulation maneuvers in Propositional Logic."""
 
+from logic_utils import validated, validating
+
 from propositions.syntax import *
 from propositions.proofs import *
 from propositions.axiomatic_systems import *
 
+# remove_assumption specializes these axioms for nearly every line of the proof
+# it transforms, so their specialization plans are compiled once.
+_I1_SPECIALIZER = I1.compile_specializer()
+_D_SPECIALIZER = D.compile_specializer()
+
+@validated
 def prove_corollary(antecedent_proof: Proof, consequent: Formula,
                     conditional: InferenceRule) -> Proof:
     """Converts the given proof of a formula `antecedent` to a proof of the
@@ -30,10 +38,11 @@ def prove_corollary(antecedent_proof: Proof, consequent: Formula,
         proof, via the same inference rules as the given proof and in addition
         `~propositions.axiomatic_systems.MP` and `conditional`.
     """
-    assert antecedent_proof.is_valid()
-    assert InferenceRule([],
-                         Formula('->', antecedent_proof.statement.conclusion,
-                                 consequent)).is_specialization_of(conditional)
+    if validating():
+        assert antecedent_proof.is_valid()
+        assert InferenceRule(
+            [], Formula('->', antecedent_proof.statement.conclusion,
+                        consequent)).is_specialization_of(conditional)
     # Task 5.3a
     # Joan
     statement = InferenceRule(antecedent_proof.statement.assumptions, consequent)
@@ -48,6 +57,7 @@ def prove_corollary(antecedent_proof: Proof, consequent: Formula,
     return Proof(statement, rules, lines)
     # Joan
 
+@validated
 def combine_proofs(antecedent1_proof: Proof, antecedent2_proof: Proof,
                    consequent: Formula, double_conditional: InferenceRule) -> \
         Proof:
@@ -72,15 +82,16 @@ def combine_proofs(antecedent1_proof: Proof, antecedent2_proof: Proof,
         proofs, via the same inference rules as the given proofs and in addition
         `~propositions.axiomatic_systems.MP` and `double_conditional`.
     """
-    assert antecedent1_proof.is_valid()
-    assert antecedent2_proof.is_valid()
-    assert antecedent1_proof.statement.assumptions == \
-           antecedent2_proof.statement.assumptions
-    assert antecedent1_proof.rules == antecedent2_proof.rules
-    assert InferenceRule(
-        [], Formula('->', antecedent1_proof.statement.conclusion,
-        Formula('->', antecedent2_proof.statement.conclusion, consequent))
-        ).is_specialization_of(double_conditional)
+    if validating():
+        assert antecedent1_proof.is_valid()
+        assert antecedent2_proof.is_valid()
+        assert antecedent1_proof.statement.assumptions == \
+               antecedent2_proof.statement.assumptions
+        assert antecedent1_proof.rules == antecedent2_proof.rules
+        assert InferenceRule(
+            [], Formula('->', antecedent1_proof.statement.conclusion,
+            Formula('->', antecedent2_proof.statement.conclusion, consequent))
+            ).is_specialization_of(double_conditional)
     # Task 5.3b
     # Joan
     statement = InferenceRule(antecedent1_proof.statement.assumptions, consequent)
@@ -99,6 +110,7 @@ def combine_proofs(antecedent1_proof: Proof, antecedent2_proof: Proof,
     return Proof(statement, rules, lines)
     # Joan
 
+@validated
 def remove_assumption(proof: Proof) -> Proof:
     """Converts the given proof of some `conclusion` formula, the last
     assumption of which is an assumption `assumption`, to a proof of
@@ -119,10 +131,11 @@ def remove_assumption(proof: Proof) -> Proof:
         `~propositions.axiomatic_systems.I1`, and
         `~propositions.axiomatic_systems.D`.
     """        
-    assert proof.is_valid()
-    assert len(proof.statement.assumptions) > 0
-    for rule in proof.rules:
-        assert rule == MP or len(rule.assumptions) == 0
+    if validating():
+        assert proof.is_valid()
+        assert len(proof.statement.assumptions) > 0
+        for rule in proof.rules:
+            assert rule == MP or len(rule.assumptions) == 0
     # Task 5.4
     # Joan
     assumptions = proof.statement.assumptions[:-1] # Get rid of phi
@@ -136,7 +149,7 @@ def remove_assumption(proof: Proof) -> Proof:
         
         if L.formula in assumptions:
             lines.append(L)
-            lines.append(Proof.Line(I1.specialize({'p': phi, 'q': L.formula}).conclusion, I1, []))
+            lines.append(Proof.Line(_I1_SPECIALIZER.instantiate_conclusion((phi, L.formula)), I1, []))
             lines.append(Proof.Line(Formula('->', phi, L.formula), MP, [len(lines)-2, len(lines)-1]))
 
         elif L.formula == phi:
@@ -146,7 +159,7 @@ def remove_assumption(proof: Proof) -> Proof:
             n = len(lines)
             q = proof.lines[L.assumptions[1]].formula.first
 
-            lines.append(Proof.Line(D.specialize({'p': phi, 'q': q, 'r': L.formula}).conclusion, D, []))
+            lines.append(Proof.Line(_D_SPECIALIZER.instantiate_conclusion((phi, q, L.formula)), D, []))
 
             antecedent_1 = lines[-1].formula.first
             for line_number in range(len(lines)):
@@ -164,12 +177,13 @@ def remove_assumption(proof: Proof) -> Proof:
 
         else:
             lines.append(L)
-            lines.append(Proof.Line(I1.specialize({'p': phi, 'q': L.formula}).conclusion, I1, []))
+            lines.append(Proof.Line(_I1_SPECIALIZER.instantiate_conclusion((phi, L.formula)), I1, []))
             lines.append(Proof.Line(Formula('->', phi, L.formula), MP, [len(lines)-2, len(lines)-1]))
 
     return Proof(statement, rules, lines)
     # Joan
 
+@validated
 def prove_from_opposites(proof_of_affirmation: Proof,
                          proof_of_negation: Proof, conclusion: Formula) -> \
         Proof:
@@ -188,19 +202,21 @@ def prove_from_opposites(proof_of_affirmation: Proof,
         `~propositions.axiomatic_systems.MP` and
         `~propositions.axiomatic_systems.I2`.
     """
-    assert proof_of_affirmation.is_valid()
-    assert proof_of_negation.is_valid()
-    assert proof_of_affirmation.statement.assumptions == \
-           proof_of_negation.statement.assumptions
-    assert Formula('~', proof_of_affirmation.statement.conclusion) == \
-           proof_of_negation.statement.conclusion
-    assert proof_of_affirmation.rules == proof_of_negation.rules
+    if validating():
+        assert proof_of_affirmation.is_valid()
+        assert proof_of_negation.is_valid()
+        assert proof_of_affirmation.statement.assumptions == \
+               proof_of_negation.statement.assumptions
+        assert Formula('~', proof_of_affirmation.statement.conclusion) == \
+               proof_of_negation.statement.conclusion
+        assert proof_of_affirmation.rules == proof_of_negation.rules
     # Task 5.6
     # Joan
     # I2 = InferenceRule([], Formula.parse('(~p->(p->q))'))
     return combine_proofs(proof_of_negation, proof_of_affirmation, conclusion, I2)
     # Joan
 
+@validated
 def prove_by_way_of_contradiction(proof: Proof) -> Proof:
     """Converts the given proof of ``'~(p->p)'``, the last assumption of which
     is an assumption ``'~``\ `formula`\ ``'``, to a proof of `formula` from the
@@ -221,12 +237,13 @@ def prove_by_way_of_contradiction(proof: Proof) -> Proof:
         `~propositions.axiomatic_systems.D`, and
         `~propositions.axiomatic_systems.N`.
     """
-    assert proof.is_valid()
-    assert proof.statement.conclusion == Formula.parse('~(p->p)')
-    assert len(proof.statement.assumptions) > 0
-    assert proof.statement.assumptions[-1].root == '~'
-    for rule in proof.rules:
-        assert rule == MP or len(rule.assumptions) == 0
+    if validating():
+        assert proof.is_valid()
+        assert proof.statement.conclusion == Formula.parse('~(p->p)')
+        assert len(proof.statement.assumptions) > 0
+        assert proof.statement.assumptions[-1].root == '~'
+        for rule in proof.rules:
+            assert rule == MP or len(rule.assumptions) == 0
     # Task 5.7
     # Joan
     N = InferenceRule([], Formula.parse('((~q->~p)->(p->q))'))
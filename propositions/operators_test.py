@@ -85,6 +85,19 @@ def test_to_implies_false(debug=False):
                str(ff) + ' contains wrong operators'
         assert is_tautology(Formula('<->', f, ff))
 
+def test_sharing(debug=False):
+    f = Formula('x0')
+    for i in range(1, 31):
+        f = Formula('+', f, Formula('x' + str(i)))
+    for conversion in [to_not_and_or, to_not_and, to_nand, to_implies_not,
+                       to_implies_false]:
+        if debug:
+            print('Testing that', conversion.__name__,
+                  'of a 30-deep chain of xors shares subformulas')
+        ff = conversion(f)
+        assert ff.dag_size() <= 15 * f.dag_size(), \
+               conversion.__name__ + ' has ' + str(ff.dag_size()) + ' nodes'
+
 def test_ex3(debug=False):
     assert is_binary('+'), 'Change is_binary() before testing Chapter 3 tasks.'
     test_operators_defined(debug)
@@ -7,17 +7,18 @@
 """Proofs by deduction in Propositional Logic."""
 
 from __future__ import annotations
-from typing import AbstractSet, FrozenSet, List, Mapping, Optional, Sequence, \
-                   Set, Tuple, Union
+from typing import AbstractSet, Callable, FrozenSet, Iterable, List, Mapping, \
+                   Optional, Sequence, Set, Tuple, Union
 
-from logic_utils import frozen, memoized_parameterless_method
+from logic_utils import frozen_slots, memoized_parameterless_method, \
+                        validated, validating
 
 from propositions.syntax import *
 
 #: A mapping from variable names to formulas.
 SpecializationMap = Mapping[str, Formula]
 
-@frozen
+@frozen_slots
 class InferenceRule:
     """An immutable inference rule in Propositional Logic, comprised of zero
     or more assumed propositional formulas, and a conclusion propositional
@@ -28,6 +29,8 @@ class InferenceRule:
             the assumptions of the rule.
         conclusion (`~propositions.syntax.Formula`): the conclusion of the rule.
     """
+    __slots__ = ('assumptions', 'conclusion', '_memoized___repr__',
+                 '_memoized_variables_frozen')
     assumptions: Tuple[Formula, ...]
     conclusion: Formula
 
@@ -38,8 +41,8 @@ class InferenceRule:
             assumptions: the assumptions for the rule.
             conclusion: the conclusion for the rule.
         """
-        self.assumptions = tuple(assumptions)
-        self.conclusion = conclusion
+        object.__setattr__(self, 'assumptions', tuple(assumptions))
+        object.__setattr__(self, 'conclusion', conclusion)
 
     @memoized_parameterless_method
     def __repr__(self) -> str:
@@ -80,6 +83,19 @@ class InferenceRule:
 
     def __hash__(self) -> int:
         return hash(str(self))
+
+    def __reduce__(self) -> \
+            Tuple[Callable[[bytes], InferenceRule], Tuple[bytes]]:
+        """Reduces the current inference rule for pickling.
+
+        Returns:
+            A pair of `~propositions.serialization.deserialize` and the binary
+            serialization of the current inference rule, in which subformulas
+            shared by its assumptions and conclusion appear once.
+        """
+        # Imported here since the serialization module builds on this one.
+        from propositions.serialization import deserialize, serialize
+        return deserialize, (serialize(self),)
         
     def variables(self) -> Set[str]:
         """Finds all variable names in the current inference rule.
@@ -90,12 +106,22 @@ class InferenceRule:
         """
         # Task 4.1
         # Joan
-        variables = self.conclusion.variables()
-        for assumption in self.assumptions:
-            variables.update(assumption.variables())
-        return variables
+        return set(self.variables_frozen())
         # Joan
 
+    @memoized_parameterless_method(copy=False)
+    def variables_frozen(self) -> FrozenSet[str]:
+        """Finds all variable names in the current inference rule, without
+        copying.
+
+        Returns:
+            A frozen set of all variable names used in the assumptions and in
+            the conclusion of the current inference rule, which is shared by all
+            callers.
+        """
+        return self.conclusion.variables_frozen().union(
+            *[assumption.variables_frozen() for assumption in self.assumptions])
+
     def specialize(self, specialization_map: SpecializationMap) -> \
             InferenceRule:
         """Specializes the current inference rule by simultaneously substituting
@@ -118,6 +144,24 @@ class InferenceRule:
         return InferenceRule(new_assumptions, new_conclusion)
         # Joan
 
+    def compile_specializer(self) -> InferenceRuleSpecializer:
+        """Compiles the current inference rule into a plan for repeatedly
+        specializing it.
+
+        Returns:
+            A specializer of the current inference rule over all of its
+            variable names, in alphabetical order.
+
+        Examples:
+            >>> rule = InferenceRule([Formula.parse('p'),
+            ...                       Formula.parse('(p->q)')],
+            ...                      Formula.parse('q'))
+            >>> rule.compile_specializer().instantiate(
+            ...     (Formula.parse('~r'), Formula('s')))
+            ['~r', '(~r->s)'] ==> 's'
+        """
+        return InferenceRuleSpecializer(self)
+
     @staticmethod
     def _merge_specialization_maps(
             specialization_map1: Union[SpecializationMap, None],
@@ -235,7 +279,101 @@ class InferenceRule:
         """
         return general.specialization_map(self) is not None
 
-@frozen
+@frozen_slots
+class InferenceRuleSpecializer:
+    """An immutable plan for repeatedly specializing an inference rule,
+    compiled once from the rule.
+
+    Attributes:
+        rule (`InferenceRule`): the inference rule to specialize.
+        variables (`~typing.Tuple`\\[`str`, ...]): the variable names of the
+            rule, in alphabetical order, which is the order in which the
+            formulas to substitute for them are given.
+    """
+    __slots__ = ('rule', 'variables', '_assumptions', '_conclusion')
+    rule: InferenceRule
+    variables: Tuple[str, ...]
+    _assumptions: Tuple[FormulaSpecializer, ...]
+    _conclusion: FormulaSpecializer
+
+    def __init__(self, rule: InferenceRule):
+        """Compiles an `InferenceRuleSpecializer` from the given inference
+        rule.
+
+        Parameters:
+            rule: the inference rule to specialize.
+        """
+        variables = tuple(sorted(rule.variables_frozen()))
+        object.__setattr__(self, 'rule', rule)
+        object.__setattr__(self, 'variables', variables)
+        object.__setattr__(self, '_assumptions',
+                           tuple(assumption.compile_specializer(variables)
+                                 for assumption in rule.assumptions))
+        object.__setattr__(self, '_conclusion',
+                           rule.conclusion.compile_specializer(variables))
+
+    def instantiate(self, formulas: Sequence[Formula]) -> InferenceRule:
+        """Specializes the rule by substituting the given formulas for its
+        variable names.
+
+        Parameters:
+            formulas: the formulas to substitute, one for each of the
+                `variables` of the current specializer, in the same order.
+
+        Returns:
+            The resulting specialization of the rule.
+        """
+        return InferenceRule([assumption.instantiate(formulas)
+                              for assumption in self._assumptions],
+                             self._conclusion.instantiate(formulas))
+
+    def instantiate_conclusion(self, formulas: Sequence[Formula]) -> Formula:
+        """Specializes only the conclusion of the rule by substituting the given
+        formulas for its variable names.
+
+        Parameters:
+            formulas: the formulas to substitute, one for each of the
+                `variables` of the current specializer, in the same order.
+
+        Returns:
+            The conclusion of the resulting specialization of the rule.
+        """
+        return self._conclusion.instantiate(formulas)
+
+    def instantiate_map(self, specialization_map: SpecializationMap) -> \
+            InferenceRule:
+        """Specializes the rule according to the given map.
+
+        Parameters:
+            specialization_map: mapping from (possibly a subset of) the
+                `variables` of the current specializer to the formulas to
+                substitute for them. Variable names that are not mapped are
+                kept as they are.
+
+        Returns:
+            The resulting specialization of the rule, equal to
+            `rule`\\ ``.``\\ `~InferenceRule.specialize`\\ ``(``\\
+            `specialization_map`\\ ``)``.
+        """
+        return self.instantiate([specialization_map[variable]
+                                 if variable in specialization_map
+                                 else Formula(variable)
+                                 for variable in self.variables])
+
+    def instantiate_all(self, formulas_list: Iterable[Sequence[Formula]]) -> \
+            List[InferenceRule]:
+        """Specializes the rule with each of the given sequences of formulas.
+
+        Parameters:
+            formulas_list: sequences of formulas to substitute, each as in
+                `instantiate`.
+
+        Returns:
+            The list of the resulting specializations, in the same order.
+        """
+        return [self.instantiate(formulas) for formulas in formulas_list]
+
+@frozen_slots
 class Proof:
     """An immutable deductive proof in Propositional Logic, comprised of a
     statement in the form of an inference rule, a set of inference rules that
@@ -248,6 +386,7 @@ class Proof:
             the proof.
         lines (`~typing.Tuple`\\[`Line`]): the lines of the proof.
     """
+    __slots__ = ('statement', 'rules', 'lines')
     statement: InferenceRule
     rules: FrozenSet[InferenceRule]
     lines: Tuple[Proof.Line, ...]
@@ -263,11 +402,11 @@ class Proof:
             rules: the allowed rules for the proof.
             lines: the lines for the proof.
         """
-        self.statement = statement
-        self.rules = frozenset(rules)
-        self.lines = tuple(lines)
+        object.__setattr__(self, 'statement', statement)
+        object.__setattr__(self, 'rules', frozenset(rules))
+        object.__setattr__(self, 'lines', tuple(lines))
 
-    @frozen
+    @frozen_slots
     class Line:
         """An immutable line in a deductive proof, comprised of a formula that
         is justified either as an assumption of the proof, or as the conclusion
@@ -287,6 +426,7 @@ class Proof:
                 the rule that concludes the formula, if the formula is not
                 justified as an assumption of the proof.
         """
+        __slots__ = ('formula', 'rule', 'assumptions')
         formula: Formula
         rule: Optional[InferenceRule]
         assumptions: Optional[Tuple[int, ...]]
@@ -311,10 +451,10 @@ class Proof:
             """
             assert (rule is None and assumptions is None) or \
                    (rule is not None and assumptions is not None)
-            self.formula = formula
-            self.rule = rule
+            object.__setattr__(self, 'formula', formula)
+            object.__setattr__(self, 'rule', rule)
             if assumptions is not None:
-                self.assumptions = tuple(assumptions)
+                object.__setattr__(self, 'assumptions', tuple(assumptions))
 
         def __repr__(self) -> str:
             """Computes a string representation of the current line.
@@ -333,6 +473,17 @@ class Proof:
                 r += ')'
                 return r
 
+        def __reduce__(self) -> Tuple[Callable[..., Proof.Line], Tuple]:
+            """Reduces the current line for pickling.
+
+            Returns:
+                A pair of the `~Proof.Line` class and the arguments to rebuild
+                the current line with.
+            """
+            if self.rule is None:
+                return Proof.Line, (self.formula,)
+            return Proof.Line, (self.formula, self.rule, self.assumptions)
+
         def is_assumption(self) -> bool:
             """Checks if the current proof line is justified as an assumption of
             the proof.
@@ -343,6 +494,19 @@ class Proof:
             """
             return self.rule is None
         
+    def __reduce__(self) -> Tuple[Callable[[bytes], Proof], Tuple[bytes]]:
+        """Reduces the current proof for pickling, e.g., for sending it to a
+        worker process.
+
+        Returns:
+            A pair of `~propositions.serialization.deserialize` and the binary
+            serialization of the current proof, in which every distinct
+            subformula and inference rule appears once.
+        """
+        # Imported here since the serialization module builds on this one.
+        from propositions.serialization import deserialize, serialize
+        return deserialize, (serialize(self),)
+
     def __repr__(self) -> str:
         """Computes a string representation of the current proof.
 
@@ -447,6 +611,7 @@ class Proof:
             return False
         # Joan
 
+@validated
 def prove_specialization(proof: Proof, specialization: InferenceRule) -> Proof:
     """Converts the given proof of an inference rule to a proof of the given
     specialization of that inference rule.
@@ -459,8 +624,9 @@ def prove_specialization(proof: Proof, specialization: InferenceRule) -> Proof:
         A valid proof of the given specialization via the same inference rules
         as the given proof.
     """
-    assert proof.is_valid()
-    assert specialization.is_specialization_of(proof.statement)
+    if validating():
+        assert proof.is_valid()
+        assert specialization.is_specialization_of(proof.statement)
     # Task 5.1
     # Joan
     # We only need to map the lines in the proof. The rules can remain general.
@@ -475,6 +641,7 @@ def prove_specialization(proof: Proof, specialization: InferenceRule) -> Proof:
     return Proof(specialization, proof.rules, lines)
     # Joan
 
+@validated
 def _inline_proof_once(main_proof: Proof, line_number: int,
                        lemma_proof: Proof) -> Proof:
     """Inlines the given proof of a "lemma" inference rule into the given proof
@@ -499,10 +666,11 @@ def _inline_proof_once(main_proof: Proof, line_number: int,
         returned proof (and thus, this "lemma" rule is used one less time in the
         returned proof than in `main_proof`).
     """
-    assert main_proof.is_valid()
-    assert line_number < len(main_proof.lines)
-    assert main_proof.lines[line_number].rule == lemma_proof.statement
-    assert lemma_proof.is_valid()
+    if validating():
+        assert main_proof.is_valid()
+        assert line_number < len(main_proof.lines)
+        assert main_proof.lines[line_number].rule == lemma_proof.statement
+        assert lemma_proof.is_valid()
     # Task 5.2a
     # Joan
     statement = main_proof.statement
@@ -539,6 +707,7 @@ def _inline_proof_once(main_proof: Proof, line_number: int,
     return Proof(statement, rules, lines)
     # Joan    
 
+@validated
 def inline_proof(main_proof: Proof, lemma_proof: Proof) -> Proof:
     """Inlines the given proof of a "lemma" inference rule into the given proof
     that uses that "lemma" rule, eliminating all usages of (any specializations
@@ -557,8 +726,9 @@ def inline_proof(main_proof: Proof, lemma_proof: Proof) -> Proof:
         rules allowed in the two given proofs but without the "lemma" rule
         proved by `lemma_proof`.
     """
-    assert main_proof.is_valid()
-    assert lemma_proof.is_valid()
+    if validating():
+        assert main_proof.is_valid()
+        assert lemma_proof.is_valid()
     
     # Task 5.2b
     # Joan
@@ -85,6 +85,84 @@ def test_specialize(debug=False):
             assert general.specialize(d) == special, \
                    "got " + str(general.specialize(d))      
 
+def test_pickle(debug=False):
+    import pickle
+    mp = InferenceRule([Formula.parse('p'), Formula.parse('(p->q)')],
+                       Formula.parse('q'))
+    statement = InferenceRule([Formula.parse('(x|y)'),
+                               Formula.parse('((x|y)->~(x|y))')],
+                              Formula.parse('~(x|y)'))
+    proof = Proof(statement, {mp},
+                  [Proof.Line(Formula.parse('(x|y)')),
+                   Proof.Line(Formula.parse('((x|y)->~(x|y))')),
+                   Proof.Line(Formula.parse('~(x|y)'), mp, [0, 1])])
+    for obj in [mp, statement, proof.lines[0], proof.lines[2]]:
+        if debug:
+            print('Testing pickling', obj)
+        copy = pickle.loads(pickle.dumps(obj))
+        assert type(copy) is type(obj) and str(copy) == str(obj)
+    if debug:
+        print('Testing pickling', proof)
+    copy = pickle.loads(pickle.dumps(proof))
+    assert copy.statement == proof.statement and copy.rules == proof.rules
+    assert str(copy.lines) == str(proof.lines) and copy.is_valid()
+    assert copy.lines[2].formula.first is copy.lines[0].formula
+
+def test_immutability(debug=False):
+    mp = InferenceRule([Formula.parse('p'), Formula.parse('(p->q)')],
+                       Formula.parse('q'))
+    statement = InferenceRule([Formula.parse('p'), Formula.parse('(p->q)')],
+                              Formula.parse('q'))
+    line = Proof.Line(Formula.parse('q'), mp, [0, 1])
+    proof = Proof(statement, {mp},
+                  [Proof.Line(Formula.parse('p')),
+                   Proof.Line(Formula.parse('(p->q)')), line])
+    for obj, name, value in [(mp, 'assumptions', ()),
+                             (mp, 'conclusion', Formula('p')),
+                             (mp, 'extra', 0),
+                             (line, 'formula', Formula('p')),
+                             (line, 'rule', None),
+                             (line, 'assumptions', ()),
+                             (line, 'extra', 0),
+                             (proof, 'statement', mp),
+                             (proof, 'rules', frozenset()),
+                             (proof, 'lines', ()),
+                             (proof, 'extra', 0)]:
+        if debug:
+            print('Testing that assignment to', name, 'of a',
+                  type(obj).__name__, 'fails')
+        failed = False
+        try:
+            setattr(obj, name, value)
+        except Exception:
+            failed = True
+        assert failed, 'Assignment to ' + name + ' did not fail'
+        assert not hasattr(obj, '__dict__')
+    assert str(mp.conclusion) == 'q' and len(mp.assumptions) == 2
+    assert line.rule is mp and line.assumptions == (0, 1)
+    assert proof.statement is statement and len(proof.lines) == 3
+    assert proof.is_valid()
+
+def test_compile_specializer(debug=False):
+    for t in substitutions:
+        d = frozendict({k: Formula.parse(t[0][k]) for k in t[0]})
+        cases = [[Formula.parse(c[0]), Formula.parse(c[1])] for c in t[1:]]
+        general = InferenceRule([case[0] for case in cases[1:]], cases[0][0])
+        special = InferenceRule([case[1] for case in cases[1:]], cases[0][1])
+        if debug:
+            print('Testing compiling', general, 'and specializing it with',
+                  t[0])
+        specializer = general.compile_specializer()
+        assert specializer.variables == tuple(sorted(general.variables()))
+        assert specializer.instantiate_map(d) == special, \
+               "got " + str(specializer.instantiate_map(d))
+        formulas = [d[v] if v in d else Formula(v)
+                    for v in specializer.variables]
+        assert specializer.instantiate(formulas) == special
+        assert specializer.instantiate_conclusion(formulas) == \
+               special.conclusion
+        assert specializer.instantiate_all([formulas]) == [special]
+
 def test_merge_specialization_maps(debug=False):
     for d1, d2, d in [
         ({}, {}, {}),
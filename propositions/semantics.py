@@ -6,7 +6,11 @@
 
 """Semantic analysis of propositional-logic constructs."""
 
-from typing import AbstractSet, Iterable, Iterator, Mapping, Sequence, Tuple
+from typing import AbstractSet, Callable, Iterable, Iterator, Mapping, \
+                   Optional, Sequence, Tuple
+
+from logic_utils import frozen_slots, memoized_parameterless_method, \
+                        registered_cache, validated, validating
 
 from propositions.syntax import *
 from propositions.proofs import *
@@ -44,6 +48,7 @@ def variables(model: Model) -> AbstractSet[str]:
     assert is_model(model)
     return model.keys()
 
+@validated
 def evaluate(formula: Formula, model: Model) -> bool:
     """Calculates the truth value of the given formula in the given model.
 
@@ -62,39 +67,83 @@ def evaluate(formula: Formula, model: Model) -> bool:
         >>> evaluate(Formula.parse('~(p&q76)'), {'p': True, 'q76': True})
         False
     """
-    assert Formula.is_formula(formula)
-    assert is_model(model)
-    assert formula.variables().issubset(variables(model))
+    if validating():
+        assert Formula.is_formula(formula)
+        assert is_model(model)
+        assert formula.variables_frozen().issubset(variables(model))
     # Task 2.1
     # Joan
-    if is_constant(formula.root):
-        if formula.root =='T':
+    return _evaluate(formula, model.__getitem__)
+    # Joan
+
+@validated
+def evaluate_assignment(formula: Formula, table: VariableTable,
+                        assignment: Sequence[bool]) -> bool:
+    """Calculates the truth value of the given formula in the model given by
+    truth values indexed by variable number, via the function that
+    `~propositions.syntax.Formula.compile` keeps for the given table, which
+    indexes the given truth values directly rather than looking up variable
+    names.
+
+    Parameters:
+        formula: formula to calculate the truth value of.
+        table: numbering of (possibly a superset of) the variable names of the
+            given formula.
+        assignment: truth values of the variable names numbered by the given
+            table, indexed by variable number, to calculate the truth value in.
+
+    Returns:
+        The truth value of the given formula in the given model.
+
+    Examples:
+        >>> evaluate_assignment(Formula.parse('~(p&q76)'),
+        ...                     VariableTable(['p', 'q76']), (True, False))
+        True
+    """
+    if validating():
+        assert formula.variables_frozen().issubset(table.names)
+        assert len(assignment) == len(table)
+    return formula.compile(table)(tuple(assignment))
+
+def _evaluate(formula: Formula, value_of: Callable[[str], bool]) -> bool:
+    """Calculates the truth value of the given formula given the truth values
+    of its variable names.
+
+    Parameters:
+        formula: formula to calculate the truth value of.
+        value_of: function from each variable name of the given formula to its
+            truth value.
+
+    Returns:
+        The truth value of the given formula.
+    """
+    def value(subformula: Formula, operands: Tuple[bool, ...]) -> bool:
+        root = subformula.root
+        if root == 'T':
             return True
-        elif formula.root == 'F':
+        elif root == 'F':
             return False
-    elif is_variable(formula.root):
-        return model[formula.root]
-    elif is_unary(formula.root):
-        return (not evaluate(formula.first, model))
-    elif is_binary(formula.root):
-        if formula.root == '&':
-            return evaluate(formula.first, model) and evaluate(formula.second, model)
-        elif formula.root == '|':
-            return evaluate(formula.first, model) or evaluate(formula.second, model)
-        elif formula.root == '->':
-            if evaluate(formula.first, model) == True and evaluate(formula.second, model) == False:
-                return False
-            else:
-                return True
-        elif formula.root == '+':
-            return evaluate(formula.first, model) ^ evaluate(formula.second, model) # ^ is the XOR operator in python
-        elif formula.root == '<->':
-            return not (evaluate(formula.first, model) ^ evaluate(formula.second, model))
-        elif formula.root == '-&':
-            return not (evaluate(formula.first, model) and evaluate(formula.second, model))
-        elif formula.root == '-|':
-            return not (evaluate(formula.first, model) or evaluate(formula.second, model))
-    # Joan
+        elif is_variable(root):
+            return value_of(root)
+        elif root == '~':
+            return not operands[0]
+        first, second = operands
+        if root == '&':
+            return first and second
+        elif root == '|':
+            return first or second
+        elif root == '->':
+            return not first or second
+        elif root == '+':
+            return first != second
+        elif root == '<->':
+            return first == second
+        elif root == '-&':
+            return not (first and second)
+        else:
+            assert root == '-|'
+            return not (first or second)
+    return formula.fold(value)
 
 def all_models(variables: Sequence[str]) -> Iterable[Model]:
     """Calculates all possible models over the given variable names.
@@ -147,10 +196,254 @@ def truth_values(formula: Formula, models: Iterable[Model]) -> Iterable[bool]:
     """
     # Task 2.3
     # Joan
+    function = formula.compile()
     for model in models:
-        yield evaluate(formula, model)  # generator
+        yield function(model)  # generator
     # Joan
 
+@registered_cache(maxsize=256)
+def _column(num_variables: int, number: int) -> int:
+    """Computes the column of a variable name in a truth table.
+
+    Parameters:
+        num_variables: number of variable names of the truth table.
+        number: number of the variable name in the truth table.
+
+    Returns:
+        The bitmask whose bit at each row of the truth table is the truth value
+        of the variable name with the given number in the model at that row.
+    """
+    assert 0 <= number < num_variables
+    # The truth value alternates between runs of False and of True, each as
+    # long as the number of models over the variable names numbered after it.
+    run = 1 << (num_variables - 1 - number)
+    column = ((1 << run) - 1) << run
+    # Repeats the pattern by doubling, as big-integer division is slow.
+    length = 2 * run
+    while length < 1 << num_variables:
+        column |= column << length
+        length *= 2
+    return column
+
+#: The number of variable names whose models are evaluated together, as one
+#: chunk of rows, by `find_counterexample` and `find_satisfying_model`.
+_CHUNK_BITS = 16
+
+def _evaluate_rows(formula: Formula, variables: VariableTable, bits: int,
+                   chunk: int) -> int:
+    """Computes one chunk of rows of the truth table of the given formula.
+
+    Parameters:
+        formula: formula to compute the truth values of.
+        variables: numbering of (possibly a superset of) the variable names of
+            the given formula.
+        bits: the base-2 logarithm of the number of rows in each chunk, at most
+            the number of numbered variable names.
+        chunk: number of the chunk to compute.
+
+    Returns:
+        The bitmask whose bit at each row `r` is the truth value of the given
+        formula in the model at row `chunk`\\ ``*2**``\\ `bits`\\ ``+``\\ `r`.
+    """
+    num_variables = len(variables)
+    assert 0 <= bits <= num_variables
+    assert 0 <= chunk < 1 << (num_variables - bits)
+    numbers = variables.numbers
+    # Full-width columns of large tables are needed once per table, so only
+    # chunk-width ones are worth keeping in the cache.
+    column_of = _column if bits <= _CHUNK_BITS else _column.__wrapped__
+    # The variable names numbered before the last bits ones have the same
+    # truth value in all rows of the chunk: the corresponding bit of its number.
+    fixed = num_variables - bits
+    full = (1 << (1 << bits)) - 1
+    def column(subformula: Formula, operands: Tuple[int, ...]) -> int:
+        root = subformula.root
+        if root == 'T':
+            return full
+        elif root == 'F':
+            return 0
+        elif is_variable(root):
+            number = numbers[root]
+            if number >= fixed:
+                return column_of(bits, number - fixed)
+            return full if (chunk >> (fixed - 1 - number)) & 1 == 1 else 0
+        elif root == '~':
+            return full ^ operands[0]
+        first, second = operands
+        if root == '&':
+            return first & second
+        elif root == '|':
+            return first | second
+        elif root == '->':
+            return (full ^ first) | second
+        elif root == '+':
+            return first ^ second
+        elif root == '<->':
+            return full ^ first ^ second
+        elif root == '-&':
+            return full ^ (first & second)
+        else:
+            assert root == '-|'
+            return full ^ (first | second)
+    return formula.fold(column)
+
+def _first_row(formula: Formula, value: bool) -> Optional[int]:
+    """Finds the first row of the truth table of the given formula in which it
+    has the given truth value, computing the table in growing prefixes from a
+    single row up to a chunk, then chunk by chunk, and stopping at the first
+    range of rows that contains such a row.
+
+    Parameters:
+        formula: formula to search the truth table of.
+        value: truth value to search for.
+
+    Returns:
+        The first row, numbered as by
+        `~propositions.syntax.Formula.variable_table`\\ ``()``, in which the
+        given formula has the given truth value, or ``None`` if there is no
+        such row.
+    """
+    variables = formula.variable_table()
+    most_bits = min(len(variables), _CHUNK_BITS)
+    # The first row, the first 256 rows, and then chunk after chunk. Each
+    # range costs a pass over the formula however few its rows, so only two
+    # short ranges precede the chunks.
+    ranges = chain(((bits, 0) for bits in range(0, most_bits, 8)),
+                   ((most_bits, chunk)
+                    for chunk in range(1 << (len(variables) - most_bits))))
+    for bits, chunk in ranges:
+        rows = _evaluate_rows(formula, variables, bits, chunk)
+        if not value:
+            rows ^= (1 << (1 << bits)) - 1
+        if rows != 0:
+            # The index of the lowest set bit.
+            return (chunk << bits) + (rows & -rows).bit_length() - 1
+    return None
+
+#: The truth values held by each possible byte of a bitmask, from its lowest
+#: bit up.
+_BYTE_BITS = tuple(tuple((byte >> bit) & 1 == 1 for bit in range(8))
+                   for byte in range(256))
+
+@frozen_slots
+class TruthTable:
+    """An immutable truth table of a formula, computed for all models at once.
+
+    Each column of the table is a single integer bitmask, in which the bit at
+    each row holds the truth value in the model at that row, where the rows
+    are numbered as by `~propositions.syntax.VariableTable.row`. The formula
+    is evaluated once, bottom-up, by bitwise operations on whole columns.
+
+    Attributes:
+        formula (`~propositions.syntax.Formula`): the formula of the table.
+        variables (`~propositions.syntax.VariableTable`): the numbering of the
+            variable names of the table, by which its rows are numbered.
+        values (`int`): the column of the formula, as a bitmask of
+            ``2**len(variables)`` bits.
+    """
+    __slots__ = ('formula', 'variables', 'values', '_memoized__bytes')
+    formula: Formula
+    variables: VariableTable
+    values: int
+
+    def __init__(self, formula: Formula,
+                 variables: Optional[VariableTable] = None):
+        """Computes the truth table of the given formula.
+
+        Parameters:
+            formula: formula to compute the truth table of.
+            variables: numbering of (possibly a superset of) the variable names
+                of the given formula, or ``None`` to use
+                `~propositions.syntax.Formula.variable_table`\\ ``()``.
+        """
+        if variables is None:
+            variables = formula.variable_table()
+        assert formula.variables_frozen().issubset(variables.names)
+        object.__setattr__(self, 'formula', formula)
+        object.__setattr__(self, 'variables', variables)
+        values = _evaluate_rows(formula, variables, len(variables), 0)
+        object.__setattr__(self, 'values', values)
+
+    def __len__(self) -> int:
+        """Counts the rows of the current table.
+
+        Returns:
+            The number of models over the variable names of the current table.
+        """
+        return 1 << len(self.variables)
+
+    def __getitem__(self, row: int) -> bool:
+        """Finds the truth value of the formula in the given row.
+
+        Parameters:
+            row: number of the row to look up.
+
+        Returns:
+            The truth value of the formula of the current table in the model at
+            the given row.
+        """
+        assert 0 <= row < len(self)
+        return (self._bytes()[row >> 3] >> (row & 7)) & 1 == 1
+
+    def __iter__(self) -> Iterator[bool]:
+        """Iterates over the truth values of the formula in all rows.
+
+        Returns:
+            An iterator over the truth values of the formula of the current
+            table in all models over the variable names of the table, in the
+            order returned by `all_models`\\ ``(``\\ `variables.names`\\ ``)``.
+        """
+        return islice(chain.from_iterable(map(_BYTE_BITS.__getitem__,
+                                              self._bytes())),
+                      len(self))
+
+    @memoized_parameterless_method(copy=False)
+    def _bytes(self) -> bytes:
+        """Splits the column of the formula of the current table into bytes,
+        so that single rows can be read without shifting the whole column.
+
+        Returns:
+            The column of the formula of the current table, as bytes from its
+            lowest bits up.
+        """
+        return self.values.to_bytes((len(self) + 7) // 8, 'little')
+
+    def is_tautology(self) -> bool:
+        """Checks if the formula of the current table holds in all rows.
+
+        Returns:
+            ``True`` if the formula of the current table is a tautology,
+            ``False`` otherwise.
+        """
+        return self.values == (1 << len(self)) - 1
+
+    def is_contradiction(self) -> bool:
+        """Checks if the formula of the current table holds in no row.
+
+        Returns:
+            ``True`` if the formula of the current table is a contradiction,
+            ``False`` otherwise.
+        """
+        return self.values == 0
+
+    def is_satisfiable(self) -> bool:
+        """Checks if the formula of the current table holds in some row.
+
+        Returns:
+            ``True`` if the formula of the current table is satisfiable,
+            ``False`` otherwise.
+        """
+        return self.values != 0
+
+    def count(self) -> int:
+        """Counts the rows in which the formula of the current table holds.
+
+        Returns:
+            The number of models over the variable names of the current table
+            in which its formula holds.
+        """
+        return bin(self.values).count('1')
+
 def print_truth_table(formula: Formula) -> None:
     """Prints the truth table of the given formula, with variable-name columns
     sorted alphabetically.
@@ -169,11 +462,12 @@ def print_truth_table(formula: Formula) -> None:
     """
     # Task 2.4
     # Joan
-    svars = sorted(formula.variables())  # returns a list which can directly go to .join
+    svars = formula.variable_table().names  # sorted, so it can directly go to .join
     print('| ' + ' | '.join(svars) + ' | ' + str(formula) + ' |')
     print('|-' + '-|-'.join(['-'*len(v) for v in svars]) + '-|-' + '-'*len(str(formula)) + '-|')
-    for model in all_models(svars):
-        print('| ' + ' | '.join([str(model[v])[0] + ' '*(len(v)-1) for v in svars]) + ' | ' + str(evaluate(formula,model))[0] + ' '*len(str(formula)) + '|')
+    table = formula.variable_table()
+    for assignment, tval in zip(table.assignments(), TruthTable(formula, table)):
+        print('| ' + ' | '.join([str(value)[0] + ' '*(len(v)-1) for v, value in zip(svars, assignment)]) + ' | ' + str(tval)[0] + ' '*len(str(formula)) + '|')
     # Joan
 
 def is_tautology(formula: Formula) -> bool:
@@ -187,11 +481,7 @@ def is_tautology(formula: Formula) -> bool:
     """
     # Task 2.5a
     # Joan
-    tvals = list(truth_values(formula, all_models(formula.variables())))
-    if all(tvals):
-        return True
-    else:
-        return False
+    return _first_row(formula, False) is None
     # Joan
 
 def is_contradiction(formula: Formula) -> bool:
@@ -205,11 +495,7 @@ def is_contradiction(formula: Formula) -> bool:
     """
     # Task 2.5b
     # Joan
-    tvals = list(truth_values(formula, all_models(formula.variables())))
-    if not any(tvals):
-        return True
-    else:
-        return False
+    return _first_row(formula, True) is None
     # Joan
 
 def is_satisfiable(formula: Formula) -> bool:
@@ -223,13 +509,53 @@ def is_satisfiable(formula: Formula) -> bool:
     """
     # Task 2.5c
     # Joan
-    tvals = list(truth_values(formula, all_models(formula.variables())))
-    if any(tvals):
-        return True
-    else:
-        return False
+    return _first_row(formula, True) is not None
     # Joan
 
+def find_counterexample(formula: Formula) -> Optional[Model]:
+    """Finds a model in which the given formula does not hold.
+
+    Parameters:
+        formula: formula to find a counterexample for.
+
+    Returns:
+        The first model over the variable names of the given formula, in the
+        order returned by `all_models`\\ ``(``\\ `sorted`\\ ``(``\\
+        `formula.variables`\\ ``()))``, in which the given formula does not
+        hold, or ``None`` if the given formula is a tautology.
+
+    Examples:
+        >>> find_counterexample(Formula.parse('(p->q)'))
+        {'p': True, 'q': False}
+
+        >>> find_counterexample(Formula.parse('(p|~p)')) is None
+        True
+    """
+    row = _first_row(formula, False)
+    return None if row is None else formula.variable_table().model_at_row(row)
+
+def find_satisfying_model(formula: Formula) -> Optional[Model]:
+    """Finds a model in which the given formula holds.
+
+    Parameters:
+        formula: formula to find a satisfying model for.
+
+    Returns:
+        The first model over the variable names of the given formula, in the
+        order returned by `all_models`\\ ``(``\\ `sorted`\\ ``(``\\
+        `formula.variables`\\ ``()))``, in which the given formula holds, or
+        ``None`` if the given formula is a contradiction.
+
+    Examples:
+        >>> find_satisfying_model(Formula.parse('(p&~q)'))
+        {'p': True, 'q': False}
+
+        >>> find_satisfying_model(Formula.parse('(p&~p)')) is None
+        True
+    """
+    row = _first_row(formula, True)
+    return None if row is None else formula.variable_table().model_at_row(row)
+
 def _synthesize_for_model(model: Model) -> Formula:
     """Synthesizes a propositional formula in the form of a single conjunctive
     clause that evaluates to ``True`` in the given model, and to ``False`` in
@@ -340,6 +666,7 @@ def synthesize_cnf(variables: Sequence[str], values: Iterable[bool]) -> Formula:
     assert len(variables) > 0
     # Optional Task 2.9
 
+@validated
 def evaluate_inference(rule: InferenceRule, model: Model) -> bool:
     """Checks if the given inference rule holds in the given model.
 
@@ -360,7 +687,8 @@ def evaluate_inference(rule: InferenceRule, model: Model) -> bool:
         ...                    {'p': False, 'q': False})
         True
     """
-    assert is_model(model)
+    if validating():
+        assert is_model(model)
     # Task 4.2
     # Joan
     tas = [evaluate(assumption, model) for assumption in rule.assumptions]
@@ -383,5 +711,11 @@ def is_sound_inference(rule: InferenceRule) -> bool:
     """
     # Task 4.3
     # Joan
-    return all([evaluate_inference(rule, model) for model in all_models(rule.variables())])
+    table = VariableTable(rule.variables_frozen())
+    conclusion = TruthTable(rule.conclusion, table)
+    # The rows in which all assumptions hold but the conclusion does not.
+    counterexamples = conclusion.values ^ ((1 << len(conclusion)) - 1)
+    for assumption in rule.assumptions:
+        counterexamples &= TruthTable(assumption, table).values
+    return counterexamples == 0
     # Joan
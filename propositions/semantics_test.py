@@ -6,7 +6,7 @@
 
 """Tests for the propositions.semantics module."""
 
-from logic_utils import frozendict
+from logic_utils import frozendict, set_validation_level, validated
 
 from propositions.syntax import *
 from propositions.semantics import *
@@ -52,6 +52,93 @@ def test_evaluate(debug=False):
                       model)
             assert evaluate(formula, frozendict(model)) == value
 
+def test_evaluate_deep(debug=False):
+    if debug:
+        print('Testing evaluation of a very deep formula')
+    f = Formula('p')
+    for i in range(5000):
+        f = Formula('->', Formula('~', f), Formula('x' + str(i % 2)))
+    assert evaluate(f, {'p': True, 'x0': False, 'x1': True})
+    assert not evaluate(f, {'p': False, 'x0': False, 'x1': False})
+
+def test_evaluate_assignment(debug=False):
+    for s in ['p', '~(p&q7)', '(((p->q)|~r)<->(q+T))', '((x-|y)-&F)']:
+        formula = Formula.parse(s)
+        table = VariableTable(formula.variables_frozen() | {'z'})
+        for model in all_models(table.names):
+            if debug:
+                print('Testing evaluation of', s, 'by variable number in',
+                      model)
+            assert evaluate_assignment(formula, table,
+                                       table.assignment(model)) == \
+                   evaluate(formula, model)
+
+def test_compile(debug=False):
+    for s in ['p', 'T', '~F', '~(p&q7)', '(((p->q)|~r)<->(q+T))',
+              '((x-|y)-&F)', '((p&q)|~(p&q))']:
+        formula = Formula.parse(s)
+        function = formula.compile()
+        assert formula.compile() is function
+        table = VariableTable(formula.variables_frozen() | {'z'})
+        extended = formula.compile(table)
+        for model in all_models(table.names):
+            if debug:
+                print('Testing compiled evaluation of', s, 'in', model)
+            value = evaluate(formula, model)
+            assignment = formula.variable_table().assignment(model)
+            assert function(model) is value
+            assert function(assignment) is value
+            assert function(list(assignment)) is value
+            assert extended(table.assignment(model)) is value
+            assert extended(model) is value
+        if debug:
+            print('Testing that compiling', s, 'for alternating tables keeps '
+                  'both functions')
+        assert formula.compile() is function
+        assert formula.compile(VariableTable(table.names)) is extended
+    if debug:
+        print('Testing that compiled functions read only their own variables')
+    class StrictModel(dict):
+        def __getitem__(self, key):
+            assert key in {'p', 'q7'}, 'Read ' + key
+            return dict.__getitem__(self, key)
+    function = Formula.parse('~(p&q7)').compile(VariableTable(['p', 'q7', 'z']))
+    assert not function(StrictModel(p=True, q7=True, z=False))
+    assert function(StrictModel(p=True, q7=False, z=True))
+    if debug:
+        print('Testing compiled evaluation of a very deep formula')
+    f = Formula('p')
+    for i in range(5000):
+        f = Formula('->', Formula('~', f), Formula('x' + str(i % 2)))
+    function = f.compile()
+    assert function({'p': True, 'x0': False, 'x1': True})
+    assert not function((False, False, False))
+
+def test_validation_levels(debug=False):
+    formula = Formula.parse('(p|q)')
+    # Not a model, since 'Q' is not a variable name, but defines p and q.
+    model = {'p': True, 'q': False, 'Q': True}
+    @validated
+    def nested_evaluate():
+        return evaluate(formula, model)
+    try:
+        for level, fails, nested_fails in [('full', True, True),
+                                           ('entry', True, False),
+                                           ('off', False, False)]:
+            if debug:
+                print('Testing precondition checks at validation level', level)
+            assert set_validation_level(level) in {'full', 'entry', 'off'}
+            for function, expected in [(lambda: evaluate(formula, model), fails),
+                                       (nested_evaluate, nested_fails)]:
+                failed = False
+                try:
+                    assert function()
+                except AssertionError:
+                    failed = True
+                assert failed == expected
+    finally:
+        set_validation_level('full')
+
 def test_all_models(debug=False):
     variables1 = ('p', 'q')
     models1 = [{'p': False, 'q': False},
@@ -85,6 +172,77 @@ def test_truth_values(debug=False):
         assert tvals == values, \
                'Expected ' + str(values) + '; got ' + str(tvals)
 
+def test_truth_table(debug=False):
+    for s in ['p', 'T', 'F', '~(p&q7)', '(((p->q)|~r)<->(q+T))',
+              '((x-|y)-&F)', '(p->p)', '(p&~p)']:
+        formula = Formula.parse(s)
+        for table in [formula.variable_table(),
+                      VariableTable(formula.variables_frozen() | {'z'})]:
+            if debug:
+                print('Testing the truth table of', s, 'over', table)
+            truth_table = TruthTable(formula, table)
+            models = list(all_models(table.names))
+            values = list(truth_values(formula, models))
+            assert truth_table.variables is table
+            assert len(truth_table) == len(models)
+            assert list(truth_table) == values
+            assert [truth_table[row] for row in range(len(models))] == values
+            assert truth_table.count() == sum(values)
+            assert truth_table.is_tautology() == all(values)
+            assert truth_table.is_contradiction() == (not any(values))
+            assert truth_table.is_satisfiable() == any(values)
+    if debug:
+        print('Testing the truth table of a formula over 20 variables')
+    formula = Formula('p0')
+    for i in range(1, 20):
+        formula = Formula('|', formula, Formula('p' + str(i)))
+    from propositions.semantics import _column
+    _column.cache_clear()
+    truth_table = TruthTable(formula)
+    assert _column.cache_info().currsize == 0, 'Full-width columns cached'
+    assert truth_table.count() == 2 ** 20 - 1 and not truth_table[0]
+    assert all(truth_table[row] for row in [1, 2 ** 19, 2 ** 20 - 1])
+    values = list(truth_table)
+    assert len(values) == 2 ** 20 and not values[0] and all(values[1:])
+    assert is_satisfiable(formula) and not is_tautology(formula)
+
+def test_find_models(debug=False):
+    for s in ['p', 'T', 'F', '~(p&q7)', '(((p->q)|~r)<->(q+T))',
+              '((x-|y)-&F)', '(p->p)', '(p&~p)']:
+        formula = Formula.parse(s)
+        models = list(all_models(sorted(formula.variables())))
+        values = list(truth_values(formula, models))
+        if debug:
+            print('Testing finding a counterexample and a model of', s)
+        expected = None if all(values) else models[values.index(False)]
+        assert find_counterexample(formula) == expected
+        expected = None if not any(values) else models[values.index(True)]
+        assert find_satisfying_model(formula) == expected
+    if debug:
+        print('Testing finding models of formulas over 18 variables')
+    conjunction = Formula('p0')
+    for i in range(1, 18):
+        conjunction = Formula('&', conjunction, Formula('p' + str(i)))
+    everything_true = {'p' + str(i): True for i in range(18)}
+    assert find_satisfying_model(conjunction) == everything_true
+    assert find_counterexample(Formula('~', conjunction)) == everything_true
+    assert is_satisfiable(conjunction) and not is_tautology(conjunction)
+    assert not is_contradiction(conjunction)
+    assert find_satisfying_model(Formula('&', conjunction,
+                                         Formula('~', Formula('p17')))) is None
+    table = conjunction.variable_table()
+    for row in [0, 1, 255, 256, 300, 65535, 65536, 200000, 2 ** 18 - 1]:
+        if debug:
+            print('Testing finding the only model of a formula, at row', row)
+        model = table.model_at_row(row)
+        formula = Formula('T')
+        for name in table.names:
+            literal = Formula(name)
+            formula = Formula('&', formula,
+                              literal if model[name] else Formula('~', literal))
+        assert find_satisfying_model(formula) == model
+        assert find_counterexample(Formula('~', formula)) == model
+
 def test_print_truth_table(debug=False):
     infix1 = '~r'
     table1 = '| r | ~r |\n' \
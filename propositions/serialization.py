@@ -0,0 +1,294 @@
+# This file is part of the materials accompanying the book
+# "Mathematical Logic through Python" by Gonczarowski and Nisan,
+# Cambridge University Press. Book site: www.LogicThruPython.org
+# (c) Yannai A. Gonczarowski and Noam Nisan, 2017-2022
+# File name: propositions/serialization.py
+
+"""Compact binary serialization of propositional formulas, inference rules,
+and proofs.
+
+The serialized form of an object starts with the magic bytes ``b'PLB'`` and a
+format version byte, followed by a kind byte that tells whether the object is a
+formula, an inference rule, or a proof. Next come three tables, each preceded
+by its length: the distinct roots (variable names, constants, and operators),
+the distinct subformulas, and the distinct inference rules. Each subformula is
+stored once, as the number of its root followed by the numbers of its
+operands, which always refer back to earlier subformulas; each inference rule
+is stored as the numbers of its assumptions and of its conclusion. Finally
+comes the object itself, in terms of these tables. All integers are unsigned
+LEB128 varints."""
+
+from typing import Dict, List, Tuple, Union
+
+from propositions.syntax import *
+from propositions.proofs import *
+
+#: The magic bytes with which every serialized object starts.
+MAGIC = b'PLB'
+#: The version of the serialization format written by `serialize`.
+VERSION = 1
+
+_FORMULA = 0
+_INFERENCE_RULE = 1
+_PROOF = 2
+
+def _write_varint(buffer: bytearray, number: int) -> None:
+    """Appends the given nonnegative integer to the given buffer as a varint.
+
+    Parameters:
+        buffer: buffer to append to.
+        number: nonnegative integer to append.
+    """
+    while number >= 0x80:
+        buffer.append((number & 0x7f) | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+class _Writer:
+    """Collects the roots, subformulas, and inference rules of the objects to
+    serialize, each numbered by order of first appearance."""
+
+    def __init__(self) -> None:
+        self.roots: Dict[str, int] = {}
+        self.formulas: List[Formula] = []
+        self.formula_numbers: Dict[int, int] = {}
+        self.rules: List[InferenceRule] = []
+        self.rule_numbers: Dict[InferenceRule, int] = {}
+        self.rule_numbers_by_id: Dict[int, int] = {}
+
+    def formula(self, formula: Formula) -> int:
+        """Numbers the given formula and all of its subformulas.
+
+        Parameters:
+            formula: formula to number.
+
+        Returns:
+            The number of the given formula.
+        """
+        numbers = self.formula_numbers
+        if id(formula) in numbers:
+            return numbers[id(formula)]
+        # Iterative postorder walk, so that operands are numbered before the
+        # formulas that refer back to them.
+        stack = [formula]
+        while len(stack) > 0:
+            node = stack[-1]
+            if id(node) in numbers:
+                stack.pop()
+                continue
+            if node.first is not None and id(node.first) not in numbers:
+                stack.append(node.first)
+                continue
+            if node.second is not None and id(node.second) not in numbers:
+                stack.append(node.second)
+                continue
+            stack.pop()
+            if node.root not in self.roots:
+                self.roots[node.root] = len(self.roots)
+            numbers[id(node)] = len(self.formulas)
+            self.formulas.append(node)
+        return numbers[id(formula)]
+
+    def rule(self, rule: InferenceRule) -> int:
+        """Numbers the given inference rule and all of its formulas.
+
+        Parameters:
+            rule: inference rule to number.
+
+        Returns:
+            The number of the given inference rule.
+        """
+        # Proofs refer to the same few rule objects over and over, so look
+        # them up by identity before resorting to hashing them.
+        number = self.rule_numbers_by_id.get(id(rule))
+        if number is not None:
+            return number
+        if rule not in self.rule_numbers:
+            for assumption in rule.assumptions:
+                self.formula(assumption)
+            self.formula(rule.conclusion)
+            self.rule_numbers[rule] = len(self.rules)
+            self.rules.append(rule)
+        number = self.rule_numbers_by_id[id(rule)] = self.rule_numbers[rule]
+        return number
+
+    def tables(self) -> bytearray:
+        """Serializes the tables collected so far.
+
+        Returns:
+            The serialized tables.
+        """
+        buffer = bytearray()
+        _write_varint(buffer, len(self.roots))
+        for root in self.roots:
+            encoded = root.encode('utf-8')
+            _write_varint(buffer, len(encoded))
+            buffer += encoded
+        roots, numbers = self.roots, self.formula_numbers
+        _write_varint(buffer, len(self.formulas))
+        for formula in self.formulas:
+            _write_varint(buffer, roots[formula.root])
+            if formula.first is not None:
+                _write_varint(buffer, numbers[id(formula.first)])
+            if formula.second is not None:
+                _write_varint(buffer, numbers[id(formula.second)])
+        _write_varint(buffer, len(self.rules))
+        for rule in self.rules:
+            _write_varint(buffer, len(rule.assumptions))
+            for assumption in rule.assumptions:
+                _write_varint(buffer, numbers[id(assumption)])
+            _write_varint(buffer, numbers[id(rule.conclusion)])
+        return buffer
+
+def serialize(obj: Union[Formula, InferenceRule, Proof]) -> bytes:
+    """Serializes the given formula, inference rule, or proof.
+
+    Parameters:
+        obj: formula, inference rule, or proof to serialize.
+
+    Returns:
+        The serialized form of the given object, in which every distinct
+        subformula and every distinct inference rule is written only once.
+    """
+    writer = _Writer()
+    body = bytearray()
+    if isinstance(obj, Formula):
+        kind = _FORMULA
+        _write_varint(body, writer.formula(obj))
+    elif isinstance(obj, InferenceRule):
+        kind = _INFERENCE_RULE
+        _write_varint(body, writer.rule(obj))
+    else:
+        assert isinstance(obj, Proof)
+        kind = _PROOF
+        _write_varint(body, writer.rule(obj.statement))
+        _write_varint(body, len(obj.rules))
+        for rule in obj.rules:
+            _write_varint(body, writer.rule(rule))
+        _write_varint(body, len(obj.lines))
+        for line in obj.lines:
+            _write_varint(body, writer.formula(line.formula))
+            if line.is_assumption():
+                _write_varint(body, 0)
+            else:
+                _write_varint(body, writer.rule(line.rule) + 1)
+                _write_varint(body, len(line.assumptions))
+                for assumption in line.assumptions:
+                    _write_varint(body, assumption)
+    return MAGIC + bytes((VERSION, kind)) + writer.tables() + body
+
+def deserialize(data: Union[bytes, bytearray, memoryview]) -> \
+        Union[Formula, InferenceRule, Proof]:
+    """Deserializes a formula, inference rule, or proof, raising `ValueError`
+    if the given data is truncated, corrupted, or of an unsupported version.
+
+    Parameters:
+        data: serialized form of a formula, inference rule, or proof, as
+            returned by `serialize`. The data is decoded in place, without being
+            copied.
+
+    Returns:
+        The deserialized object.
+    """
+    view = memoryview(data)
+    if view[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a serialized object')
+    if len(view) < len(MAGIC) + 2:
+        raise ValueError('Truncated header')
+    if view[len(MAGIC)] != VERSION:
+        raise ValueError('Unsupported version ' + str(view[len(MAGIC)]))
+    kind = view[len(MAGIC) + 1]
+    if kind not in (_FORMULA, _INFERENCE_RULE, _PROOF):
+        raise ValueError('Unknown kind ' + str(kind))
+    position = len(MAGIC) + 2
+
+    def read() -> int:
+        nonlocal position
+        number = shift = 0
+        while True:
+            if position >= len(view):
+                raise ValueError('Truncated varint at offset ' +
+                                 str(position))
+            byte = view[position]
+            position += 1
+            number |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return number
+            shift += 7
+
+    def read_index(table: list, name: str) -> int:
+        number = read()
+        if number >= len(table):
+            raise ValueError(name + ' number ' + str(number) +
+                             ' out of range at offset ' + str(position))
+        return number
+
+    roots: List[Tuple[str, int]] = []
+    for _ in range(read()):
+        length = read()
+        if position + length > len(view):
+            raise ValueError('Truncated root at offset ' + str(position))
+        try:
+            root = str(view[position:position + length], 'utf-8')
+        except UnicodeDecodeError:
+            raise ValueError('Undecodable root at offset ' + str(position))
+        position += length
+        if len(root) == 0:
+            raise ValueError('Empty root at offset ' + str(position))
+        elif is_binary(root):
+            roots.append((root, 2))
+        elif is_unary(root):
+            roots.append((root, 1))
+        elif is_variable(root) or is_constant(root):
+            roots.append((root, 0))
+        else:
+            raise ValueError('Invalid root ' + repr(root))
+    formulas: List[Formula] = []
+    for _ in range(read()):
+        root, arity = roots[read_index(roots, 'Root')]
+        if arity == 0:
+            formulas.append(Formula(root))
+        elif arity == 1:
+            formulas.append(Formula(root,
+                                    formulas[read_index(formulas, 'Formula')]))
+        else:
+            first = formulas[read_index(formulas, 'Formula')]
+            formulas.append(Formula(root, first,
+                                    formulas[read_index(formulas, 'Formula')]))
+    rules: List[InferenceRule] = []
+    for _ in range(read()):
+        assumptions = [formulas[read_index(formulas, 'Formula')]
+                       for _ in range(read())]
+        rules.append(InferenceRule(assumptions,
+                                   formulas[read_index(formulas, 'Formula')]))
+
+    if kind == _FORMULA:
+        result = formulas[read_index(formulas, 'Formula')]
+    elif kind == _INFERENCE_RULE:
+        result = rules[read_index(rules, 'Rule')]
+    else:
+        statement = rules[read_index(rules, 'Rule')]
+        proof_rules = [rules[read_index(rules, 'Rule')] for _ in range(read())]
+        lines = []
+        for _ in range(read()):
+            formula = formulas[read_index(formulas, 'Formula')]
+            rule_number = read()
+            if rule_number == 0:
+                lines.append(Proof.Line(formula))
+            elif rule_number > len(rules):
+                raise ValueError('Rule number ' + str(rule_number - 1) +
+                                 ' out of range at offset ' + str(position))
+            else:
+                assumptions = [read() for _ in range(read())]
+                for assumption in assumptions:
+                    # Each line may only rely on lines before it.
+                    if assumption >= len(lines):
+                        raise ValueError('Line number ' + str(assumption) +
+                                         ' out of range in line ' +
+                                         str(len(lines)))
+                lines.append(Proof.Line(formula, rules[rule_number - 1],
+                                        assumptions))
+        result = Proof(statement, proof_rules, lines)
+    if position != len(view):
+        raise ValueError('Trailing data at offset ' + str(position))
+    return result
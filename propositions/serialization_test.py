@@ -0,0 +1,111 @@
+# This file is part of the materials accompanying the book
+# "Mathematical Logic through Python" by Gonczarowski and Nisan,
+# Cambridge University Press. Book site: www.LogicThruPython.org
+# (c) Yannai A. Gonczarowski and Noam Nisan, 2017-2022
+# File name: propositions/serialization_test.py
+
+"""Tests for the propositions.serialization module."""
+
+from propositions.syntax import *
+from propositions.proofs import *
+from propositions.axiomatic_systems import *
+from propositions.tautology import *
+from propositions.serialization import *
+
+def test_formula_round_trip(debug=False):
+    for s in ['p', 'F', '~x1234567', '((p|q)->((p|q)&~(p|q)))',
+              '~((~x17->p)-&~~(~F<->~p))', '(' * 200 + 'x' + '+y)' * 200]:
+        if debug:
+            print('Testing serialization round trip of', s[:50])
+        f = Formula.parse(s)
+        data = serialize(f)
+        assert data[:4] == MAGIC + bytes((VERSION,))
+        for buffer in [data, bytearray(data), memoryview(data)]:
+            assert deserialize(buffer) is f
+    if debug:
+        print('Testing that shared subformulas are written once')
+    shared = Formula.parse('((x1&x2)|(x3->x4))')
+    assert len(serialize(Formula('+', shared, shared))) < \
+           len(serialize(shared)) + 6
+
+def test_inference_rule_round_trip(debug=False):
+    for rule in [MP, I0, D, NI, R, InferenceRule([], Formula('p'))]:
+        if debug:
+            print('Testing serialization round trip of', rule)
+        assert deserialize(serialize(rule)) == rule
+
+def test_proof_round_trip(debug=False):
+    for f in ['(p->p)', '(~(p->p)->q)', '((p->q)->((~p->q)->q))']:
+        proof = prove_tautology(Formula.parse(f))
+        if debug:
+            print('Testing serialization round trip of a proof of', f)
+        data = serialize(proof)
+        copy = deserialize(memoryview(data))
+        assert copy.statement == proof.statement
+        assert copy.rules == proof.rules
+        assert str(copy.lines) == str(proof.lines)
+        assert copy.is_valid()
+        assert len(data) < len(str(proof)) / 5
+
+def _assert_rejected(data, message):
+    try:
+        deserialize(data)
+    except ValueError as error:
+        assert message in str(error), str(error)
+    else:
+        assert False, 'Expected ValueError for ' + repr(bytes(data))
+
+def test_corrupted_input(debug=False):
+    data = serialize(Formula.parse('((p->q)|~r)'))
+    if debug:
+        print('Testing rejection of bad magic, version, and kind')
+    _assert_rejected(b'', 'Not a serialized object')
+    _assert_rejected(b'XYZ' + data[3:], 'Not a serialized object')
+    _assert_rejected(MAGIC, 'Truncated header')
+    _assert_rejected(data[:3] + bytes((VERSION + 1,)) + data[4:],
+                     'Unsupported version')
+    _assert_rejected(data[:4] + bytes((7,)) + data[5:], 'Unknown kind')
+    if debug:
+        print('Testing rejection of out-of-range numbers')
+    # One root, 'p', and one formula referring to root number 1.
+    header = MAGIC + bytes((VERSION, 0))
+    _assert_rejected(header + b'\x01\x01p\x01\x01\x00\x00', 'Root number 1')
+    # Roots 'p' and '~', and a negation of formula number 0 as formula 0.
+    _assert_rejected(header + b'\x02\x01p\x01~\x01\x01\x00\x00\x00',
+                     'Formula number 0')
+    _assert_rejected(header + b'\x01\x01p\x01\x00\x00\x01',
+                     'Formula number 1')
+    rule_data = serialize(MP)
+    _assert_rejected(rule_data[:-1] + b'\x05', 'Rule number 5')
+    _assert_rejected(header + b'\x01\x01@\x00\x00', 'Invalid root')
+    _assert_rejected(MAGIC + bytes((VERSION, 0)) + b'\x01\x00\x01\x00\x00\x00',
+                     'Empty root')
+    _assert_rejected(header + b'\x01\x01\xff\x00\x00', 'Undecodable root')
+    if debug:
+        print('Testing rejection of proof lines that rely on later lines')
+    # Proofs of p from p via the rule of p from p, whose line that applies
+    # the rule relies on itself or on a line that does not exist.
+    proof_header = MAGIC + bytes((VERSION, 2))
+    _assert_rejected(proof_header + b'\x01\x01p\x01\x00\x01\x01\x00\x00'
+                     b'\x00\x01\x00\x01\x00\x01\x01\x00', 'Line number 0')
+    _assert_rejected(proof_header + b'\x01\x01p\x01\x00\x01\x01\x00\x00'
+                     b'\x00\x01\x00\x02\x00\x00\x00\x01\x02\x00\x05',
+                     'Line number 5')
+    _assert_rejected(data + b'\x00', 'Trailing data')
+
+def test_truncated_input(debug=False):
+    for obj in [Formula.parse('(~x1234567->(p|q))'), MP,
+                prove_tautology(Formula.parse('(p->p)'))]:
+        if debug:
+            print('Testing rejection of truncated serializations of', obj)
+        data = serialize(obj)
+        for length in range(len(data)):
+            try:
+                deserialize(data[:length])
+            except ValueError:
+                pass
+            else:
+                assert False, 'Truncation to ' + str(length) + ' accepted'
+    if debug:
+        print('Testing rejection of a truncated varint')
+    _assert_rejected(MAGIC + bytes((VERSION, 0, 0x80)), 'Truncated varint')
@@ -7,12 +7,23 @@
 """Syntactic handling of propositional formulas."""
 
 from __future__ import annotations
-from functools import lru_cache
-from typing import Mapping, Optional, Set, Tuple, Union
+from hashlib import blake2b
+from io import StringIO
+from itertools import product
+from operator import itemgetter
+import mmap
+import os
+from typing import Callable, Dict, FrozenSet, IO, Iterable, Iterator, List, \
+                   Mapping, Optional, Sequence, Set, Tuple, TypeVar, Union
+import warnings
+from weakref import WeakValueDictionary
 
-from logic_utils import frozen, memoized_parameterless_method
+from logic_utils import frozen_slots, memoized_parameterless_method, \
+                        registered_cache
 
-@lru_cache(maxsize=100) # Cache the return value of is_variable
+_T = TypeVar('_T')
+
+@registered_cache(maxsize=4096)
 def is_variable(string: str) -> bool:
     """Checks if the given string is a variable name.
 
@@ -25,7 +36,19 @@ def is_variable(string: str) -> bool:
     return string[0] >= 'p' and string[0] <= 'z' and \
            (len(string) == 1 or string[1:].isdecimal())
 
-@lru_cache(maxsize=100) # Cache the return value of is_constant
+_CONSTANTS = frozenset({'T', 'F'})
+_UNARY_OPERATORS = frozenset({'~'})
+_BINARY_OPERATORS = frozenset({'&', '|',  '->', '+', '<->', '-&', '-|'})
+#: The binary operators whose operands may be swapped.
+_COMMUTATIVE_OPERATORS = frozenset({'&', '|', '+', '<->', '-&', '-|'})
+#: The binary operators whose chains may be regrouped.
+_ASSOCIATIVE_OPERATORS = frozenset({'&', '|', '+', '<->'})
+#: Python expressions computing each binary operator from the truth values of
+#: its operands, for `Formula.compile`.
+_COMPILED_OPERATORS = {'&': '{} and {}', '|': '{} or {}',
+                       '->': 'not {} or {}', '+': '{} != {}', '<->': '{} == {}',
+                       '-&': 'not ({} and {})', '-|': 'not ({} or {})'}
+
 def is_constant(string: str) -> bool:
     """Checks if the given string is a constant.
 
@@ -35,9 +58,8 @@ def is_constant(string: str) -> bool:
     Returns:
         ``True`` if the given string is a constant, ``False`` otherwise.
     """
-    return string == 'T' or string == 'F'
+    return string in _CONSTANTS
 
-@lru_cache(maxsize=100) # Cache the return value of is_unary
 def is_unary(string: str) -> bool:
     """Checks if the given string is a unary operator.
 
@@ -47,9 +69,8 @@ def is_unary(string: str) -> bool:
     Returns:
         ``True`` if the given string is a unary operator, ``False`` otherwise.
     """
-    return string == '~'
+    return string in _UNARY_OPERATORS
 
-@lru_cache(maxsize=100) # Cache the return value of is_binary
 def is_binary(string: str) -> bool:
     """Checks if the given string is a binary operator.
 
@@ -59,50 +80,386 @@ def is_binary(string: str) -> bool:
     Returns:
         ``True`` if the given string is a binary operator, ``False`` otherwise.
     """
-    return string in {'&', '|',  '->', '+', '<->', '-&', '-|'}
-
-# Joan
-@lru_cache(maxsize=100)
-def first_chunk_str(string):
-    # case {'->', '-&', '-|'}
-    if string and string[0] == '-':
-        chunk, rest = string[:2], string[2:]
-    # case {'<->'}
-    elif string and string[0] == '<':
-        chunk, rest = string[:3], string[3:]
-    # case {'&', '|', '+', constants, first letter of variables}
-    else:
-        chunk, rest = string[:1], string[1:]
-    
-    # extend variables
-    if chunk and is_variable(chunk):
-        while rest and rest[0].isdecimal():
-            chunk += rest[0]
-            rest = rest[1:]
-
-    return chunk, rest
-# Joan
-
-@frozen
+    return string in _BINARY_OPERATORS
+
+@registered_cache(maxsize=4096)
+def _root_digest(root: str) -> int:
+    """Computes a hash of the given formula root that, unlike the built-in
+    hash of strings, is the same in every Python process.
+
+    Parameters:
+        root: variable name, constant, or operator to hash.
+
+    Returns:
+        A hash of the given root that does not depend on ``PYTHONHASHSEED``.
+    """
+    return hash(int.from_bytes(blake2b(root.encode('utf-8'),
+                                       digest_size=8).digest(), 'little'))
+
+def _next_token(string: str, index: int) -> int:
+    """Finds the end of the token that starts at the given index of the given
+    string.
+
+    Parameters:
+        string: string to tokenize.
+        index: index in the given string at which the token starts.
+
+    Returns:
+        The index right after the token that starts at the given index. A token
+        is a full variable name (e.g., ``'x12'`` and not just ``'x1'``), a
+        constant, an operator, or a parenthesis, and any other single character
+        is returned as a token of its own. If the given index is the end of the
+        string, then it is returned as is.
+    """
+    length = len(string)
+    if index >= length:
+        return index
+    character = string[index]
+    if 'p' <= character <= 'z':
+        end = index + 1
+        while end < length and string[end].isdecimal():
+            end += 1
+        return end
+    if character == '-':
+        return min(index + 2, length)
+    if character == '<':
+        return min(index + 3, length)
+    return index + 1
+
+def _read_lines(file_or_path: Union[str, os.PathLike, IO]) -> \
+        Iterable[Union[str, bytes]]:
+    """Lazily reads the lines of the given file.
+
+    Parameters:
+        file_or_path: path of the file to read, or a file object (in text or
+            binary mode) to read from.
+
+    Returns:
+        An iterable over the lines of the given file. A file given by its path
+        is memory-mapped rather than read into memory.
+    """
+    if not isinstance(file_or_path, (str, os.PathLike)):
+        yield from file_or_path
+        return
+    with open(file_or_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return # Empty files cannot be memory-mapped
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from iter(buffer.readline, b'')
+
+@frozen_slots
+class ParsingError:
+    """An immutable description of why a string is not a valid standard string
+    representation of a formula.
+
+    Attributes:
+        offset (`int`): the offset in the string at which parsing failed.
+        expected (`str`): a description of what was expected at that offset.
+        found (`str`): the token found at that offset, or ``''`` if the string
+            ended there.
+    """
+    __slots__ = ('offset', 'expected', 'found')
+    offset: int
+    expected: str
+    found: str
+
+    def __init__(self, offset: int, expected: str, found: str):
+        """Initializes a `ParsingError` from the offset at which parsing failed,
+        what was expected there, and what was found instead.
+
+        Parameters:
+            offset: the offset in the string at which parsing failed.
+            expected: a description of what was expected at that offset.
+            found: the token found at that offset, or ``''`` if the string
+                ended there.
+        """
+        object.__setattr__(self, 'offset', offset)
+        object.__setattr__(self, 'expected', expected)
+        object.__setattr__(self, 'found', found)
+
+    def __repr__(self) -> str:
+        """Computes a human-readable string representation of the current
+        error.
+
+        Returns:
+            A human-readable string representation of the current error.
+        """
+        return 'Error: expected ' + self.expected + ' at offset ' + \
+               str(self.offset) + (', found end of string' if self.found == ''
+                                   else ", found '" + self.found + "'")
+
+    def __eq__(self, other: object) -> bool:
+        """Compares the current error with the given one.
+
+        Parameters:
+            other: object to compare to.
+
+        Returns:
+            ``True`` if the given object is a `ParsingError` object that equals
+            the current error, ``False`` otherwise.
+        """
+        return isinstance(other, ParsingError) and \
+               self.offset == other.offset and \
+               self.expected == other.expected and self.found == other.found
+
+    def __ne__(self, other: object) -> bool:
+        """Compares the current error with the given one.
+
+        Parameters:
+            other: object to compare to.
+
+        Returns:
+            ``True`` if the given object is not a `ParsingError` object or does
+            not equal the current error, ``False`` otherwise.
+        """
+        return not self == other
+
+    def __hash__(self) -> int:
+        return hash((self.offset, self.expected, self.found))
+
+#: The maximal depth of formulas that `Formula.to_string` renders by
+#: concatenation rather than via `Formula.write_to`. Concatenation takes time
+#: quadratic in the depth, but up to this depth it is the faster of the two.
+_CONCATENATION_DEPTH = 200
+
+#: The maximal depth of formulas that `Formula.substitute_variables` walks by
+#: recursion, which is faster than its iterative walk but limited by the
+#: Python recursion limit.
+_RECURSION_DEPTH = 200
+
+#: The interning table of all live formulas, keyed by the root of each formula
+#: and the identities of its (already interned) operands. Entries are dropped
+#: automatically once the formula they refer to is no longer referenced.
+_interned_formulas: WeakValueDictionary = WeakValueDictionary()
+
+@frozen_slots
+class VariableTable:
+    """An immutable numbering of a set of variable names by consecutive
+    integers, in sorted order.
+
+    The numbering lets models over the numbered variable names be represented
+    as tuples of truth values indexed by variable number, or as rows: the
+    numbers of the models in the order returned by
+    `~propositions.semantics.all_models`\\ ``(``\\ `names`\\ ``)``, whose binary
+    digits, most significant first, are the truth values of the variable names
+    in order.
+
+    Attributes:
+        names (`~typing.Tuple`\\[`str`, ...]): the numbered variable names,
+            sorted, so that the number of each is its index in this tuple.
+        numbers (`~typing.Mapping`\\[`str`, `int`]): mapping from each
+            numbered variable name to its number.
+    """
+    __slots__ = ('names', 'numbers')
+    names: Tuple[str, ...]
+    numbers: Mapping[str, int]
+
+    def __init__(self, variables: Iterable[str]):
+        """Initializes a `VariableTable` from the variable names to number.
+
+        Parameters:
+            variables: variable names to number, possibly with repetitions.
+        """
+        names = tuple(sorted(set(variables)))
+        for name in names:
+            assert is_variable(name)
+        object.__setattr__(self, 'names', names)
+        object.__setattr__(self, 'numbers',
+                           {name: number for number, name in enumerate(names)})
+
+    def __repr__(self) -> str:
+        """Computes a string representation of the current table.
+
+        Returns:
+            A string representation of the current table.
+        """
+        return 'VariableTable(' + str(list(self.names)) + ')'
+
+    def __eq__(self, other: object) -> bool:
+        """Compares the current table with the given one.
+
+        Parameters:
+            other: object to compare to.
+
+        Returns:
+            ``True`` if the given object is a `VariableTable` object that
+            numbers the same variable names, ``False`` otherwise.
+        """
+        return isinstance(other, VariableTable) and self.names == other.names
+
+    def __ne__(self, other: object) -> bool:
+        """Compares the current table with the given one.
+
+        Parameters:
+            other: object to compare to.
+
+        Returns:
+            ``True`` if the given object is not a `VariableTable` object or
+            does not number the same variable names, ``False`` otherwise.
+        """
+        return not self == other
+
+    def __hash__(self) -> int:
+        return hash(self.names)
+
+    def __len__(self) -> int:
+        """Counts the variable names numbered by the current table.
+
+        Returns:
+            The number of numbered variable names.
+        """
+        return len(self.names)
+
+    def assignment(self, model: Mapping[str, bool]) -> Tuple[bool, ...]:
+        """Converts the given model to a tuple of truth values.
+
+        Parameters:
+            model: model over (possibly a superset of) the numbered variable
+                names.
+
+        Returns:
+            The truth values of the numbered variable names in the given model,
+            indexed by variable number.
+
+        Examples:
+            >>> VariableTable(['q', 'p']).assignment({'p': True, 'q': False})
+            (True, False)
+        """
+        return tuple(model[name] for name in self.names)
+
+    def model(self, assignment: Sequence[bool]) -> Dict[str, bool]:
+        """Converts the given tuple of truth values to a model.
+
+        Parameters:
+            assignment: truth values of the numbered variable names, indexed by
+                variable number.
+
+        Returns:
+            The model over the numbered variable names that assigns them the
+            given truth values.
+        """
+        assert len(assignment) == len(self.names)
+        return dict(zip(self.names, assignment))
+
+    def assignments(self) -> Iterator[Tuple[bool, ...]]:
+        """Iterates over all possible tuples of truth values of the numbered
+        variable names.
+
+        Returns:
+            An iterator over all tuples of truth values indexed by variable
+            number, in the order of their rows.
+        """
+        return product((False, True), repeat=len(self.names))
+
+    def row(self, model: Mapping[str, bool]) -> int:
+        """Computes the row of the given model.
+
+        Parameters:
+            model: model over (possibly a superset of) the numbered variable
+                names.
+
+        Returns:
+            The number of the given model, restricted to the numbered variable
+            names, among all models over them.
+
+        Examples:
+            >>> VariableTable(['p', 'q', 'r']).row({'p': True, 'q': False,
+            ...                                     'r': True})
+            5
+        """
+        row = 0
+        for name in self.names:
+            row = 2 * row + (1 if model[name] else 0)
+        return row
+
+    def model_at_row(self, row: int) -> Dict[str, bool]:
+        """Computes the model in the given row.
+
+        Parameters:
+            row: number of a model over the numbered variable names.
+
+        Returns:
+            The model over the numbered variable names with the given number.
+        """
+        assert 0 <= row < 2 ** len(self.names)
+        last = len(self.names) - 1
+        return {name: (row >> (last - number)) & 1 == 1
+                for number, name in enumerate(self.names)}
+
+@frozen_slots
 class Formula:
     """An immutable propositional formula in tree representation, composed from
     variable names, and operators applied to them.
 
+    Formulas are hash-consed: constructing a formula that is structurally equal
+    to a formula that is still alive returns that very same object, so equal
+    subformulas share a single node.
+
     Attributes:
         root (`str`): the constant, variable name, or operator at the root of
             the formula tree.
         first (`~typing.Optional`\\[`Formula`]): the first operand of the root,
-            if the root is a unary or binary operator.
+            if the root is a unary or binary operator, ``None`` otherwise.
         second (`~typing.Optional`\\[`Formula`]): the second operand of the
-            root, if the root is a binary operator.
+            root, if the root is a binary operator, ``None`` otherwise.
     """
+    __slots__ = ('root', 'first', 'second', '_hash', '_size', '_depth',
+                 '_string', '_memoized_variables_frozen',
+                 '_memoized_operators_frozen', '_memoized_dag_size',
+                 '_memoized_canonical', '_memoized_variable_table',
+                 '_compiled', '__weakref__')
     root: str
     first: Optional[Formula]
     second: Optional[Formula]
+    _hash: int
+    _size: int
+    _depth: int
+
+    def __new__(cls, root: Optional[str] = None,
+                first: Optional[Formula] = None,
+                second: Optional[Formula] = None) -> Formula:
+        """Returns the interned formula with the given root and root operands,
+        creating it if no such formula is alive.
+
+        Parameters:
+            root: the root for the formula tree.
+            first: the first operand for the root, if the root is a unary or
+                binary operator.
+            second: the second operand for the root, if the root is a binary
+                operator.
+
+        Returns:
+            The unique live formula with the given root and root operands.
+        """
+        if root is None:
+            # Bare allocation, e.g., by copy or pickle; not interned.
+            return super().__new__(cls)
+        # Operands are themselves interned, so their identities determine
+        # their structure for as long as the keyed formula keeps them alive.
+        key = (root, id(first), id(second))
+        formula = _interned_formulas.get(key)
+        if formula is None:
+            formula = super().__new__(cls)
+            formula._initialize(root, first, second)
+            _interned_formulas[key] = formula
+        return formula
 
     def __init__(self, root: str, first: Optional[Formula] = None,
                  second: Optional[Formula] = None):
-        """Initializes a `Formula` from its root and root operands.
+        """Does nothing, as `__new__` already returns an initialized formula,
+        either a live interned one or one freshly set up by `_initialize`.
+
+        Parameters:
+            root: the root for the formula tree.
+            first: the first operand for the root, if the root is a unary or
+                binary operator.
+            second: the second operand for the root, if the root is a binary
+                operator.
+        """
+
+    def _initialize(self, root: str, first: Optional[Formula] = None,
+                    second: Optional[Formula] = None) -> None:
+        """Initializes a bare `Formula` from its root and root operands.
 
         Parameters:
             root: the root for the formula tree.
@@ -113,16 +470,26 @@ class Formula:
         """
         if is_variable(root) or is_constant(root):
             assert first is None and second is None
-            self.root = root
+            hash_value = _root_digest(root)
+            size, depth = 1, 0
         elif is_unary(root):
             assert first is not None and second is None
-            self.root, self.first = root, first
+            hash_value = hash((_root_digest(root), first._hash))
+            size, depth = first._size + 1, first._depth + 1
         else:
             assert is_binary(root)
             assert first is not None and second is not None
-            self.root, self.first, self.second = root, first, second
+            hash_value = hash((_root_digest(root), first._hash,
+                               second._hash))
+            size = first._size + second._size + 1
+            depth = max(first._depth, second._depth) + 1
+        object.__setattr__(self, 'root', root)
+        object.__setattr__(self, 'first', first)
+        object.__setattr__(self, 'second', second)
+        object.__setattr__(self, '_hash', hash_value)
+        object.__setattr__(self, '_size', size)
+        object.__setattr__(self, '_depth', depth)
 
-    @memoized_parameterless_method
     def __repr__(self) -> str:
         """Computes the string representation of the current formula.
 
@@ -131,14 +498,86 @@ class Formula:
         """
         # Task 1.1
         # Joan
-        if is_variable(self.root) or is_constant(self.root):
+        return self.to_string()
+        # Joan
+
+    def to_string(self, memoize: bool = True) -> str:
+        """Computes the string representation of the current formula, in time
+        linear in its length.
+
+        Parameters:
+            memoize: whether to keep the computed string on the current formula
+                so that rendering it again is free. Strings of subformulas are
+                never kept.
+
+        Returns:
+            The standard string representation of the current formula.
+        """
+        try:
+            return self._string
+        except AttributeError:
+            pass
+        if self._depth <= _CONCATENATION_DEPTH:
+            string = self._concatenate()
+        else:
+            buffer = StringIO()
+            self.write_to(buffer)
+            string = buffer.getvalue()
+        if memoize:
+            object.__setattr__(self, '_string', string)
+        return string
+
+    def _concatenate(self) -> str:
+        """Computes the string representation of the current formula by
+        recursively concatenating the string representations of its operands.
+
+        Returns:
+            The standard string representation of the current formula.
+        """
+        if self.first is None:
             return self.root
-        elif is_unary(self.root):
-            return self.root + self.first.__repr__()
+        elif self.second is None:
+            return self.root + self.first._concatenate()
         else:
-            assert is_binary(self.root)
-            return '(' + self.first.__repr__() + self.root + self.second.__repr__() + ')'
-        # Joan
+            return '(' + self.first._concatenate() + self.root + \
+                   self.second._concatenate() + ')'
+
+    def write_to(self, stream: IO[str]) -> None:
+        """Writes the string representation of the current formula to the
+        given stream, in a single pass that builds no intermediate strings of
+        subformulas.
+
+        Parameters:
+            stream: text stream to write to.
+
+        Examples:
+            >>> import sys
+            >>> Formula.parse('(~p->(q&T))').write_to(sys.stdout)
+            (~p->(q&T))
+        """
+        chunks: List[str] = []
+        emit = chunks.append
+        # Formulas to render, interleaved with literal tokens to emit.
+        stack: List[Union[Formula, str]] = [self]
+        push, pop = stack.append, stack.pop
+        while len(stack) > 0:
+            item = pop()
+            if type(item) is str:
+                emit(item)
+                continue
+            first = item.first
+            if first is None:
+                emit(item.root)
+            elif item.second is None:
+                emit(item.root)
+                push(first)
+            else:
+                emit('(')
+                stack.extend((')', item.second, item.root, first))
+                if len(chunks) >= 4096:
+                    stream.write(''.join(chunks))
+                    chunks.clear()
+        stream.write(''.join(chunks))
 
     def __eq__(self, other: object) -> bool:
         """Compares the current formula with the given one.
@@ -150,7 +589,25 @@ class Formula:
             ``True`` if the given object is a `Formula` object that equals the
             current formula, ``False`` otherwise.
         """
-        return isinstance(other, Formula) and str(self) == str(other)
+        if self is other:
+            return True
+        if not isinstance(other, Formula):
+            return False
+        # Compare structurally, root by root, without rendering either formula
+        # and without recursing, so that arbitrarily deep formulas compare.
+        pairs = [(self, other)]
+        while len(pairs) > 0:
+            formula1, formula2 = pairs.pop()
+            if formula1 is formula2:
+                continue
+            if formula1._hash != formula2._hash or \
+               formula1.root != formula2.root:
+                return False
+            if formula1.first is not None:
+                pairs.append((formula1.first, formula2.first))
+            if formula1.second is not None:
+                pairs.append((formula1.second, formula2.second))
+        return True
 
     def __ne__(self, other: object) -> bool:
         """Compares the current formula with the given one.
@@ -165,9 +622,119 @@ class Formula:
         return not self == other
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        return self._hash
+
+    def __reduce__(self) -> Tuple[Callable[[bytes], Formula], Tuple[bytes]]:
+        """Reduces the current formula for pickling, e.g., for sending it to a
+        worker process.
+
+        Returns:
+            A pair of `~propositions.serialization.deserialize` and the binary
+            serialization of the current formula, in which every distinct
+            subformula appears once and no cached values appear at all. The
+            formula is rebuilt through interning when it is unpickled, and
+            copying returns the current formula itself.
+        """
+        # Imported here since the serialization module builds on this one.
+        from propositions.serialization import deserialize, serialize
+        return deserialize, (serialize(self),)
+
+    def preorder(self) -> Iterator[Formula]:
+        """Iterates over the subformulas of the current formula in preorder,
+        without recursion.
+
+        Returns:
+            An iterator over all occurrences of subformulas of the current
+            formula, including the current formula itself, each before its
+            operands, and the first operand of each before the second.
+        """
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            if node.second is not None:
+                stack.append(node.second)
+            if node.first is not None:
+                stack.append(node.first)
+
+    def postorder(self) -> Iterator[Formula]:
+        """Iterates over the subformulas of the current formula in postorder,
+        without recursion.
+
+        Returns:
+            An iterator over all occurrences of subformulas of the current
+            formula, including the current formula itself, each after its
+            operands, and the first operand of each before the second.
+        """
+        stack = [(self, False)]
+        while len(stack) > 0:
+            node, expanded = stack.pop()
+            if expanded or node.first is None:
+                yield node
+                continue
+            stack.append((node, True))
+            if node.second is not None:
+                stack.append((node.second, False))
+            stack.append((node.first, False))
+
+    def subformulas(self) -> Iterator[Formula]:
+        """Iterates over the distinct subformulas of the current formula,
+        without recursion.
+
+        Returns:
+            An iterator over the subformulas of the current formula, including
+            the current formula itself, in postorder but with each subformula
+            that occurs more than once iterated over only at its first
+            occurrence.
+        """
+        seen = set()
+        stack = [self]
+        while len(stack) > 0:
+            node = stack[-1]
+            if id(node) in seen:
+                stack.pop()
+                continue
+            first, second = node.first, node.second
+            if first is not None and id(first) not in seen:
+                stack.append(first)
+                continue
+            if second is not None and id(second) not in seen:
+                stack.append(second)
+                continue
+            stack.pop()
+            seen.add(id(node))
+            yield node
+
+    def fold(self, combine: Callable[[Formula, Tuple[_T, ...]], _T]) -> _T:
+        """Computes a value for the current formula bottom-up, without
+        recursion.
+
+        Parameters:
+            combine: function that computes the value for a subformula from the
+                subformula and from the values for its (zero or one or two)
+                operands, in order. It is called once for each distinct
+                subformula, see `subformulas`.
+
+        Returns:
+            The value computed for the current formula.
+
+        Examples:
+            >>> Formula.parse('((p&q)|~(p&q))').fold(
+            ...     lambda formula, depths: 1 + max(depths, default=-1))
+            3
+        """
+        values: Dict[int, _T] = {}
+        for node in self.subformulas():
+            first, second = node.first, node.second
+            if first is None:
+                values[id(node)] = combine(node, ())
+            elif second is None:
+                values[id(node)] = combine(node, (values[id(first)],))
+            else:
+                values[id(node)] = combine(node, (values[id(first)],
+                                                  values[id(second)]))
+        return values[id(self)]
 
-    @memoized_parameterless_method
     def variables(self) -> Set[str]:
         """Finds all variable names in the current formula.
 
@@ -176,18 +743,134 @@ class Formula:
         """
         # Task 1.2
         # Joan
-        if is_constant(self.root):
-            return set()
-        elif is_variable(self.root):
-            return {self.root}
-        elif is_unary(self.root):
-            return self.first.variables()
-        else:
-            assert is_binary(self.root)
-            return self.first.variables() | self.second.variables()
+        return set(self.variables_frozen())
         # Joan
 
-    @memoized_parameterless_method
+    @memoized_parameterless_method(copy=False)
+    def variables_frozen(self) -> FrozenSet[str]:
+        """Finds all variable names in the current formula, without copying.
+
+        Returns:
+            A frozen set of all variable names used in the current formula,
+            which is shared by all callers.
+        """
+        return frozenset(node.root for node in self.subformulas()
+                         if is_variable(node.root))
+
+    @memoized_parameterless_method(copy=False)
+    def variable_table(self) -> VariableTable:
+        """Numbers the variable names in the current formula.
+
+        Returns:
+            The numbering of all variable names used in the current formula, in
+            sorted order, which is shared by all callers.
+
+        Examples:
+            >>> Formula.parse('((q&p)|r)').variable_table()
+            VariableTable(['p', 'q', 'r'])
+        """
+        return VariableTable(self.variables_frozen())
+
+    def compile(self, table: Optional[VariableTable] = None) -> \
+            Callable[[Union[Mapping[str, bool], Sequence[bool]]], bool]:
+        """Compiles the current formula into a Python function that calculates
+        its truth value.
+
+        The generated function computes each distinct subformula once, in
+        straight-line code, so that it neither interprets the formula nor
+        recurses when it is called. The current formula is compiled only once,
+        and the function returned for each given table, which merely picks the
+        truth values of the variable names of the current formula, is kept on
+        the current formula.
+
+        Parameters:
+            table: numbering of (possibly a superset of) the variable names of
+                the current formula, by which the compiled function is to index
+                tuples of truth values, or ``None`` to use
+                `variable_table`\\ ``()``.
+
+        Returns:
+            A function that takes either a model over (possibly a superset of)
+            the variable names of the current formula, or a sequence of truth
+            values indexed by the number in the given table of each variable
+            name, and returns the truth value of the current formula in it.
+
+        Examples:
+            >>> function = Formula.parse('~(p&q76)').compile()
+            >>> function({'p': True, 'q76': False}), function((True, True))
+            (True, False)
+        """
+        own_table = self.variable_table()
+        if table is None:
+            table = own_table
+        try:
+            compiled, functions = self._compiled
+        except AttributeError:
+            compiled, functions = self._compile(), {}
+            object.__setattr__(self, '_compiled', (compiled, functions))
+        function = functions.get(table)
+        if function is not None:
+            return function
+        assert self.variables_frozen().issubset(table.names)
+        names = own_table.names
+        numbers = table.numbers
+        indices = tuple(numbers[name] for name in names)
+        if indices == tuple(range(len(table))):
+            select = None
+        elif len(indices) < 2:
+            # itemgetter returns a tuple only given at least two indices.
+            select = lambda values: tuple(values[index] for index in indices)
+        else:
+            select = itemgetter(*indices)
+
+        def function(model: Union[Mapping[str, bool], Sequence[bool]]) -> bool:
+            if not isinstance(model, tuple) and isinstance(model, Mapping):
+                return compiled(*[model[name] for name in names])
+            elif select is None:
+                return compiled(*model)
+            return compiled(*select(model))
+        functions[table] = function
+        return function
+
+    def _compile(self) -> Callable[..., bool]:
+        """Compiles the current formula into a Python function of the truth
+        values of its variable names.
+
+        Returns:
+            A function whose parameters are the variable names of the current
+            formula, in alphabetical order, and that returns the truth value of
+            the current formula given their truth values.
+        """
+        # Variable names are valid Python identifiers, and none of them starts
+        # with an underscore, so they can serve as parameters alongside the
+        # numbered temporaries of the operator nodes.
+        expressions: Dict[int, str] = {}
+        lines = ['def compiled(' + ', '.join(self.variable_table().names) +
+                 '):']
+        for node in self.subformulas():
+            root = node.root
+            if root == 'T':
+                expressions[id(node)] = 'True'
+                continue
+            elif root == 'F':
+                expressions[id(node)] = 'False'
+                continue
+            elif node.first is None:
+                expressions[id(node)] = root
+                continue
+            first = expressions[id(node.first)]
+            if node.second is None:
+                value = 'not ' + first
+            else:
+                value = _COMPILED_OPERATORS[root].format(
+                    first, expressions[id(node.second)])
+            expressions[id(node)] = '_' + str(len(lines))
+            lines.append('    _' + str(len(lines)) + ' = ' + value)
+        lines.append('    return ' + expressions[id(self)])
+        namespace: Dict[str, Callable[..., bool]] = {}
+        exec(compile('\n'.join(lines), '<formula>', 'exec'), namespace)
+        return namespace['compiled']
+
     def operators(self) -> Set[str]:
         """Finds all operators in the current formula.
 
@@ -197,17 +880,134 @@ class Formula:
         """
         # Task 1.3
         # Joan
-        if is_constant(self.root):
-            return {self.root}
-        elif is_variable(self.root):
-            return set()
-        elif is_unary(self.root):
-            return {self.root} | self.first.operators()
-        else:
-            assert is_binary(self.root)
-            return {self.root} | self.first.operators() | self.second.operators()
+        return set(self.operators_frozen())
         # Joan
 
+    @memoized_parameterless_method(copy=False)
+    def operators_frozen(self) -> FrozenSet[str]:
+        """Finds all operators in the current formula, without copying.
+
+        Returns:
+            A frozen set of all operators (including ``'T'`` and ``'F'``) used
+            in the current formula, which is shared by all callers.
+        """
+        return frozenset(node.root for node in self.subformulas()
+                         if not is_variable(node.root))
+
+    def size(self) -> int:
+        """Counts the subformula occurrences of the current formula, in
+        constant time.
+
+        Returns:
+            The number of nodes of the tree of the current formula, i.e., the
+            number of occurrences of variable names, constants, and operators
+            in it.
+        """
+        return self._size
+
+    def depth(self) -> int:
+        """Computes the depth of the current formula, in constant time.
+
+        Returns:
+            The number of operators on the longest path from the root of the
+            tree of the current formula to a variable name or constant in it.
+        """
+        return self._depth
+
+    @memoized_parameterless_method
+    def dag_size(self) -> int:
+        """Counts the distinct subformulas of the current formula.
+
+        Returns:
+            The number of nodes of the current formula when each subformula
+            that occurs more than once in it is counted only once, which is
+            the number of nodes that the current formula actually occupies.
+        """
+        return sum(1 for _ in self.subformulas())
+
+    def num_variables(self) -> int:
+        """Counts the distinct variable names in the current formula.
+
+        Returns:
+            The number of variable names used in the current formula.
+        """
+        return len(self.variables_frozen())
+
+    @staticmethod
+    def _parse_at(string: str, index: int = 0,
+                  node: Optional[Callable[..., _T]] = None) -> \
+            Tuple[Union[_T, ParsingError], int]:
+        """Parses the longest formula that starts at the given index of the
+        given string.
+
+        The parser scans the string once, from left to right, and keeps the
+        operators that still await operands on an explicit stack, so it runs in
+        time linear in the length of the parsed prefix and has no nesting depth
+        limit.
+
+        Parameters:
+            string: string to parse.
+            index: index in the given string at which to start parsing.
+            node: function that builds each parsed subformula from its root
+                and the results of this function for its operands, as the
+                `Formula` constructor does, or ``None`` to use that
+                constructor.
+
+        Returns:
+            A pair of the result of the given function for the parsed formula
+            and the index right after it. If no formula starts at the given
+            index, then a pair of a `ParsingError` describing the failure, and
+            the offset at which parsing failed.
+        """
+        if node is None:
+            node = Formula
+        # Each stack entry is either '~', awaiting its operand; '(', awaiting
+        # its first operand; or a pair of a first operand and a binary
+        # operator, awaiting the second operand and the closing parenthesis.
+        stack = []
+        length = len(string)
+        while True:
+            # Read an operand, pushing any unary operators and opening
+            # parentheses that precede it.
+            end = _next_token(string, index)
+            token = string[index:end]
+            if token == '~' or token == '(':
+                stack.append(token)
+                index = end
+                continue
+            if token == '' or not (is_variable(token) or is_constant(token)):
+                return ParsingError(index, 'a formula', token), index
+            formula = node(token)
+            index = end
+            # Complete every pending operator that the formula read so far
+            # completes.
+            while len(stack) > 0:
+                top = stack[-1]
+                if top == '~':
+                    stack.pop()
+                    formula = node('~', formula)
+                elif top == '(':
+                    end = _next_token(string, index)
+                    operator = string[index:end]
+                    if not is_binary(operator):
+                        return ParsingError(index, 'a binary operator',
+                                            operator), index
+                    stack[-1] = (formula, operator)
+                    index = end
+                    break
+                else:
+                    if index >= length or string[index] != ')':
+                        return ParsingError(index, "')'",
+                                            string[index:_next_token(string,
+                                                                     index)]), \
+                               index
+                    stack.pop()
+                    first, operator = top
+                    formula = node(operator, first, formula)
+                    index += 1
+            else:
+                return formula, index
+
     @staticmethod
     def _parse_prefix(string: str) -> Tuple[Union[Formula, None], str]:
         """Parses a prefix of the given string into a formula.
@@ -227,55 +1027,41 @@ class Formula:
         """
         # Task 1.4
         # Joan
-        chunk, rest = first_chunk_str(string)
-        if not chunk:
-            pre = None
-            suf = 'Error: empty string'
-        elif is_constant(chunk):
-            pre = Formula(chunk)
-            suf = rest
-        elif is_variable(chunk):
-            pre = Formula(chunk)
-            suf = rest
-        elif is_unary(chunk):
-            first, rest = Formula._parse_prefix(rest)
-            if first is None:
-                pre = None
-                suf = rest
-            else:
-                pre = Formula(chunk, first)
-                suf = rest
-        elif chunk == '(':
-            # Entering binary chunk. Get first formula
-            first, rest = Formula._parse_prefix(rest)
-            if first is None:
-                pre = None
-                suf = rest
-            else:
-                # Get binary operator
-                binop, rest = first_chunk_str(rest)
-                if not is_binary(binop):
-                    pre = None
-                    suf = 'Error: wrong syntax'
-                else:
-                    # Get second formula
-                    second, rest = Formula._parse_prefix(rest)
-                    if second is None:
-                        pre = None
-                        suf = rest
-                    elif not rest.startswith(')'):
-                        pre = None
-                        suf = 'Error: wrong syntax'
-                    else:
-                        pre = Formula(binop, first, second)
-                        suf = rest[1:] 
-        else:
-            pre = None
-            suf = 'Error: wrong syntax'        
-        
-        return pre, suf
+        result, index = Formula._parse_at(string)
+        if isinstance(result, ParsingError):
+            return None, str(result)
+        return result, string[index:]
         # Joan
 
+    @staticmethod
+    def try_parse(string: str) -> Union[Formula, ParsingError]:
+        """Parses the given string into a formula, in a single pass that both
+        validates and builds the formula.
+
+        Parameters:
+            string: string to parse.
+
+        Returns:
+            A formula whose standard string representation is the given string,
+            or a `ParsingError` describing where and why the given string is not
+            a valid standard string representation of a formula.
+
+        Examples:
+            >>> Formula.try_parse('(p|~q)')
+            (p|~q)
+
+            >>> Formula.try_parse('(p|~q')
+            Error: expected ')' at offset 5, found end of string
+
+            >>> Formula.try_parse('(p|~q)&r')
+            Error: expected end of string at offset 6, found '&'
+        """
+        result, index = Formula._parse_at(string)
+        if isinstance(result, Formula) and index != len(string):
+            return ParsingError(index, 'end of string',
+                                string[index:_next_token(string, index)])
+        return result
+
     @staticmethod
     def is_formula(string: str) -> bool:
         """Checks if the given string is a valid representation of a formula.
@@ -289,14 +1075,7 @@ class Formula:
         """
         # Task 1.5
         # Joan
-        string = str(string)
-        chunk, rest = Formula._parse_prefix(string)
-        while chunk and rest:
-            chunk, rest = Formula._parse_prefix(rest)
-        if chunk and not rest:
-            return True
-        else:
-            return False
+        return isinstance(Formula.try_parse(str(string)), Formula)
         # Joan
         
     @staticmethod
@@ -309,11 +1088,49 @@ class Formula:
         Returns:
             A formula whose standard string representation is the given string.
         """
-        assert Formula.is_formula(string)
-        # Output format is now enforced by verified syntax rules
-        formula, emptystring = Formula._parse_prefix(string)
-        return formula
         # Task 1.6
+        # Joan
+        result = Formula.try_parse(string)
+        assert isinstance(result, Formula), str(result)
+        return result
+        # Joan
+
+    @staticmethod
+    def parse_stream(file_or_path: Union[str, os.PathLike, IO],
+                     on_error: Optional[Callable[[int, ParsingError], None]] =
+                     None) -> Iterator[Formula]:
+        """Lazily parses a file that holds one standard string representation
+        of a formula per line.
+
+        Parameters:
+            file_or_path: path of the file to parse, which is memory-mapped
+                rather than read into memory, or a file object (in text or
+                binary mode) to parse from.
+            on_error: function to call, with the (one-based) line number and
+                the `ParsingError`, for each line that is not a valid standard
+                string representation of a formula, or ``None`` to issue a
+                warning for each such line instead.
+
+        Returns:
+            An iterator over the formulas in the given file, in order. Blank
+            lines are skipped, and so are malformed lines, after they are
+            reported. Formulas are parsed only as the iterator is advanced, and
+            since formulas are interned, subformulas that recur across lines
+            share a single node for as long as they are in use.
+        """
+        for line_number, line in enumerate(_read_lines(file_or_path), 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+            line = line.strip()
+            if line == '':
+                continue
+            result = Formula.try_parse(line)
+            if isinstance(result, Formula):
+                yield result
+            elif on_error is not None:
+                on_error(line_number, result)
+            else:
+                warnings.warn('Line ' + str(line_number) + ': ' + str(result))
 
     def polish(self) -> str:
         """Computes the polish notation representation of the current formula.
@@ -322,6 +1139,9 @@ class Formula:
             The polish notation representation of the current formula.
         """
         # Optional Task 1.7
+        # Joan
+        return ''.join(formula.root for formula in self.preorder())
+        # Joan
 
     @staticmethod
     def parse_polish(string: str) -> Formula:
@@ -334,6 +1154,133 @@ class Formula:
             A formula whose polish notation representation is the given string.
         """
         # Optional Task 1.8
+        # Joan
+        return Formula._parse_polish(string)
+        # Joan
+
+    @staticmethod
+    def _parse_polish(string: str,
+                      node: Optional[Callable[..., _T]] = None) -> _T:
+        """Parses the given polish notation representation.
+
+        Parameters:
+            string: string to parse.
+            node: function that builds each parsed subformula from its root
+                and the results of this function for its operands, as the
+                `Formula` constructor does, or ``None`` to use that
+                constructor.
+
+        Returns:
+            The result of the given function for the formula whose polish
+            notation representation is the given string.
+        """
+        if node is None:
+            node = Formula
+        tokens = []
+        index = 0
+        while index < len(string):
+            end = _next_token(string, index)
+            tokens.append(string[index:end])
+            index = end
+        # Read the tokens from right to left, so that the operands of each
+        # operator are already on the stack, first operand on top, when the
+        # operator is reached.
+        stack = []
+        for token in reversed(tokens):
+            if is_variable(token) or is_constant(token):
+                stack.append(node(token))
+            elif is_unary(token):
+                assert len(stack) >= 1, 'Missing operand for ' + token
+                stack.append(node(token, stack.pop()))
+            else:
+                assert is_binary(token), "Unexpected token '" + token + "'"
+                assert len(stack) >= 2, 'Missing operand for ' + token
+                first = stack.pop()
+                stack.append(node(token, first, stack.pop()))
+        assert len(stack) == 1, 'Not a single formula'
+        return stack[0]
+
+    @memoized_parameterless_method(copy=False)
+    def canonical(self) -> Formula:
+        """Computes the canonical form of the current formula with respect to
+        the commutativity and associativity of its operators.
+
+        In the canonical form, every maximal chain of applications of one of
+        the associative operators ``'&'``, ``'|'``, ``'+'``, and ``'<->'`` is
+        flattened into its list of operands, which is sorted by structural
+        hash and rebuilt as a balanced tree, and the two operands of each of
+        the other commutative operators ``'-&'`` and ``'-|'`` are sorted in the
+        same way. Structural hashes do not depend on ``PYTHONHASHSEED``, so
+        canonical forms are the same in every Python process. The canonical
+        form of every subformula is memoized.
+
+        Returns:
+            A formula equivalent to the current one, which is the same object
+            for all formulas that are equal up to reordering and regrouping of
+            operands as described above.
+
+        Examples:
+            >>> Formula.parse('((q&p)&r)').canonical() is \\
+            ...     Formula.parse('(r&(p&q))').canonical()
+            True
+        """
+        # Iterative walk over the formulas whose canonical forms are needed:
+        # the current formula, and, recursively, the operands of chains.
+        # Formulas inside a chain need no canonical form of their own.
+        canonical_forms: Dict[int, Formula] = {}
+        stack = [self]
+        while len(stack) > 0:
+            node = stack[-1]
+            if id(node) in canonical_forms:
+                stack.pop()
+                continue
+            if node is not self:
+                try:
+                    canonical_forms[id(node)] = node._memoized_canonical
+                    stack.pop()
+                    continue
+                except AttributeError:
+                    pass
+            operands = node._chain_operands()
+            pending = [operand for operand in operands
+                       if id(operand) not in canonical_forms]
+            if len(pending) > 0:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            canonical_form = _build_canonical(
+                node, [canonical_forms[id(operand)] for operand in operands])
+            if node is not self:
+                object.__setattr__(node, '_memoized_canonical', canonical_form)
+            canonical_forms[id(node)] = canonical_form
+        return canonical_forms[id(self)]
+
+    def _chain_operands(self) -> List[Formula]:
+        """Finds the operands of the current formula, looking through chains
+        of its root if it is associative.
+
+        Returns:
+            The operands of the maximal chain of applications of the root of
+            the current formula that starts at it, if its root is an
+            associative operator, or its (zero or one or two) operands
+            otherwise.
+        """
+        if self.first is None:
+            return []
+        elif self.second is None:
+            return [self.first]
+        elif self.root not in _ASSOCIATIVE_OPERATORS:
+            return [self.first, self.second]
+        operands = []
+        stack = [self.second, self.first]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.root == self.root:
+                stack.append(node.second)
+                stack.append(node.first)
+            else:
+                operands.append(node)
+        return operands
 
     def substitute_variables(self, substitution_map: Mapping[str, Formula]) -> \
             Formula:
@@ -356,22 +1303,107 @@ class Formula:
             ...     {'p': Formula.parse('(q&r)'), 'r': Formula.parse('p')})
             (((q&r)->(q&r))|p)
         """
-        for variable, newformula in substitution_map.items():
+        for variable in substitution_map:
             assert is_variable(variable)
         # Task 3.3
         # Joan
-            # Loop over the variables in the map
-            # and substitute if we find them in the formula, recursively
-            if self.root == variable:
-                return newformula
-            elif is_unary(self.root):
-                return Formula(self.root, Formula.substitute_variables(self.first, substitution_map))
-            elif is_binary(self.root):
-                return Formula(self.root, Formula.substitute_variables(self.first, substitution_map), Formula.substitute_variables(self.second, substitution_map))
-        # In case none of the previous returns happens
-        return self
+        if self.variables_frozen().isdisjoint(substitution_map):
+            return self
+        # Substitutes in each distinct subformula once, and keeps subformulas
+        # whose operands come back unchanged as they are.
+        substituted: Dict[int, Formula] = {}
+        if self._depth <= _RECURSION_DEPTH:
+            return self._substitute_variables(substitution_map, substituted)
+        # Iterative postorder walk, for formulas too deep to recurse into.
+        stack = [self]
+        while len(stack) > 0:
+            node = stack[-1]
+            first = node.first
+            if first is None:
+                stack.pop()
+                # Constants are never keys of the substitution map.
+                substituted[id(node)] = substitution_map.get(node.root, node)
+                continue
+            new_first = substituted.get(id(first))
+            if new_first is None:
+                stack.append(first)
+                continue
+            second = node.second
+            if second is None:
+                stack.pop()
+                substituted[id(node)] = node if new_first is first else \
+                                        Formula(node.root, new_first)
+                continue
+            new_second = substituted.get(id(second))
+            if new_second is None:
+                stack.append(second)
+                continue
+            stack.pop()
+            substituted[id(node)] = \
+                node if new_first is first and new_second is second else \
+                Formula(node.root, new_first, new_second)
+        return substituted[id(self)]
         # Joan
 
+    def _substitute_variables(self, substitution_map: Mapping[str, Formula],
+                              substituted: Dict[int, Formula]) -> Formula:
+        """Recursively substitutes in the current formula, as
+        `substitute_variables` does.
+
+        Parameters:
+            substitution_map: mapping defining the substitutions to be
+                performed.
+            substituted: the results of the substitution in the subformulas
+                substituted in so far, by the identities of the subformulas,
+                to be extended with the results for the current formula and
+                its subformulas.
+
+        Returns:
+            The formula resulting from performing all substitutions.
+        """
+        first = self.first
+        if first is None:
+            # Constants are never keys of the substitution map.
+            return substitution_map.get(self.root, self)
+        new = substituted.get(id(self))
+        if new is not None:
+            return new
+        new_first = first._substitute_variables(substitution_map, substituted)
+        second = self.second
+        if second is None:
+            new = self if new_first is first else Formula(self.root, new_first)
+        else:
+            new_second = second._substitute_variables(substitution_map,
+                                                      substituted)
+            new = self if new_first is first and new_second is second else \
+                  Formula(self.root, new_first, new_second)
+        substituted[id(self)] = new
+        return new
+
+    def compile_specializer(self, variables: Optional[Sequence[str]] = None) \
+            -> FormulaSpecializer:
+        """Compiles the current formula into a plan for repeatedly
+        substituting formulas for its variable names.
+
+        Parameters:
+            variables: the variable names to substitute for, in the order in
+                which their substituted formulas are to be given, or ``None``
+                to substitute for all variable names of the current formula in
+                alphabetical order.
+
+        Returns:
+            A specializer of the current formula over the given variable
+            names.
+
+        Examples:
+            >>> specializer = Formula.parse('(q->(p->q))').compile_specializer()
+            >>> specializer.variables
+            ('p', 'q')
+            >>> specializer.instantiate((Formula.parse('~r'), Formula('s')))
+            (s->(~r->s))
+        """
+        return FormulaSpecializer(self, variables)
+
     def substitute_operators(self, substitution_map: Mapping[str, Formula]) -> \
             Formula:
         """Substitutes in the current formula, each constant or operator `op`
@@ -401,20 +1433,215 @@ class Formula:
             assert substitution_map[operator].variables().issubset({'p', 'q'})
         # Task 3.4
         # Joan
-        if is_constant(self.root) and self.root in substitution_map:
-            return substitution_map[self.root]
-        elif is_unary(self.root):
-            first = Formula.substitute_operators(self.first, substitution_map)
-            if self.root in substitution_map:
-                return Formula.substitute_variables(substitution_map[self.root], {'p':first})
+        # Substitutes in each distinct subformula once. Operands that a
+        # template uses more than once are thus shared rather than copied, so
+        # the result is a DAG whose size is linear in that of the current
+        # formula.
+        specializers = {operator: template.compile_specializer(
+                            () if is_constant(operator) else
+                            ('p',) if is_unary(operator) else ('p', 'q'))
+                        for operator, template in substitution_map.items()}
+        def substitute(formula: Formula, operands: Tuple[Formula, ...]) -> \
+                Formula:
+            if formula.root in specializers:
+                return specializers[formula.root].instantiate(operands)
+            elif all(new is old for new, old in zip(operands, (formula.first,
+                                                              formula.second))):
+                return formula
+            else:
+                return Formula(formula.root, *operands)
+        return self.fold(substitute)
+        # Joan
+
+@frozen_slots
+class FormulaSpecializer:
+    """An immutable plan for repeatedly substituting formulas for the variable
+    names of a template formula, compiled once from the template.
+
+    The plan is a list of instructions over a list of values that starts with
+    the formulas to substitute, in the order of `variables`, followed by the
+    maximal subformulas of the template that contain no variable names. Each
+    instruction builds a single node from two earlier values and appends it, so
+    instantiating the template costs one node construction per instruction,
+    regardless of how the variable names are looked up.
+
+    Attributes:
+        template (`Formula`): the template formula.
+        variables (`~typing.Tuple`\\[`str`, ...]): the variable names to
+            substitute for, in the order in which their substituted formulas
+            are given.
+    """
+    __slots__ = ('template', 'variables', '_constants', '_program', '_result')
+    template: Formula
+    variables: Tuple[str, ...]
+    _constants: Tuple[Optional[Formula], ...]
+    _program: Tuple[Tuple[str, int, int], ...]
+    _result: int
+
+    def __init__(self, template: Formula,
+                 variables: Optional[Sequence[str]] = None):
+        """Compiles a `FormulaSpecializer` from the given template.
+
+        Parameters:
+            template: the template formula.
+            variables: the variable names to substitute for, in the order in
+                which their substituted formulas are to be given, or ``None``
+                for all variable names of the given template in alphabetical
+                order. Variable names of the template that are not listed are
+                kept as they are.
+        """
+        order = list(template.subformulas())
+        if variables is None:
+            variables = sorted({node.root for node in order
+                                if is_variable(node.root)})
+        variables = tuple(variables)
+        for variable in variables:
+            assert is_variable(variable)
+        slots = {variable: slot for slot, variable in enumerate(variables)}
+        # The ground subformulas are those that do not depend on the
+        # substituted formulas.
+        ground: Dict[int, bool] = {}
+        for node in order:
+            if node.first is None:
+                ground[id(node)] = node.root not in slots
             else:
-                return Formula(self.root, first)
-        elif is_binary(self.root):
-            first = Formula.substitute_operators(self.first, substitution_map)
-            second = Formula.substitute_operators(self.second, substitution_map)
-            if self.root in substitution_map:
-                return Formula.substitute_variables(substitution_map[self.root], {'p':first, 'q':second})
+                ground[id(node)] = ground[id(node.first)] and \
+                                   (node.second is None or
+                                    ground[id(node.second)])
+        # The values start with the substituted formulas, then None, which is
+        # the second operand of every unary node, then the ground subformulas
+        # that are operands of non-ground ones.
+        constants: List[Optional[Formula]] = [None]
+        indices: Dict[int, int] = {}
+        def index(node: Formula) -> int:
+            if id(node) not in indices:
+                assert ground[id(node)]
+                indices[id(node)] = len(variables) + len(constants)
+                constants.append(node)
+            return indices[id(node)]
+        operations = []
+        for node in order:
+            if ground[id(node)]:
+                continue
+            if node.first is None:
+                indices[id(node)] = slots[node.root]
             else:
-                return Formula(self.root, first, second)
-        return self
-        # Joan
\ No newline at end of file
+                operations.append((node.root, node.first, node.second))
+                indices[id(node)] = -len(operations)
+        if ground[id(template)]:
+            index(template)
+        for root, first, second in operations:
+            index(first)
+            if second is not None:
+                index(second)
+        # Only now is the number of constants known, so that the operation
+        # results can be numbered.
+        base = len(variables) + len(constants) - 1
+        def resolve(node: Optional[Formula]) -> int:
+            if node is None:
+                return len(variables)
+            number = indices[id(node)]
+            return base - number if number < 0 else number
+        object.__setattr__(self, 'template', template)
+        object.__setattr__(self, 'variables', variables)
+        object.__setattr__(self, '_constants', tuple(constants))
+        object.__setattr__(self, '_program',
+                           tuple((root, resolve(first), resolve(second))
+                                 for root, first, second in operations))
+        object.__setattr__(self, '_result', resolve(template))
+
+    def __len__(self) -> int:
+        """Computes the number of instructions of the current plan.
+
+        Returns:
+            The number of nodes built by each instantiation.
+        """
+        return len(self._program)
+
+    def instantiate(self, formulas: Sequence[Formula]) -> Formula:
+        """Substitutes the given formulas for the variable names of the
+        template.
+
+        Parameters:
+            formulas: the formulas to substitute, one for each of the
+                `variables` of the current specializer, in the same order.
+
+        Returns:
+            The template with each of the `variables` of the current
+            specializer substituted with its respective given formula.
+        """
+        assert len(formulas) == len(self.variables)
+        values = list(formulas)
+        values.extend(self._constants)
+        append = values.append
+        for root, first, second in self._program:
+            append(Formula(root, values[first], values[second]))
+        return values[self._result]
+
+    def instantiate_map(self, substitution_map: Mapping[str, Formula]) -> \
+            Formula:
+        """Substitutes formulas for the variable names of the template
+        according to the given map.
+
+        Parameters:
+            substitution_map: mapping from (possibly a subset of) the
+                `variables` of the current specializer to the formulas to
+                substitute for them. Variable names that are not mapped are
+                kept as they are.
+
+        Returns:
+            The template with each mapped variable name substituted with the
+            formula it is mapped to.
+        """
+        return self.instantiate([substitution_map[variable]
+                                 if variable in substitution_map
+                                 else Formula(variable)
+                                 for variable in self.variables])
+
+    def instantiate_all(self, formulas_list: Iterable[Sequence[Formula]]) -> \
+            List[Formula]:
+        """Substitutes each of the given sequences of formulas for the variable
+        names of the template.
+
+        Parameters:
+            formulas_list: sequences of formulas to substitute, each as in
+                `instantiate`.
+
+        Returns:
+            The list of the resulting formulas, in the same order.
+        """
+        return [self.instantiate(formulas) for formulas in formulas_list]
+
+def _build_canonical(formula: Formula, operands: List[Formula]) -> Formula:
+    """Builds the canonical form of the given formula from the canonical forms
+    of its operands.
+
+    Parameters:
+        formula: formula to build the canonical form of.
+        operands: the canonical forms of the operands of the given formula, as
+            found by `Formula._chain_operands`.
+
+    Returns:
+        The canonical form of the given formula.
+    """
+    if len(operands) == 0:
+        return formula
+    elif len(operands) == 1:
+        return Formula(formula.root, operands[0])
+    if formula.root in _COMMUTATIVE_OPERATORS:
+        # Structural hashes are built from `_root_digest`, so this order is
+        # the same in every Python process.
+        operands.sort(key=hash)
+        # Distinct operands with equal hashes are ordered by their polish
+        # notation, so that their order does not depend on the input.
+        if any(hash(first) == hash(second) and first is not second
+               for first, second in zip(operands, operands[1:])):
+            operands.sort(key=lambda operand: (hash(operand), operand.polish()))
+    # Rebuilds chains as balanced trees, by repeatedly pairing neighbors.
+    while len(operands) > 1:
+        paired = [Formula(formula.root, operands[i], operands[i + 1])
+                  for i in range(0, len(operands) - 1, 2)]
+        if len(operands) % 2 == 1:
+            paired.append(operands[-1])
+        operands = paired
+    return operands[0]
@@ -139,6 +139,283 @@ def test_parse(debug=False):
         assert type(ff) is Formula
         assert str(ff) == f
 
+def test_interning(debug=False):
+    if debug:
+        print("Testing that equal formulas are the same object")
+    assert Formula('p') is Formula('p')
+    assert Formula('~', Formula('p')) is Formula('~', Formula('p'))
+    assert Formula.parse('((p->q)|~r)') is Formula.parse('((p->q)|~r)')
+    assert Formula.parse('(p->q)') is not Formula.parse('(q->p)')
+    f = Formula.parse('((x1&x2)|(x1&x2))')
+    assert f.first is f.second
+    del f
+    if debug:
+        print("Testing that unused formulas are released")
+    import gc
+    from propositions.syntax import _interned_formulas
+    gc.collect()
+    before = len(_interned_formulas)
+    f = Formula.parse('(((w1->w2)->w3)->(w4->w5))')
+    assert len(_interned_formulas) == before + 9
+    del f
+    gc.collect()
+    assert len(_interned_formulas) == before
+    if debug:
+        print("Testing that interned formulas are initialized only once")
+    f = Formula.parse('(p|~q)')
+    initialize = Formula._initialize
+    def fail(*args):
+        assert False, 'Interned formula initialized again'
+    Formula._initialize = fail
+    try:
+        assert Formula('|', Formula('p'), Formula('~', Formula('q'))) is f
+    finally:
+        Formula._initialize = initialize
+
+def _uninterned_copy(formula):
+    copy = Formula.__new__(Formula)
+    copy._initialize(formula.root, formula.first, formula.second)
+    return copy
+
+def test_structural_equality(debug=False):
+    for s in ['p', '~x12', '(p->q)', '((p&~q)|(r<->T))']:
+        if debug:
+            print("Testing equality and hash of a copy of", s)
+        f = Formula.parse(s)
+        g = _uninterned_copy(f)
+        assert g is not f
+        assert g == f and f == g and not g != f
+        assert hash(g) == hash(f)
+        assert g in {f} and f in {g}
+    for s1, s2 in [('p', 'q'), ('~p', '~~p'), ('(p->q)', '(q->p)'),
+                   ('(p&q)', '(p|q)'), ('((p&q)|r)', '((p&q)|s)')]:
+        if debug:
+            print("Testing inequality of", s1, "and", s2)
+        assert Formula.parse(s1) != Formula.parse(s2)
+    if debug:
+        print("Testing hash and equality of a very deep formula")
+    f = Formula('p')
+    for i in range(100000):
+        f = Formula('~', f)
+    g = _uninterned_copy(f)
+    assert hash(g) == hash(f) and g == f and f != Formula('~', f)
+
+def test_pickle(debug=False):
+    import copy
+    import pickle
+    for s in ['p', '~x12', '((p&~q)|(r<->T))', '(((p&q)|(p&q))->~(p&q))']:
+        if debug:
+            print('Testing pickling and copying', s)
+        f = Formula.parse(s)
+        str(f)
+        data = pickle.dumps(f)
+        assert pickle.loads(data) is f
+        assert copy.copy(f) is f and copy.deepcopy(f) is f
+        assert b'_string' not in data and b'_hash' not in data
+    if debug:
+        print('Testing that pickling preserves shared subformulas')
+    f = Formula('p')
+    for i in range(100):
+        f = Formula('&', f, f)
+    assert len(pickle.dumps(f)) < 1000
+    if debug:
+        print('Testing pickling a very deep formula')
+    f = Formula('p')
+    for i in range(100000):
+        f = Formula('~', f)
+    assert pickle.loads(pickle.dumps(f)) is f
+
+def test_immutability(debug=False):
+    f = Formula.parse('(p->~q)')
+    for name, value in [('root', '&'), ('first', Formula('r')),
+                        ('second', None), ('extra', 0)]:
+        if debug:
+            print("Testing that assignment to", name, "of", f, "fails")
+        failed = False
+        try:
+            setattr(f, name, value)
+        except Exception:
+            failed = True
+        assert failed, 'Assignment to ' + name + ' did not fail'
+    assert str(f) == '(p->~q)' and f.root == '->'
+    assert not hasattr(f, '__dict__')
+
+def test_frozen_queries(debug=False):
+    for s in ['T', 'x1234', '~r', '(F&~T)', '(~(p1->p2)|F)', '~~(x|~x)']:
+        if debug:
+            print('Testing frozen variables and operators of', s)
+        f = Formula.parse(s)
+        variables = f.variables_frozen()
+        assert isinstance(variables, frozenset)
+        assert variables == f.variables() and f.variables_frozen() is variables
+        operators = f.operators_frozen()
+        assert isinstance(operators, frozenset)
+        assert operators == f.operators() and f.operators_frozen() is operators
+        copy = f.variables()
+        copy.add('z')
+        assert 'z' not in f.variables() and 'z' not in f.variables_frozen()
+
+def test_traversals(debug=False):
+    if debug:
+        print('Testing traversals of ((p&q)|~(p&q))')
+    f = Formula.parse('((p&q)|~(p&q))')
+    assert [str(g) for g in f.preorder()] == \
+           ['((p&q)|~(p&q))', '(p&q)', 'p', 'q', '~(p&q)', '(p&q)', 'p', 'q']
+    assert [str(g) for g in f.postorder()] == \
+           ['p', 'q', '(p&q)', 'p', 'q', '(p&q)', '~(p&q)', '((p&q)|~(p&q))']
+    assert [str(g) for g in f.subformulas()] == \
+           ['p', 'q', '(p&q)', '~(p&q)', '((p&q)|~(p&q))']
+    calls = []
+    def count(formula, operands):
+        calls.append(formula)
+        return 1 + sum(operands)
+    assert f.fold(count) == 8 and len(calls) == 5
+    if debug:
+        print('Testing traversals of a very deep formula')
+    f = Formula('p')
+    for i in range(100000):
+        f = Formula('|', Formula('~', f), Formula('x' + str(i % 10)))
+    assert sum(1 for _ in f.preorder()) == 300001
+    assert sum(1 for _ in f.postorder()) == 300001
+    assert sum(1 for _ in f.subformulas()) == 200011
+    assert f.fold(lambda formula, depths: 1 + max(depths, default=-1)) == \
+           200000
+    assert f.variables() == {'p'} | {'x' + str(i) for i in range(10)}
+    assert f.operators() == {'|', '~'}
+    f = Formula('p')
+    for i in range(5000):
+        f = Formula('|', Formula('~', f), Formula('x' + str(i % 10)))
+    assert str(f).startswith('(~(~(~(') and str(f).endswith('|x9)')
+    assert Formula.parse(str(f)) == f
+
+def test_write_to(debug=False):
+    from io import StringIO
+    for s in ['p', '~~F', '(~p->(q&T))', '((p&q)|~(p&q))']:
+        if debug:
+            print('Testing writing', s, 'to a stream')
+        stream = StringIO()
+        Formula.parse(s).write_to(stream)
+        assert stream.getvalue() == s
+        assert Formula.parse(s).to_string(memoize=False) == s
+    if debug:
+        print('Testing writing a very deep formula to a stream')
+    f = Formula('p')
+    for i in range(100000):
+        f = Formula('|', f, Formula('x' + str(i % 10)))
+    stream = StringIO()
+    f.write_to(stream)
+    string = stream.getvalue()
+    assert string == '(' * 100000 + 'p' + \
+           ''.join('|x' + str(i % 10) + ')' for i in range(100000))
+    assert f.to_string(memoize=False) == string and str(f) == string
+    assert str(Formula('~', f)) == '~' + string
+
+def test_cache_registry(debug=False):
+    import logic_utils
+    name = 'propositions.syntax.is_variable'
+    maxsize = logic_utils.cache_statistics()[name].maxsize
+    if debug:
+        print('Testing the statistics of', name)
+    logic_utils.clear_caches()
+    for i in range(3):
+        Formula.parse('(p1&(p2|p1))')
+    statistics = logic_utils.cache_statistics()[name]
+    assert statistics.misses > 0 and statistics.hits > 0
+    assert statistics.currsize == statistics.misses
+    assert is_variable.cache_info() == statistics
+    assert is_variable.__wrapped__('p') and not is_variable.__wrapped__('T')
+    function = is_variable
+    try:
+        for size in [0, 1]:
+            if debug:
+                print('Testing resizing', name, 'to', size)
+            logic_utils.resize_cache(name, size)
+            for variable in ['p', 'q12', 'x', 'p']:
+                assert is_variable(variable)
+            assert not is_variable('T') and not is_variable('&')
+            assert str(Formula.parse('(p1&(p2|p1))')) == '(p1&(p2|p1))'
+            statistics = logic_utils.cache_statistics()[name]
+            assert statistics.maxsize == size and statistics.currsize <= size
+            assert size > 0 or statistics.hits == 0
+            assert is_variable is function
+            assert function.cache_info().maxsize == size
+            function.cache_clear()
+            assert function.cache_info().currsize == 0
+    finally:
+        logic_utils.resize_cache(name, maxsize)
+
+def test_parse_deep(debug=False):
+    if debug:
+        print("Testing parsing of a 5000-deep negation")
+    s = '~' * 5000 + 'p'
+    assert Formula.is_formula(s)
+    f = Formula.parse(s)
+    for i in range(5000):
+        assert f.root == '~'
+        f = f.first
+    assert f == Formula('p')
+    if debug:
+        print("Testing parsing of a 5000-deep left-nested disjunction")
+    s = 'x0'
+    for i in range(1, 5000):
+        s = '(' + s + '|x' + str(i) + ')'
+    assert Formula.is_formula(s)
+    f = Formula.parse(s)
+    assert f.root == '|' and f.second == Formula('x4999')
+    assert not Formula.is_formula(s[:-1])
+
+def test_try_parse(debug=False):
+    for s in ['x', '~~T', '(p|x13)', '~((~x17->p)-&~~(~F<->~p))']:
+        if debug:
+            print("Testing try_parse of", s)
+        assert Formula.try_parse(s) is Formula.parse(s)
+    for s, offset, expected, found in [
+            ('', 0, 'a formula', ''),
+            ('a', 0, 'a formula', 'a'),
+            ('~', 1, 'a formula', ''),
+            ('(p', 2, 'a binary operator', ''),
+            ('(p&', 3, 'a formula', ''),
+            ('(p&q', 4, "')'", ''),
+            ('(p&&q)', 3, 'a formula', '&'),
+            ('(p~q)', 2, 'a binary operator', '~'),
+            ('~~(p1|x13->)', 9, "')'", '->'),
+            ('((p->q)|~r]', 10, "')'", ']'),
+            ('x|y', 1, 'end of string', '|'),
+            ('(p|x13))', 7, 'end of string', ')')]:
+        if debug:
+            print("Testing try_parse error on", s)
+        error = Formula.try_parse(s)
+        assert error == ParsingError(offset, expected, found), error
+        assert str(offset) in str(error)
+        assert not Formula.is_formula(s)
+        if expected != 'end of string':
+            assert Formula._parse_prefix(s) == (None, str(error))
+
+def test_parse_stream(debug=False):
+    import io, os, tempfile
+    lines = ['(p->q)', '', '~(p->q)', '(p->', 'x12', '  ((p->q)&r)\r', 'a']
+    expected = ['(p->q)', '~(p->q)', 'x12', '((p->q)&r)']
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'formulas.txt')
+        with open(path, 'w', newline='') as file:
+            file.write('\n'.join(lines) + '\n')
+        with open(path) as text_file, open(path, 'rb') as binary_file:
+            for source in [path, text_file, binary_file,
+                           io.StringIO('\n'.join(lines))]:
+                if debug:
+                    print("Testing parse_stream from", source)
+                errors = []
+                formulas = list(Formula.parse_stream(
+                    source, lambda line, error: errors.append((line, error))))
+                assert [str(f) for f in formulas] == expected
+                assert formulas[1].first is formulas[0]
+                assert formulas[3].first is formulas[0]
+                assert [line for line, error in errors] == [4, 7]
+                assert errors[0][1] == ParsingError(4, 'a formula', '')
+        empty_path = os.path.join(directory, 'empty.txt')
+        open(empty_path, 'w').close()
+        assert list(Formula.parse_stream(empty_path)) == []
+
 # Tests for optional tasks in Chapter 1
 
 def test_polish(debug=False):
@@ -158,6 +435,22 @@ def test_parse_polish(debug=False):
             print("Testing polish parsing of formula", polish)
         assert Formula.parse_polish(polish).polish() == polish
 
+def test_polish_deep(debug=False):
+    for infix, polish in [('(x12&x3)', '&x12x3'), ('(p<->~q)', '<->p~q'),
+                          ('((x1-&x2)-|(x3->x40))', '-|-&x1x2->x3x40')]:
+        if debug:
+            print("Testing polish round trip of", infix)
+        assert Formula.parse(infix).polish() == polish
+        assert Formula.parse_polish(polish) == Formula.parse(infix)
+    if debug:
+        print("Testing polish round trip of a 5000-deep formula")
+    f = Formula('x0')
+    for i in range(1, 5000):
+        f = Formula('+', f, Formula('~', Formula('x' + str(i))))
+    polish = f.polish()
+    assert polish.startswith('+' * 4999 + 'x0~x1~x2')
+    assert Formula.parse_polish(polish) is f
+
 # Tests for Chapter 3
 
 def test_repr_all_operators(debug=False):
@@ -300,6 +593,168 @@ def test_substitute_variables(debug=False):
         a = str(f.substitute_variables(frozendict(d)))
         assert a == r, "Incorrect answer:"+a
         
+def test_substitute_variables_sharing(debug=False):
+    if debug:
+        print("Testing that unchanged subformulas are kept as they are")
+    f = Formula.parse('((p&~q)->(r|~q))')
+    g = f.substitute_variables({'r': Formula.parse('(r&r)')})
+    assert str(g) == '((p&~q)->((r&r)|~q))'
+    assert g.first is f.first and g.second.second is f.second.second
+    assert f.substitute_variables({'x': Formula('y')}) is f
+    if debug:
+        print("Testing substituting variables in a very deep formula")
+    f = Formula('p')
+    expected = Formula('q')
+    for i in range(100000):
+        f = Formula('->', f, Formula('x' + str(i % 10)))
+        expected = Formula('->', expected, Formula('y' if i % 10 == 3 else
+                                                   'x' + str(i % 10)))
+    assert f.substitute_variables({'p': Formula('q'),
+                                   'x3': Formula('y')}) == expected
+    g = Formula('&', f, Formula('~', Formula('r'))).substitute_variables(
+        {'r': Formula('s')})
+    assert g.first is f and str(g.second) == '~s'
+
+def test_compile_specializer(debug=False):
+    for template, variables, formulas, expected in [
+            ('(q->(p->q))', None, ['~r', 's'], '(s->(~r->s))'),
+            ('((p->(T&~F))|(~q&(p->p)))', None, ['(x|y)', 'z'],
+             '(((x|y)->(T&~F))|(~z&((x|y)->(x|y))))'),
+            ('(T&F)', None, [], '(T&F)'),
+            ('p', None, ['~~p'], '~~p'),
+            ('(p&r)', ['p'], ['q'], '(q&r)'),
+            ('(p&r)', ['r', 'x', 'p'], ['T', 'y', 'F'], '(F&T)')]:
+        if debug:
+            print('Testing compiling', template, 'over', variables,
+                  'and instantiating it with', formulas)
+        specializer = Formula.parse(template).compile_specializer(variables)
+        if variables is not None:
+            assert specializer.variables == tuple(variables)
+        else:
+            assert specializer.variables == \
+                   tuple(sorted(Formula.parse(template).variables()))
+        formulas = [Formula.parse(formula) for formula in formulas]
+        result = specializer.instantiate(formulas)
+        assert str(result) == expected, str(result)
+        substitution_map = dict(zip(specializer.variables, formulas))
+        assert specializer.instantiate_map(substitution_map) is result
+        assert Formula.parse(template).substitute_variables(
+            substitution_map) is result
+        assert specializer.instantiate_all([formulas, formulas]) == \
+               [result, result]
+
+def test_dag_size(debug=False):
+    for s, size in [('p', 1), ('~p', 2), ('(p&p)', 2), ('(p&q)', 3),
+                    ('((p&q)|(p&q))', 4), ('((p&q)|~(p&q))', 5),
+                    ('(~(q->p)->~(p->q))', 7)]:
+        if debug:
+            print('Testing the DAG size of', s)
+        assert Formula.parse(s).dag_size() == size
+    if debug:
+        print('Testing that substitute_operators shares repeated operands')
+    f = Formula('x0')
+    for i in range(1, 31):
+        f = Formula('+', f, Formula('x' + str(i)))
+    g = f.substitute_operators({'+': Formula.parse('((p&~q)|(~p&q))')})
+    assert g.dag_size() == 1 + 30 * 6 and g.operators() == {'&', '|', '~'}
+
+def test_metrics(debug=False):
+    for s, size, depth, dag_size, num_variables in [
+            ('p', 1, 0, 1, 1), ('T', 1, 0, 1, 0), ('~~F', 3, 2, 3, 0),
+            ('(p&q)', 3, 1, 3, 2), ('((p&q)|~(p&q))', 8, 3, 5, 2),
+            ('(~(q->p)->~(p->x12))', 9, 3, 8, 3)]:
+        if debug:
+            print('Testing the size, depth, DAG size and number of variables '
+                  'of', s)
+        f = Formula.parse(s)
+        assert f.size() == size == sum(1 for _ in f.preorder())
+        assert f.depth() == depth
+        assert f.dag_size() == dag_size
+        assert f.num_variables() == num_variables
+    if debug:
+        print('Testing the size of a DAG with exponentially many paths')
+    f = Formula('p')
+    for i in range(200):
+        f = Formula('&', f, f)
+    assert f.size() == 2 ** 201 - 1 and f.depth() == 200
+    assert f.dag_size() == 201 and f.num_variables() == 1
+
+def test_canonical(debug=False):
+    for s1, s2 in [('(p&q)', '(q&p)'), ('((p&q)&r)', '(p&(r&q))'),
+                   ('((p|q)|(r|s))', '(((s|r)|q)|p)'), ('(p<->~q)', '(~q<->p)'),
+                   ('(p-&(q+r))', '((r+q)-&p)'),
+                   ('((p&q)->(r|s))', '((q&p)->(s|r))')]:
+        if debug:
+            print('Testing that', s1, 'and', s2, 'have the same canonical form')
+        f1, f2 = Formula.parse(s1), Formula.parse(s2)
+        assert f1.canonical() is f2.canonical()
+        assert f1.canonical().canonical() is f1.canonical()
+        assert f1.canonical().variables() == f1.variables()
+    for s1, s2 in [('(p->q)', '(q->p)'), ('((p&q)|r)', '((p|r)&q)'),
+                   ('((p-&q)-&r)', '(p-&(q-&r))')]:
+        if debug:
+            print('Testing that', s1, 'and', s2,
+                  'have different canonical forms')
+        assert Formula.parse(s1).canonical() is not \
+               Formula.parse(s2).canonical()
+    if debug:
+        print('Testing that canonical forms of chains are balanced')
+    f = Formula('x0')
+    for i in range(1, 20000):
+        f = Formula('&', Formula('x' + str(i)), f)
+    g = f.canonical()
+    assert g.size() == f.size() and g.depth() == 15
+    assert g.variables() == f.variables()
+
+def test_canonical_across_processes(debug=False):
+    import os
+    import subprocess
+    import sys
+    formulas = ['((r&(q&p))&(s&~(x1|(y2|x1))))', '((p<->q)<->(r<->(q+p)))',
+                '((x3-|x1)-&((x2|T)|(F|x4)))',
+                '(' * 30 + 'x0' + ''.join('&x' + str(i) + ')'
+                                          for i in range(1, 31))]
+    script = ('import sys\n'
+              'from propositions.syntax import Formula\n'
+              'for line in sys.stdin.read().splitlines():\n'
+              '    print(Formula.parse(line).canonical())\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    expected = [str(Formula.parse(s).canonical()) for s in formulas]
+    for seed in ['0', '1', '4242']:
+        if debug:
+            print('Testing canonical forms with PYTHONHASHSEED', seed)
+        environment = dict(os.environ, PYTHONHASHSEED=seed)
+        output = subprocess.run([sys.executable, '-c', script], cwd=root,
+                                env=environment, input='\n'.join(formulas),
+                                capture_output=True, text=True,
+                                check=True).stdout
+        assert output.splitlines() == expected, output
+
+def test_variable_table(debug=False):
+    for variables, names in [([], ()), (['q', 'p', 'q'], ('p', 'q')),
+                             ({'x2', 'x10', 'p'}, ('p', 'x10', 'x2'))]:
+        if debug:
+            print('Testing the variable table of', variables)
+        table = VariableTable(variables)
+        assert table.names == names and len(table) == len(names)
+        assert table == VariableTable(names) and \
+               hash(table) == hash(VariableTable(names))
+        assert all(table.numbers[name] == number
+                   for number, name in enumerate(names))
+        assignments = list(table.assignments())
+        assert len(assignments) == 2 ** len(names)
+        for row, assignment in enumerate(assignments):
+            model = table.model(assignment)
+            assert list(model) == list(names)
+            assert table.assignment(model) == assignment
+            assert table.row(model) == row and table.model_at_row(row) == model
+    if debug:
+        print('Testing the variable table of a formula')
+    f = Formula.parse('((q&p)|~(r->p))')
+    assert f.variable_table() is f.variable_table()
+    assert f.variable_table() == VariableTable(['p', 'q', 'r'])
+    assert VariableTable(['p']) != VariableTable(['q'])
+
 def test_substitute_operators(debug=False):
     #         f              d                   result
     tests = [ ("v",          {},                 "v"),
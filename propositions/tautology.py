@@ -8,7 +8,7 @@
 
 from typing import List, Sequence, Union
 
-from logic_utils import frozendict
+from logic_utils import frozendict, validated, validating
 
 from propositions.syntax import *
 from propositions.semantics import *
@@ -39,6 +39,7 @@ def formulas_capturing_model(model: Model) -> List[Formula]:
     return [ Formula(variable) if value is True else Formula('~', Formula(variable)) for (variable, value) in sorted(model.items()) ]
     # Joan
 
+@validated
 def prove_in_model(formula: Formula, model:Model) -> Proof:
     """Either proves the given formula or proves its negation, from the formulas
     that capture the given model.
@@ -78,8 +79,9 @@ def prove_in_model(formula: Formula, model:Model) -> Proof:
         >>> proof.rules == AXIOMATIC_SYSTEM
         True
     """
-    assert formula.operators().issubset({'->', '~'})
-    assert is_model(model)
+    if validating():
+        assert formula.operators_frozen().issubset({'->', '~'})
+        assert is_model(model)
     # Task 6.1b
     # Joan
     rules = AXIOMATIC_SYSTEM
@@ -115,6 +117,7 @@ def prove_in_model(formula: Formula, model:Model) -> Proof:
             return prove_corollary(proofpsi, Formula('~', formula), NN)
     # Joan
 
+@validated
 def reduce_assumption(proof_from_affirmation: Proof,
                       proof_from_negation: Proof) -> Proof:
     """Combines the two given proofs, both of the same formula `conclusion` and
@@ -146,17 +149,19 @@ def reduce_assumption(proof_from_affirmation: Proof,
         ``['p', '~q', '~r'] ==> '(p&(r|~r))'`` and the returned proof is of
         ``['p', '~q'] ==> '(p&(r|~r))'``.
     """
-    assert proof_from_affirmation.is_valid()
-    assert proof_from_negation.is_valid()
-    assert proof_from_affirmation.statement.conclusion == \
-           proof_from_negation.statement.conclusion
-    assert len(proof_from_affirmation.statement.assumptions) > 0
-    assert len(proof_from_negation.statement.assumptions) > 0
-    assert proof_from_affirmation.statement.assumptions[:-1] == \
-           proof_from_negation.statement.assumptions[:-1]
-    assert Formula('~', proof_from_affirmation.statement.assumptions[-1]) == \
-           proof_from_negation.statement.assumptions[-1]
-    assert proof_from_affirmation.rules == proof_from_negation.rules
+    if validating():
+        assert proof_from_affirmation.is_valid()
+        assert proof_from_negation.is_valid()
+        assert proof_from_affirmation.statement.conclusion == \
+               proof_from_negation.statement.conclusion
+        assert len(proof_from_affirmation.statement.assumptions) > 0
+        assert len(proof_from_negation.statement.assumptions) > 0
+        assert proof_from_affirmation.statement.assumptions[:-1] == \
+               proof_from_negation.statement.assumptions[:-1]
+        assert Formula('~',
+                       proof_from_affirmation.statement.assumptions[-1]) == \
+               proof_from_negation.statement.assumptions[-1]
+        assert proof_from_affirmation.rules == proof_from_negation.rules
     # Task 6.2
     # Joan
     # R = InferenceRule([], Formula.parse('((q->p)->((~q->p)->p))'))
@@ -166,6 +171,7 @@ def reduce_assumption(proof_from_affirmation: Proof,
     return combine_proofs(p1, p2, conclusion, R)
     # Joan
 
+@validated
 def prove_tautology(tautology: Formula, model: Model = frozendict()) -> Proof:
     """Proves the given tautology from the formulas that capture the given
     model.
@@ -205,14 +211,16 @@ def prove_tautology(tautology: Formula, model: Model = frozendict()) -> Proof:
         >>> proof.rules == AXIOMATIC_SYSTEM
         True
     """
-    assert is_tautology(tautology)
-    assert tautology.operators().issubset({'->', '~'})
-    assert is_model(model)
-    assert sorted(tautology.variables())[:len(model)] == sorted(model.keys())  
+    if validating():
+        assert is_tautology(tautology)
+        assert tautology.operators_frozen().issubset({'->', '~'})
+        assert is_model(model)
+        assert set(tautology.variable_table().names[:len(model)]) == \
+               model.keys()
     # Task 6.3a
     # Joan
     n = len(model)
-    variables = list(sorted(tautology.variables()))
+    variables = tautology.variable_table().names
     if n == len(variables):
         return prove_in_model(tautology, model)
     else:
@@ -226,6 +234,7 @@ def prove_tautology(tautology: Formula, model: Model = frozendict()) -> Proof:
         return reduce_assumption(proof_from_affirmation, proof_from_negation)
     # Joan
 
+@validated
 def proof_or_counterexample(formula: Formula) -> Union[Proof, Model]:
     """Either proves the given formula or finds a model in which it does not
     hold.
@@ -239,15 +248,15 @@ def proof_or_counterexample(formula: Formula) -> Union[Proof, Model]:
         formula via `~propositions.axiomatic_systems.AXIOMATIC_SYSTEM`,
         otherwise a model in which the given formula does not hold.
     """
-    assert formula.operators().issubset({'->', '~'})
+    if validating():
+        assert formula.operators_frozen().issubset({'->', '~'})
     # Task 6.3b
     # Joan
-    if is_tautology(formula):
+    counterexample = find_counterexample(formula)
+    if counterexample is None:
         return prove_tautology(formula)
     else:
-        for model in all_models(formula.variables()):
-            if not evaluate(formula, model):
-                return model
+        return counterexample
     # Joan
 
 def encode_as_formula(rule: InferenceRule) -> Formula:
@@ -278,6 +287,7 @@ def encode_as_formula(rule: InferenceRule) -> Formula:
         return encode_as_formula(rule2)
     # Joan
 
+@validated
 def prove_sound_inference(rule: InferenceRule) -> Proof:
     """Proves the given sound inference rule.
 
@@ -289,9 +299,10 @@ def prove_sound_inference(rule: InferenceRule) -> Proof:
         A valid proof of the given sound inference rule via
         `~propositions.axiomatic_systems.AXIOMATIC_SYSTEM`.
     """
-    assert is_sound_inference(rule)
-    for formula in {rule.conclusion}.union(rule.assumptions):
-        assert formula.operators().issubset({'->', '~'})
+    if validating():
+        assert is_sound_inference(rule)
+        for formula in {rule.conclusion}.union(rule.assumptions):
+            assert formula.operators_frozen().issubset({'->', '~'})
     # Task 6.4b
     # Joan
     rules = AXIOMATIC_SYSTEM
@@ -309,6 +320,7 @@ def prove_sound_inference(rule: InferenceRule) -> Proof:
     return Proof(rule, rules, lines)
     # Joan
 
+@validated
 def model_or_inconsistency(formulas: Sequence[Formula]) -> Union[Model, Proof]:
     """Either finds a model in which all the given formulas hold, or proves
     ``'~(p->p)'`` from these formulas.
@@ -322,24 +334,23 @@ def model_or_inconsistency(formulas: Sequence[Formula]) -> Union[Model, Proof]:
         otherwise a valid proof of ``'~(p->p)'`` from the given formulas via
         `~propositions.axiomatic_systems.AXIOMATIC_SYSTEM`.
     """
-    for formula in formulas:
-        assert formula.operators().issubset({'->', '~'})
+    if validating():
+        for formula in formulas:
+            assert formula.operators_frozen().issubset({'->', '~'})
     # Task 6.5
     # Joan
-    variables = set()
+    # A model of all the formulas is a model of their conjunction.
+    conjunction = Formula('T')
     for formula in formulas:
-        variables = variables | formula.variables()
-    
-    for model in all_models(variables):
-        tvals = list()
-        for formula in formulas:
-            tvals.append(evaluate(formula, model))
-        if all(tvals):
-            return model
+        conjunction = Formula('&', conjunction, formula)
+    model = find_satisfying_model(conjunction)
+    if model is not None:
+        return model
         
     return prove_sound_inference(InferenceRule(formulas, Formula.parse('~(p->p)')))
     # Joan
 
+@validated
 def prove_in_model_full(formula: Formula, model: Model) -> Proof:
     """Either proves the given formula or proves its negation, from the formulas
     that capture the given model.
@@ -380,6 +391,8 @@ def prove_in_model_full(formula: Formula, model: Model) -> Proof:
         >>> proof.rules == AXIOMATIC_SYSTEM_FULL
         True
     """
-    assert formula.operators().issubset({'T', 'F', '->', '~', '&', '|'})
-    assert is_model(model)
+    if validating():
+        assert formula.operators_frozen().issubset({'T', 'F', '->', '~', '&',
+                                                    '|'})
+        assert is_model(model)
     # Optional Task 6.6